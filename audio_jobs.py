@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+# Finished jobs kept for polling before the oldest are forgotten
+MAX_FINISHED_JOBS = 1000
+# Seconds a job record stays in Redis
+REDIS_JOB_TTL = 24 * 3600
+
+logger = logging.getLogger("scriptbuilder.audio")
+
+
+class LocalJobRegistry:
+    """Job records kept in this process; only the last `max_finished` finished jobs are kept."""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished: Deque[str] = deque()
+
+    def save(self, job: Dict[str, Any]):
+        self.jobs[job["job_id"]] = job
+        if job["finished_at"] is not None:
+            self._finished.append(job["job_id"])
+            while len(self._finished) > self.max_finished:
+                self.jobs.pop(self._finished.popleft(), None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+
+class RedisJobRegistry:
+    """Job records kept in Redis, so every worker process can report every job; records expire after `ttl` seconds."""
+
+    def __init__(self, client, prefix: str = "scriptbuilder:", ttl: int = REDIS_JOB_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}audio-job:{job_id}"
+
+    def save(self, job: Dict[str, Any]):
+        self.client.set(self._key(job["job_id"]), json.dumps(job), ex=self.ttl)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(self._key(job_id))
+        return json.loads(value) if value is not None else None
+
+
+class AudioJobQueue:
+    """
+    Queue of audio transcription jobs run by a bounded pool of background workers.
+
+    `process(path, chunked)` is blocking (it calls the transcription service), so
+    it runs on a thread pool and never on the event loop. When a job finishes,
+    the optional async `on_complete(job)` hook runs, e.g. to feed the transcript
+    into an expert session. Uploaded files are deleted once processed.
+
+    Job records live in `registry`: this process's memory by default, or a
+    RedisJobRegistry so that with several worker processes any of them can
+    report a job. Registry calls run on the default executor, so polling never
+    waits behind a transcription.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, bool], str],
+        workers: int = 2,
+        on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        registry=None,
+    ):
+        self.process = process
+        self.workers = workers
+        self.on_complete = on_complete
+        self.registry = registry if registry is not None else LocalJobRegistry()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audio-job")
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self):
+        """Start the workers on first use, inside the running event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def submit(
+        self, path: str, chunked: bool = False, target_session: Optional[str] = None, namespace: str = ""
+    ) -> Dict[str, Any]:
+        """Queue a saved audio file for transcription and return its job record."""
+        self._start()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "chunked": chunked,
+            "target_session": target_session,
+            "namespace": namespace,
+            "transcript": None,
+            "chat_response": None,
+            "error": None,
+        }
+        await self._save(job)
+        self._queue.put_nowait((job, path))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.registry.get, job_id)
+
+    async def _save(self, job: Dict[str, Any]):
+        await asyncio.get_running_loop().run_in_executor(None, self.registry.save, job)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, path = await self._queue.get()
+            job["status"] = "running"
+            try:
+                await self._save(job)
+                job["transcript"] = await loop.run_in_executor(self._executor, self.process, path, job["chunked"])
+                if self.on_complete is not None:
+                    await self.on_complete(job)
+                job["status"] = "completed"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(getattr(e, "detail", e))
+            finally:
+                job["finished_at"] = time.time()
+                try:
+                    await self._save(job)
+                except Exception:
+                    logger.exception("Could not save audio job %s", job["job_id"])
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self._queue.task_done()
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False)
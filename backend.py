@@ -1,37 +1,149 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import os
+import re
+import tempfile
+import time
 import uvicorn
-from fastapi import FastAPI, HTTPException, Path, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, Header, Path, Query, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from langchain_core.runnables import ConfigurableFieldSpec
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.prompts import ChatPromptTemplate
 from langchain.schema import BaseMessage, HumanMessage, AIMessage, BaseChatMessageHistory
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from prompts import *  # Ensure you have this import
+from history import ManagedChatHistory
+from inheritance import InheritanceGraph, VersionedCache
+from prompt_assembly import PromptAssembler, PromptTooLargeError, TokenCounter, create_tokenizer
+from export import DOCX_MEDIA_TYPE, SRSExporter, UnsupportedExportError, check_format, iter_chunks
+from llm_cache import ResponseCache
+from synonyms import SynonymBatcher, parse_synonym_batch
+from session_store import RedisSessionStore, SessionLockTimeout, create_session_store
+from pipeline import run_dag
+from hedging import HedgingPolicy
+from scheduler import BULK, PIPELINE, LLMScheduler, ScheduledChatModel, is_rate_limited, llm_priority
+from audio_jobs import AudioJobQueue, RedisJobRegistry
+from metrics import RequestMetrics
+from voice import (
+    LIVE_TRANSCRIPTION_OPTIONS,
+    DeepgramLiveTranscriber,
+    deepgram_transcribe,
+    format_diarized_words,
+    transcribe_and_process_audio,
+)
+
+# Start of the backend's startup, for /healthz: run.py passes its launch time (BACKEND_LAUNCHED_AT, Unix seconds)
+# so the imports above are counted too; started any other way, startup is counted from here
+STARTED_AT = float(os.getenv("BACKEND_LAUNCHED_AT") or time.time())
 
-# Initialize the LLM
-llm = ChatGroq(
-    model_name="llama3-8b-8192",
-    api_key='your api key'
+# Response cache shared by every cached LLM client (optional disk tier via LLM_CACHE_PATH)
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+    disk_path=os.getenv("LLM_CACHE_PATH") or None,
 )
 
+# Experts whose chat responses go through the response cache, e.g. "expert1,expert3"
+CACHED_EXPERTS = {name.strip() for name in os.getenv("LLM_CACHE_EXPERTS", "").split(",") if name.strip()}
+
+# Prompt size guard: expert prompts are assembled to fit MODEL_CONTEXT_TOKENS with COMPLETION_TOKENS left for the reply.
+# Tokens are counted offline, exactly with a local tokenizer.json (PROMPT_TOKENIZER_PATH, needs the tokenizers
+# package) or else by a conservative estimate; counts are cached per message text.
+# The same counter sizes history budgets, scheduler charges and request metrics.
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "8192"))
+COMPLETION_TOKENS = int(os.getenv("COMPLETION_TOKENS", "1024"))
+token_counter = TokenCounter(
+    create_tokenizer(os.getenv("PROMPT_TOKENIZER_PATH")),
+    max_entries=int(os.getenv("TOKEN_COUNT_CACHE_MAX_ENTRIES", "100000")),
+)
 
+# Request instrumentation: METRICS_SAMPLE_RATE of requests get stage timings (and JSON logs with METRICS_LOG_REQUESTS=1)
+request_metrics = RequestMetrics(
+    sample_rate=float(os.getenv("METRICS_SAMPLE_RATE", "1")),
+    log_requests=os.getenv("METRICS_LOG_REQUESTS") == "1",
+    counter=token_counter,
+)
 
-# Create a template for synonyms generation
-synonym_template = ChatPromptTemplate.from_messages([
-    ("system", "You are a helpful assistant that generates synonyms. Only provide a comma-separated list of synonyms."),
-    ("human", "Generate synonyms for this word: {word}")
+# Scheduler shared by every LLM client: concurrency cap, rate limits, priorities and retries
+llm_scheduler = LLMScheduler(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "4")),
+    requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) or None,
+    tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) or None,
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+)
+
+# Hedged LLM calls: a call slower than the LLM_HEDGE_PERCENTILE latency of its expert/model gets a duplicate,
+# for at most LLM_HEDGE_MAX_RATE of calls (unset disables hedging)
+llm_hedging = HedgingPolicy(
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+    max_hedge_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", "0.05")),
+    window=int(os.getenv("LLM_HEDGE_WINDOW", "200")),
+    min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+) if os.getenv("LLM_HEDGE_PERCENTILE") else None
+
+def create_llm(**kwargs) -> ScheduledChatModel:
+    """Create a scheduled chat model with the app's model settings (LLM_BACKEND=fake for a local stand-in)."""
+    if os.getenv("LLM_BACKEND") == "fake":
+        from fake_llm import FakeChatGroq
+        inner = FakeChatGroq(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.05")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+            rate_limit_probability=float(os.getenv("FAKE_LLM_RATE_LIMIT_PROBABILITY", "0")),
+            straggler_probability=float(os.getenv("FAKE_LLM_STRAGGLER_PROBABILITY", "0")),
+            straggler_latency=float(os.getenv("FAKE_LLM_STRAGGLER_LATENCY", "2")),
+            token_counter=token_counter,
+        )
+    else:
+        from langchain_groq import ChatGroq
+        inner = ChatGroq(
+            model_name="llama3-8b-8192",
+            api_key='your api key',
+            max_tokens=COMPLETION_TOKENS
+        )
+    return ScheduledChatModel(inner=inner, scheduler=llm_scheduler, hedging=llm_hedging, token_counter=token_counter, **kwargs)
+
+# The LLM, plus a variant that checks the response cache first; both are created on first use
+llm_clients: Dict[bool, ScheduledChatModel] = {}
+
+def get_llm(cached: bool = False) -> ScheduledChatModel:
+    """Get the shared LLM client (the response-cached one with cached=True)."""
+    llm = llm_clients.get(cached)
+    if llm is None:
+        llm = llm_clients[cached] = create_llm(cache=response_cache) if cached else create_llm()
+    return llm
+
+# Template for looking up synonyms of many words in one call
+batch_synonym_template = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that generates synonyms. Only respond with a JSON object that maps each given word to a list of its synonyms."),
+    ("human", "Generate synonyms for each of these words: {words}")
 ])
 
-# Create the synonym chain
-synonym_chain = synonym_template | llm
+# Batches rarely repeat, so the chain is uncached; each word's synonyms are cached by the batcher instead
+@lru_cache(maxsize=None)
+def get_batch_synonym_chain():
+    return batch_synonym_template | get_llm()
+
+async def fetch_synonym_batch(words: List[str]) -> Dict[str, List[str]]:
+    """Get synonyms for a batch of words with a single LLM call."""
+    with llm_priority(BULK):
+        response = await get_batch_synonym_chain().ainvoke({"words": json.dumps(words)})
+    return parse_synonym_batch(response.content, words)
+
+# Synonym lookups repeat constantly, so every word's synonyms go through the response cache on their own
+synonym_batcher = SynonymBatcher(
+    fetch_synonym_batch,
+    batch_size=int(os.getenv("SYNONYM_BATCH_SIZE", "25")),
+    cache=response_cache,
+)
 
-# Function to get synonyms
-async def get_synonyms(word: str) -> str:
-    """Get synonyms for a given word."""
+async def get_synonyms_batch(words: List[str]) -> Dict[str, List[str]]:
+    """Get synonyms for many words, deduplicated and shared with concurrent lookups."""
     try:
-        response = await synonym_chain.ainvoke({"word": word})
-        return response.content
+        return await synonym_batcher.get_many(words)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating synonyms: {str(e)}")
 
@@ -43,9 +155,58 @@ app = FastAPI(
     description="Advanced Software Requirements Specification Generation Assistant"
 )
 
-# Storage
-chat_store: Dict[str, ChatMessageHistory] = {}
-long_term_memory: Dict[str, List[str]] = {}
+# Per-session token budget for live turns; older turns are folded into a rolling summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+
+# Storage: chat histories and long-term memory ("memory", "sqlite" or "redis", see SESSION_DB_PATH and REDIS_URL).
+# SESSION_CACHE_MAX_MB caps the histories each worker keeps in memory (0 for no cap): past it, the least recently
+# used idle sessions are dropped and reloaded from sqlite or redis on demand (the memory store spills them to a
+# temporary directory and reads them back). REDIS_SOCKET_TIMEOUT bounds each Redis connect and reply, in seconds.
+chat_store = create_session_store(
+    os.getenv("SESSION_STORE", "memory"),
+    history_factory=lambda: ManagedChatHistory(token_budget=HISTORY_TOKEN_BUDGET, counter=token_counter),
+    path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+    url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "5")),
+    max_cache_bytes=int(float(os.getenv("SESSION_CACHE_MAX_MB", "256")) * 2**20) or None,
+)
+
+# Sessions are scoped to a tenant/user/project namespace: "tenant/user/project/expert1".
+# Requests that name no namespace use the bare expert name, as before namespacing.
+DEFAULT_NAMESPACE = ""
+NAMESPACE_FIELDS = ("tenant", "user", "project")
+NAMESPACE_PART = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+def session_key(namespace: str, session_type: str) -> str:
+    """Storage key of an expert's session within a namespace."""
+    return f"{namespace}/{session_type}" if namespace else session_type
+
+def split_session_key(session_id: str) -> tuple:
+    """Split a storage key into its namespace and expert name."""
+    namespace, _, session_type = session_id.rpartition("/")
+    return namespace, session_type
+
+def make_namespace(tenant: Optional[str], user: Optional[str], project: Optional[str]) -> str:
+    """Build a namespace from its parts; unnamed parts are "default", and no parts at all is the default namespace."""
+    parts = (tenant, user, project)
+    if not any(parts):
+        return DEFAULT_NAMESPACE
+    for field, part in zip(NAMESPACE_FIELDS, parts):
+        if part and not NAMESPACE_PART.match(part):
+            raise HTTPException(status_code=400, detail=f"Invalid {field}: use up to 64 letters, digits, '_', '.' or '-'.")
+    return "/".join(part or "default" for part in parts)
+
+# Async so FastAPI resolves it on the event loop rather than a threadpool hop per request
+async def request_namespace(
+    tenant: Optional[str] = Query(None),
+    user: Optional[str] = Query(None),
+    project: Optional[str] = Query(None),
+    x_tenant: Optional[str] = Header(None),
+    x_user: Optional[str] = Header(None),
+    x_project: Optional[str] = Header(None),
+) -> str:
+    """Namespace of a request, from the tenant/user/project query parameters or X-Tenant/X-User/X-Project headers."""
+    return make_namespace(tenant or x_tenant, user or x_user, project or x_project)
 
 # Memory inheritance map with expert identifiers
 memory_inheritance = {
@@ -61,84 +222,206 @@ memory_inheritance = {
 
 chat_inheritance = memory_inheritance.copy()
 
+# SRS section title of each expert, in document order
+SECTION_TITLES = {
+    "expert1": "Content Strategist",
+    "expert2": "Technical Writer",
+    "expert3": "Editor",
+    "expert4": "Fact Checker",
+    "expert5": "Format Specialist",
+    "expert6": "Research Assistant",
+    "expert7": "Voice Processing Expert",
+    "expert8": "Quality Assurance Agent"
+}
+
+# Validated inheritance DAGs, resolved once at startup
+memory_graph = InheritanceGraph(memory_inheritance)
+chat_graph = InheritanceGraph(chat_inheritance)
+
+# Per-session change counters (shared by all workers with the redis store);
+# inherited context is rebuilt only when a source session changes
+session_versions = chat_store.versions
+context_cache = VersionedCache(session_versions, max_entries=int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "10000")))
+
+# Long-term memory: every turn is embedded locally (EMBEDDING_MODEL names an optional sentence-transformers
+# model) and the LONG_TERM_MEMORY_TOP_K items most relevant to the input are retrieved; VECTOR_MEMORY_PATH
+# memory-maps the embeddings from disk. The embedder and indexes (and numpy) are loaded on first use.
+# A session keeps at most LONG_TERM_MEMORY_MAX_ITEMS distinct inputs; the oldest are dropped past it.
+LONG_TERM_MEMORY_TOP_K = int(os.getenv("LONG_TERM_MEMORY_TOP_K", "5"))
+LONG_TERM_MEMORY_MAX_ITEMS = int(os.getenv("LONG_TERM_MEMORY_MAX_ITEMS", "500"))
+
+@lru_cache(maxsize=None)
+def get_embedder():
+    from vector_memory import create_embedder
+    return create_embedder(os.getenv("EMBEDDING_MODEL"))
+
+@lru_cache(maxsize=None)
+def get_vector_memory():
+    from vector_memory import VectorMemory
+    return VectorMemory(
+        chat_store,
+        get_embedder(),
+        session_versions,
+        directory=os.getenv("VECTOR_MEMORY_PATH") or None,
+        max_sessions=int(os.getenv("VECTOR_MEMORY_MAX_SESSIONS", "1024")),
+    )
+
+# Uploaded documents, indexed per project (namespace); DOCUMENT_TOP_K passages are added to each prompt
+DOCUMENT_TOP_K = int(os.getenv("DOCUMENT_TOP_K", "4"))
+
+@lru_cache(maxsize=None)
+def get_document_index():
+    from rag import DocumentIndex
+    return DocumentIndex(
+        get_embedder(),
+        directory=os.getenv("DOCUMENT_INDEX_PATH") or None,
+        chunk_chars=int(os.getenv("DOCUMENT_CHUNK_CHARS", "1000")),
+    )
+
+def namespaced_parents(graph: InheritanceGraph, session_id: str) -> tuple:
+    """A session's inheritance parents, within the session's own namespace."""
+    namespace, session_type = split_session_key(session_id)
+    return tuple(session_key(namespace, parent) for parent in graph.parents.get(session_type, ()))
+
 def get_chat_history(session_id: str) -> BaseChatMessageHistory:
-    """Get chat history for a session, including inherited messages."""
-    if session_id not in chat_store:
-        chat_store[session_id] = ChatMessageHistory()
-    
-    session_history = chat_store[session_id]
+    """
+    Get chat history for a session, with inherited context kept up to date in place.
+
+    Blocking: callers run it on an executor thread and time that call as the "chat_history" stage.
+    """
+    session_history = chat_store.get_or_create(session_id)
+    parents = namespaced_parents(chat_graph, session_id)
     
-    if session_id in chat_inheritance:
-        for inherited_session in chat_inheritance[session_id]:
-            if inherited_session in chat_store:
-                last_message = get_last_conversation(inherited_session)
-                if last_message:
-                    session_history.add_message(
-                        AIMessage(content=f"Inherited from {inherited_session}: {last_message.content}")
-                    )
+    def build_inherited_context() -> Dict[str, str]:
+        for inherited_session in parents:
+            last_message = get_last_conversation(inherited_session)
+            session_history.set_inherited(
+                split_session_key(inherited_session)[1], last_message.content if last_message else None
+            )
+        return session_history.inherited
     
+    session_history.inherited = context_cache.get(("chat", session_id), parents, build_inherited_context)
     return session_history
 
 def get_last_conversation(session_id: str) -> BaseMessage:
     """Get the last message from a session's conversation history."""
     history = chat_store.get(session_id)
-    if history and history.messages:
-        return history.messages[-1]
+    if history and history.turns:
+        return history.turns[-1]
     return None
 
-def create_chat_prompt_template(template_name: str) -> ChatPromptTemplate:
-    """Create a chat prompt template with the given system message."""
-    return ChatPromptTemplate.from_messages([
-        ("system", template_name),
-        ("system", "Long-term memory: {long_term_memory}"),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}")
-    ])
-
-# Create prompt templates
-prompt_templates = {
-    "expert1": create_chat_prompt_template(expert1),
-    "expert2": create_chat_prompt_template(expert2),
-    "expert3": create_chat_prompt_template(expert3), 
-    "expert4": create_chat_prompt_template(expert4),
-    "expert5": create_chat_prompt_template(expert5),
-    "expert6": create_chat_prompt_template(expert6),
-    "expert7": create_chat_prompt_template(expert7),
-    "expert8": create_chat_prompt_template(expert8)
-}
+def get_latest_output(session_id: str) -> Optional[str]:
+    """Get a session's latest accepted output: its last AI message, including any edit made to it."""
+    history = chat_store.get(session_id)
+    if history:
+        for message in reversed(history.turns):
+            if isinstance(message, AIMessage):
+                return message.content
+    return None
 
-# Create chains
-chains = {
-    session_type: RunnableWithMessageHistory(
-        prompt_templates[session_type] | llm,
-        get_chat_history,
-        input_messages_key="input",
-        history_messages_key="history"
-    ) for session_type in prompt_templates.keys()
+# SRS export: rendered sections are cached per namespace and redone only when they or the sections they build on change
+srs_exporter = SRSExporter(
+    chat_graph,
+    SECTION_TITLES,
+    session_versions,
+    get_latest_output,
+    session_key,
+    max_entries=int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", "10000")),
+)
+
+def create_prompt_assembler(system_prompt: str) -> PromptAssembler:
+    """Create a prompt assembler for the given system message, fitting prompts to the model's context window."""
+    return PromptAssembler(
+        system_prompt,
+        token_counter,
+        render_memory=format_long_term_memory,
+        render_documents=format_document_context,
+        context_window=MODEL_CONTEXT_TOKENS,
+        completion_tokens=COMPLETION_TOKENS,
+    )
+
+# Expert system prompts
+expert_prompts = {
+    "expert1": expert1,
+    "expert2": expert2,
+    "expert3": expert3,
+    "expert4": expert4,
+    "expert5": expert5,
+    "expert6": expert6,
+    "expert7": expert7,
+    "expert8": expert8
 }
 
-def get_long_term_memory(session_id: str) -> str:
-    """Get long-term memory for a session, including inherited memories."""
-    memories = []
-    
-    if session_id in long_term_memory:
-        memories.append(f"Session {session_id} memory: {'. '.join(long_term_memory[session_id])}")
+def loaded_history(history: BaseChatMessageHistory) -> BaseChatMessageHistory:
+    """The chain's history: the one the request already loaded off the event loop, passed in the config."""
+    return history
+
+# Chains are built on an expert's first request, so startup does not pay for all eight
+@lru_cache(maxsize=None)
+def get_chain(session_type: str) -> RunnableWithMessageHistory:
+    """Get the chain of an expert, building its prompt assembler and chain on first use."""
+    return RunnableWithMessageHistory(
+        create_prompt_assembler(expert_prompts[session_type]).as_runnable()
+        | get_llm(cached=session_type in CACHED_EXPERTS),
+        loaded_history,
+        input_messages_key="input",
+        history_messages_key="history",
+        history_factory_config=[
+            ConfigurableFieldSpec(
+                id="history",
+                annotation=BaseChatMessageHistory,
+                name="History",
+                description="The session's history, loaded with get_chat_history.",
+                default=None,
+                is_shared=True,
+            ),
+        ],
+    )
+
+def get_long_term_memory(session_id: str, query: str) -> List[tuple]:
+    """
+    Get the long-term memories most relevant to the query, from the session and the sessions it inherits from.
     
-    if session_id in memory_inheritance:
-        for inherited_session in memory_inheritance[session_id]:
-            if inherited_session in long_term_memory:
-                memories.append(f"Inherited from {inherited_session}: {'. '.join(long_term_memory[inherited_session])}")
+    Items are (source rank, heading, position, text), most relevant first, so the least relevant can be trimmed.
+    """
+    sources = (session_id,) + namespaced_parents(memory_graph, session_id)
+    rank = {source: index for index, source in enumerate(sources)}
+    items = []
+    for source, position, text in get_vector_memory().search(sources, query, LONG_TERM_MEMORY_TOP_K):
+        name = split_session_key(source)[1]
+        heading = f"Session {name} memory" if source == session_id else f"Inherited from {name}"
+        items.append((rank[source], heading, position, text))
+    return items
+
+def format_long_term_memory(items: List[tuple]) -> str:
+    """Render memory items one line per session, in inheritance order."""
+    found: Dict[tuple, List[tuple]] = {}
+    for rank, heading, position, text in items:
+        found.setdefault((rank, heading), []).append((position, text))
     
-    return "\n".join(memories)
+    # Oldest first within a session, as the memories were recorded
+    return "\n".join(
+        f"{heading}: " + '. '.join(f"User said: {text}" for _, text in sorted(memories))
+        for (_, heading), memories in sorted(found.items())
+    )
+
+def get_document_context(namespace: str, query: str) -> List[tuple]:
+    """Get the uploaded document passages most relevant to the query, as (document, part, text), best first."""
+    return get_document_index().search(namespace, query, DOCUMENT_TOP_K)
+
+def format_document_context(passages: List[tuple]) -> str:
+    """Render document passages for the prompt."""
+    if not passages:
+        return "None."
+    return "\n\n".join(f"[{document}, part {part + 1}]\n{text}" for document, part, text in passages)
 
 def update_long_term_memory(session_id: str, input: str, output: str):
-    """Update long-term memory for a session."""
-    if session_id not in long_term_memory:
-        long_term_memory[session_id] = []
+    """Update long-term memory for a session (blocking; runs on an executor thread)."""
     if len(input) > 20:
-        long_term_memory[session_id].append(f"User said: {input}")
-    if len(long_term_memory[session_id]) > 5:
-        long_term_memory[session_id] = long_term_memory[session_id][-5:]
+        # Stored bare so the shared "User said" wording does not make every item look similar; repeats are kept once
+        chat_store.append_memory(session_id, input, max_items=LONG_TERM_MEMORY_MAX_ITEMS)
+    # A new turn changes both this session's history and its memory
+    session_versions.bump(session_id)
 
 # Request models
 class UserMessage(BaseModel):
@@ -148,6 +431,28 @@ class EditMessageRequest(BaseModel):
     section_id: str
     updated_message: str
 
+class SynonymsRequest(BaseModel):
+    words: List[str]
+
+class PipelineRequest(BaseModel):
+    brief: str
+
+class BatchChatItem(BaseModel):
+    session_type: str
+    user_message: str
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    """Serialize turns on a session (across worker processes too, with the redis store)."""
+    try:
+        async with chat_store.lock(session_id):
+            yield
+    except SessionLockTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 # Supported session types
 SUPPORTED_SESSION_TYPES = {
@@ -156,24 +461,142 @@ SUPPORTED_SESSION_TYPES = {
 }
 
 
-async def chat(input_text: str, session_id: str) -> str:
-    """Process a chat message using the appropriate chain."""
-    if session_id not in chains:
-        raise HTTPException(status_code=400, detail=f"Invalid session ID: {session_id}")
-    
-    chain = chains[session_id]
-    long_term_mem = get_long_term_memory(session_id)
+async def chat(
+    input_text: str, session_type: str, namespace: str = DEFAULT_NAMESPACE, prompt_report: Optional[dict] = None
+) -> str:
+    """Process a chat message using the appropriate chain; `prompt_report` receives the prompt's size and trimming."""
+    if session_type not in expert_prompts:
+        raise HTTPException(status_code=400, detail=f"Invalid session ID: {session_type}")
     
+    chain = get_chain(session_type)
+    session_id = session_key(namespace, session_type)
+    # Metrics are labelled by expert only, so namespaces do not multiply the series
+    with request_metrics.trace("chat", session_type):
+        async with session_lock(session_id):
+            # Store lookups and embedding run off the event loop; the chain is handed the loaded history
+            loop = asyncio.get_running_loop()
+            with request_metrics.stage("chat_history"):
+                history = await loop.run_in_executor(None, get_chat_history, session_id)
+            with request_metrics.stage("long_term_memory"):
+                long_term_mem = await loop.run_in_executor(None, get_long_term_memory, session_id, input_text)
+            with request_metrics.stage("document_retrieval"):
+                documents = await loop.run_in_executor(None, get_document_context, namespace, input_text)
+            
+            try:
+                response = await chain.ainvoke(
+                    {
+                        "input": input_text,
+                        "long_term_memory": long_term_mem,
+                        "documents": documents,
+                        "prompt_report": prompt_report if prompt_report is not None else {},
+                    },
+                    config={
+                        "configurable": {"history": history},
+                        "callbacks": [request_metrics.callback_handler],
+                        "metadata": {"expert": session_type},
+                    }
+                )
+                
+                with request_metrics.stage("update_long_term_memory"):
+                    await loop.run_in_executor(None, update_long_term_memory, session_id, input_text, response.content)
+                request_metrics.record_history(history)
+                return response.content
+            except PromptTooLargeError as e:
+                # Rejected before the LLM call rather than failing there
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                # Rate limits that survive the scheduler's retries are reported as such, not as server errors
+                status_code = 429 if is_rate_limited(e) else 500
+                raise HTTPException(status_code=status_code, detail=f"Chat processing error: {str(e)}")
+
+async def chat_stream(
+    input_text: str, session_type: str, namespace: str = DEFAULT_NAMESPACE, prompt_report: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """Stream a chat response token by token, updating long-term memory once the stream completes (see `chat`)."""
+    if session_type not in expert_prompts:
+        raise HTTPException(status_code=400, detail=f"Invalid session ID: {session_type}")
+
+    chain = get_chain(session_type)
+    session_id = session_key(namespace, session_type)
+    with request_metrics.trace("chat_stream", session_type):
+        async with session_lock(session_id):
+            # Store lookups and embedding run off the event loop; the chain is handed the loaded history
+            loop = asyncio.get_running_loop()
+            with request_metrics.stage("chat_history"):
+                history = await loop.run_in_executor(None, get_chat_history, session_id)
+            with request_metrics.stage("long_term_memory"):
+                long_term_mem = await loop.run_in_executor(None, get_long_term_memory, session_id, input_text)
+            with request_metrics.stage("document_retrieval"):
+                documents = await loop.run_in_executor(None, get_document_context, namespace, input_text)
+
+            chunks = []
+            async for chunk in chain.astream(
+                {
+                    "input": input_text,
+                    "long_term_memory": long_term_mem,
+                    "documents": documents,
+                    "prompt_report": prompt_report if prompt_report is not None else {},
+                },
+                config={
+                    "configurable": {"history": history},
+                    "callbacks": [request_metrics.callback_handler],
+                    "metadata": {"expert": session_type},
+                }
+            ):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+
+            with request_metrics.stage("update_long_term_memory"):
+                await loop.run_in_executor(None, update_long_term_memory, session_id, input_text, "".join(chunks))
+            request_metrics.record_history(history)
+
+def sse(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def trimmed(prompt_report: dict) -> bool:
+    """Whether anything was dropped from a prompt to fit the model's window."""
+    return any(prompt_report.get("dropped", {}).values())
+
+async def sse_events(tokens: AsyncIterator[str], prompt_report: Optional[dict] = None) -> AsyncIterator[str]:
+    """
+    Wrap a token stream as Server-Sent Events, ending with a `done` or `error` event.
+
+    If the prompt behind the stream was trimmed, its `prompt_report` is sent as a `prompt` event before `done`.
+    """
     try:
-        response = await chain.ainvoke(
-            {"input": input_text, "long_term_memory": long_term_mem},
-            config={"configurable": {"session_id": session_id}}
-        )
-        
-        update_long_term_memory(session_id, input_text, response.content)
-        return response.content
+        async for token in tokens:
+            yield sse({"token": token})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        yield sse({"detail": f"Chat processing error: {detail}"}, event="error")
+        return
+    if prompt_report is not None and trimmed(prompt_report):
+        yield sse(prompt_report, event="prompt")
+    yield sse({}, event="done")
+
+async def run_pipeline_section(session_id: str, parent_outputs: Dict[str, str], brief: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+    """Generate one expert's SRS section from the brief and its parents' sections."""
+    parent_sections = "\n\n".join(
+        f"[{parent}]\n{output}" for parent, output in parent_outputs.items()
+    ) or "None."
+    with llm_priority(PIPELINE):
+        return await chat(pipeline_section.format(brief=brief, parent_sections=parent_sections), session_id, namespace)
+
+async def pipeline_events(brief: str, namespace: str = DEFAULT_NAMESPACE) -> AsyncIterator[str]:
+    """Run all experts over the memory inheritance DAG, emitting one event per section as it finishes."""
+    async def run_node(session_id: str, parent_outputs: Dict[str, str]) -> str:
+        return await run_pipeline_section(session_id, parent_outputs, brief, namespace)
+
+    async for session_id, result in run_dag(memory_graph, run_node):
+        if isinstance(result, Exception):
+            detail = result.detail if isinstance(result, HTTPException) else str(result)
+            yield sse({"section": session_id, "detail": detail}, event="section_error")
+        else:
+            yield sse({"section": session_id, "output": result}, event="section")
+    yield sse({}, event="done")
 
 # Function to edit the most recent AI message
 def edit_most_recent_ai_message(chat_store, section_id: str, updated_message: str):
@@ -184,29 +607,41 @@ def edit_most_recent_ai_message(chat_store, section_id: str, updated_message: st
     section_messages = chat_store[section_id].messages
 
     for message in reversed(section_messages):
-        if message.type == 'ai':
+        # Streamed responses are stored as AIMessageChunk, which subclasses AIMessage
+        if isinstance(message, AIMessage):
             message.content = updated_message
+            chat_store[section_id].changed()
+            session_versions.bump(section_id)
             return {"message": f"Message updated to: {message.content}"}
 
     return {"error": "No AI message found to edit in the specified section."}
 
+def validate_session_type(session_type: str):
+    """Reject session types that have no expert chain."""
+    if session_type not in SUPPORTED_SESSION_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid session type: {session_type}. Supported types are {', '.join(SUPPORTED_SESSION_TYPES)}.",
+        )
+
 # Chat endpoint
 @app.post("/chat/{session_type}")
 async def handle_chat(
     session_type: str = Path(..., description="The type of chat session"),
     request: UserMessage = None,
+    namespace: str = Depends(request_namespace),
 ):
     """Unified chat endpoint with session type passed as a URL parameter."""
     try:
         # Validate session type
-        if session_type not in SUPPORTED_SESSION_TYPES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid session type: {session_type}. Supported types are {', '.join(SUPPORTED_SESSION_TYPES)}.",
-            )
+        validate_session_type(session_type)
         
         # Process the chat request
-        message = await chat(request.user_message, session_type)
+        prompt_report = {}
+        message = await chat(request.user_message, session_type, namespace, prompt_report)
+        if trimmed(prompt_report):
+            # Context trimmed to fit the model's window is reported rather than silently lost
+            return {"message": message, "prompt": prompt_report}
         return {"message": message}
 
     except HTTPException as he:
@@ -214,19 +649,369 @@ async def handle_chat(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Largest number of turns accepted by one batch chat request
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "1000"))
+
+async def run_batch_session(session_id: str, indexed_items: List[tuple], results: List[dict], namespace: str = DEFAULT_NAMESPACE):
+    """Run one session's batch turns in order, recording each result (or error) at its batch index."""
+    for index, user_message in indexed_items:
+        try:
+            prompt_report = {}
+            results[index] = {"session_type": session_id, "message": await chat(user_message, session_id, namespace, prompt_report)}
+            if trimmed(prompt_report):
+                # Reported per turn, as /chat does
+                results[index]["prompt"] = prompt_report
+        except HTTPException as he:
+            results[index] = {"session_type": session_id, "error": he.detail, "status_code": he.status_code}
+
+# Batch chat endpoint
+@app.post("/chat-batch/")
+async def handle_chat_batch(request: BatchChatRequest, namespace: str = Depends(request_namespace)):
+    """Run many turns in one request: sessions run concurrently, turns within a session in the order given."""
+    if len(request.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {CHAT_BATCH_MAX_ITEMS} items.")
+    
+    by_session: Dict[str, List[tuple]] = {}
+    for index, item in enumerate(request.items):
+        validate_session_type(item.session_type)
+        by_session.setdefault(item.session_type, []).append((index, item.user_message))
+    
+    results: List[dict] = [None] * len(request.items)
+    await asyncio.gather(*(
+        run_batch_session(session_id, indexed_items, results, namespace)
+        for session_id, indexed_items in by_session.items()
+    ))
+    return {"results": results}
+
+# Streaming chat endpoint
+@app.post("/chat/{session_type}/stream")
+async def handle_chat_stream(
+    session_type: str = Path(..., description="The type of chat session"),
+    request: UserMessage = None,
+    namespace: str = Depends(request_namespace),
+):
+    """Stream the expert's response as Server-Sent Events while it is being generated."""
+    validate_session_type(session_type)
+
+    prompt_report = {}
+    return StreamingResponse(
+        sse_events(chat_stream(request.user_message, session_type, namespace, prompt_report), prompt_report),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Audio ingestion: uploads are transcribed by background workers (TRANSCRIPTION_BACKEND=fake for a local stub)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+if os.getenv("TRANSCRIPTION_BACKEND") == "fake":
+    from fake_transcription import FakeLiveTranscriber, FakeTranscriptionService
+    transcription_service = FakeTranscriptionService()
+    live_transcriber_class = FakeLiveTranscriber
+else:
+    transcription_service = deepgram_transcribe
+    live_transcriber_class = DeepgramLiveTranscriber
+
+def process_audio_file(path: str, chunked: bool) -> str:
+    """Transcribe an uploaded audio file (blocking; runs on a worker thread). Failures propagate, failing the job."""
+    return transcribe_and_process_audio(path, chunked=chunked, transcribe=transcription_service, raise_errors=True)
+
+async def feed_transcript(job: dict):
+    """Send a finished transcript to the job's target expert session, if it has one."""
+    if job["target_session"] and not job["transcript"].startswith("No transcription available"):
+        job["chat_response"] = await chat(job["transcript"], job["target_session"], job["namespace"])
+
+# With the redis session store, job records are kept in Redis too, so any worker can report any job
+audio_jobs = AudioJobQueue(
+    process_audio_file,
+    workers=int(os.getenv("AUDIO_JOB_WORKERS", "2")),
+    on_complete=feed_transcript,
+    registry=RedisJobRegistry(chat_store.client, chat_store.prefix) if isinstance(chat_store, RedisSessionStore) else None,
+)
+
+async def save_upload(file: UploadFile) -> str:
+    """Stream an uploaded file to a temporary file in chunks and return its path."""
+    loop = asyncio.get_running_loop()
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=os.path.splitext(file.filename or "")[1])
+    with os.fdopen(fd, "wb") as upload_file:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await loop.run_in_executor(None, upload_file.write, chunk)
+    return path
+
+# Audio upload endpoint: returns a job ID immediately
+@app.post("/audio-jobs/", status_code=202)
+async def create_audio_job(
+    file: UploadFile = File(...),
+    target_session: Optional[str] = Form(None),
+    chunked: bool = Form(False),
+    namespace: str = Depends(request_namespace),
+):
+    """Queue an audio file for transcription, optionally feeding the transcript to an expert."""
+    if target_session:
+        validate_session_type(target_session)
+    path = await save_upload(file)
+    return await audio_jobs.submit(path, chunked=chunked, target_session=target_session, namespace=namespace)
+
+# Audio job status/result endpoint
+@app.get("/audio-jobs/{job_id}")
+async def get_audio_job(job_id: str, namespace: str = Depends(request_namespace)):
+    job = await audio_jobs.get(job_id)
+    if job is None or job["namespace"] != namespace:
+        raise HTTPException(status_code=404, detail=f"Audio job '{job_id}' not found.")
+    return job
+
+# Document upload endpoint: indexes a text, markdown or PDF document for the caller's project
+@app.post("/documents/")
+async def upload_document(
+    file: UploadFile = File(...),
+    namespace: str = Depends(request_namespace),
+):
+    """Stream a document through chunking and embedding; chunks unchanged since a previous upload are skipped."""
+    from rag import UnsupportedDocumentError, document_kind
+    filename = os.path.basename(file.filename or "")
+    try:
+        document_kind(filename)
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    path = await save_upload(file)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, get_document_index().ingest, namespace, path, filename)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Document ingestion error: {str(e)}")
+    finally:
+        os.remove(path)
+
+# Live transcription: raw audio formats a client may declare as query parameters
+LIVE_AUDIO_PARAMS = ("encoding", "sample_rate", "channels")
+
+async def relay_transcripts(websocket: WebSocket, transcriber, utterances: asyncio.Queue):
+    """Forward interim and final transcripts to the client, queueing each finished utterance for the expert."""
+    words = []
+    async for result in transcriber.results():
+        if not result["is_final"]:
+            if result["transcript"]:
+                await websocket.send_json({"type": "interim", "text": result["transcript"]})
+            continue
+        if result["words"]:
+            words.extend(result["words"])
+            await websocket.send_json({"type": "final", "text": format_diarized_words(result["words"])})
+        if result["speech_final"] and words:
+            utterances.put_nowait(format_diarized_words(words))
+            words = []
+    if words:
+        utterances.put_nowait(format_diarized_words(words))
+    utterances.put_nowait(None)
+
+async def answer_utterances(websocket: WebSocket, session_id: str, utterances: asyncio.Queue, namespace: str = DEFAULT_NAMESPACE):
+    """Send each finished utterance to the expert in order and return its response to the client."""
+    while True:
+        text = await utterances.get()
+        if text is None:
+            return
+        await websocket.send_json({"type": "utterance", "text": text})
+        try:
+            await websocket.send_json({"type": "response", "message": await chat(text, session_id, namespace)})
+        except HTTPException as he:
+            await websocket.send_json({"type": "error", "detail": he.detail})
+
+# Live transcription endpoint: binary audio frames in, transcripts and expert responses out
+@app.websocket("/ws/{session_type}")
+async def live_transcription(websocket: WebSocket, session_type: str):
+    """
+    Relay live audio to a streaming transcriber and feed each finished utterance to the expert.
+
+    The client sends binary audio frames, then `{"type": "stop"}` (or just closes).
+    The server sends `interim`, `final`, `utterance`, `response` and `error` messages.
+    """
+    await websocket.accept()
+    if session_type not in SUPPORTED_SESSION_TYPES:
+        await websocket.send_json({"type": "error", "detail": f"Invalid session type: {session_type}"})
+        await websocket.close(code=1008)
+        return
+    try:
+        # Browsers cannot set headers on a WebSocket, so the query parameters come first
+        namespace = make_namespace(*(
+            websocket.query_params.get(field) or websocket.headers.get(f"x-{field}") for field in NAMESPACE_FIELDS
+        ))
+    except HTTPException as he:
+        await websocket.send_json({"type": "error", "detail": he.detail})
+        await websocket.close(code=1008)
+        return
+
+    options = dict(LIVE_TRANSCRIPTION_OPTIONS)
+    options.update({key: websocket.query_params[key] for key in LIVE_AUDIO_PARAMS if key in websocket.query_params})
+    transcriber = live_transcriber_class(options)
+    try:
+        await transcriber.start()
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Transcription unavailable: {str(e)}"})
+        await websocket.close(code=1011)
+        return
+
+    utterances = asyncio.Queue()
+    tasks = [
+        asyncio.ensure_future(relay_transcripts(websocket, transcriber, utterances)),
+        asyncio.ensure_future(answer_utterances(websocket, session_type, utterances, namespace)),
+    ]
+    finished = False
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                await transcriber.send(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                break
+        finished = True
+        await transcriber.finish()
+        await asyncio.gather(*tasks)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Finished exactly once, whether the client stopped or just went away
+        if not finished:
+            await transcriber.finish()
+        for task in tasks:
+            task.cancel()
+
 # Endpoint to edit the most recent AI message
 @app.put("/edit-ai-message/")
-async def edit_ai_message(request: EditMessageRequest):
-    result = edit_most_recent_ai_message(chat_store, request.section_id, request.updated_message)
+async def edit_ai_message(request: EditMessageRequest, namespace: str = Depends(request_namespace)):
+    section_id = session_key(namespace, request.section_id)
+    async with session_lock(section_id):
+        if chat_store.resident(section_id):
+            # An in-memory edit takes microseconds, far less than a hop to an executor thread
+            result = edit_most_recent_ai_message(chat_store, section_id, request.updated_message)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, edit_most_recent_ai_message, chat_store, section_id, request.updated_message
+            )
 
     if 'error' in result:
         raise HTTPException(status_code=400, detail=result['error'])
     return result
 
+# Whole-document pipeline endpoint
+@app.post("/pipeline/")
+async def handle_pipeline(request: PipelineRequest, namespace: str = Depends(request_namespace)):
+    """Generate every SRS section concurrently along the inheritance DAG, streaming sections as they finish."""
+    return StreamingResponse(
+        pipeline_events(request.brief, namespace),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# SRS export endpoint: the whole document as Markdown or DOCX, streamed
+@app.get("/export/srs")
+async def export_srs(format: str = Query("markdown"), namespace: str = Depends(request_namespace)):
+    """Assemble the SRS from every expert's latest accepted output, re-rendering only sections changed since the last export."""
+    try:
+        check_format(format)
+    except UnsupportedExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Section sources are read from the store, off the event loop
+    loop = asyncio.get_running_loop()
+    counts: Dict[str, int] = {}
+    signature, sections = await loop.run_in_executor(None, srs_exporter.snapshot, namespace, counts)
+    headers = {
+        "X-Sections-Rendered": str(counts["rendered"]),
+        "X-Sections-Reused": str(counts["reused"]),
+    }
+    if format == "docx":
+        data = await loop.run_in_executor(None, srs_exporter.docx, namespace, sections, signature)
+        headers["Content-Disposition"] = 'attachment; filename="srs.docx"'
+        return StreamingResponse(iter_chunks(data), media_type=DOCX_MEDIA_TYPE, headers=headers)
+    
+    headers["Content-Disposition"] = 'attachment; filename="srs.md"'
+    parts = [srs_exporter.header(namespace)] + sections
+    return StreamingResponse(
+        (section.markdown for section in parts), media_type="text/markdown; charset=utf-8", headers=headers
+    )
+
+# Bulk synonyms endpoint
+@app.post("/synonyms/")
+async def synonyms(request: SynonymsRequest):
+    return {"synonyms": await get_synonyms_batch(request.words)}
+
+# Endpoint to inspect the LLM response cache
+@app.get("/cache-stats/")
+async def cache_stats():
+    return response_cache.stats()
+
+# Endpoint to inspect the LLM scheduler (queue depth, in-flight calls, retries, hedges)
+@app.get("/scheduler-stats/")
+async def scheduler_stats():
+    stats = llm_scheduler.stats()
+    if llm_hedging is not None:
+        stats["hedging"] = llm_hedging.stats()
+    return stats
+
+# Readiness probe: the session store is reachable and the app is serving
+@app.get("/healthz")
+async def healthz():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, chat_store.ping)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Session store unavailable: {str(e)}")
+    return {
+        "status": "ok",
+        "startup_seconds": startup_seconds,
+        "uptime_seconds": round(time.time() - STARTED_AT, 3),
+        "chains_built": get_chain.cache_info().currsize,
+    }
+
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Seconds from STARTED_AT to serving requests, set once the app has started
+startup_seconds: Optional[float] = None
+
+# With BACKEND_WARMUP=1 (the default), the lazily built clients and chains are built right after startup,
+# one at a time on executor threads, so early requests find them ready without delaying readiness
+BACKEND_WARMUP = os.getenv("BACKEND_WARMUP", "1") == "1"
+
+async def warm_up():
+    """Build the LLM clients, indexes and every expert's chain on executor threads, so requests are not held up."""
+    loop = asyncio.get_running_loop()
+    builders = [get_llm, lambda: get_llm(cached=True), get_vector_memory, get_document_index,
+                get_batch_synonym_chain]
+    builders += [lambda session_type=session_type: get_chain(session_type) for session_type in expert_prompts]
+    for build in builders:
+        await loop.run_in_executor(None, build)
+
+@app.on_event("startup")
+async def record_startup():
+    global startup_seconds
+    startup_seconds = round(time.time() - STARTED_AT, 3)
+    if BACKEND_WARMUP:
+        # Kept on the app so the task is not garbage collected mid-run
+        app.state.warmup_task = asyncio.get_running_loop().create_task(warm_up())
+
+# Flush buffered session writes on shutdown
+@app.on_event("shutdown")
+def close_session_store():
+    audio_jobs.close()
+    chat_store.close()
+
 
 # Function to run the server
-def run_backend():
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+def run_backend(workers: int = int(os.getenv("BACKEND_WORKERS", "1"))):
+    """Run the server; several workers need the redis session store so they share sessions."""
+    if workers > 1:
+        if os.getenv("SESSION_STORE") != "redis":
+            raise RuntimeError("Running more than one worker requires SESSION_STORE=redis.")
+        # Workers import the app themselves, so it is passed as an import string
+        uvicorn.run("backend:app", host="127.0.0.1", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
 
 if __name__ == "__main__":
     run_backend()
@@ -0,0 +1,258 @@
+"""
+Load and latency benchmark for the backend.
+
+Runs the FastAPI app in-process against the deterministic fake LLM and drives
+/chat/{session_type}, /edit-ai-message/ and /synonyms/ at each concurrency
+level, then runs one long session to measure prompt-size and RSS growth.
+Stragglers can be injected into the fake LLM to measure hedged calls
+(--llm-straggler-probability with --hedge-percentile).
+Results are compared with a baseline file and the run exits non-zero on a
+regression.
+
+    python benchmark.py                      # compare with benchmark_baseline.json
+    python benchmark.py --update-baseline    # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Relative slack before a metric counts as a regression, plus absolute slack for noisy small values
+DEFAULT_TOLERANCE = 0.25
+LATENCY_SLACK_MS = 5.0
+THROUGHPUT_SLACK_MS = 1.0
+RSS_SLACK_MB = 8.0
+PROMPT_GROWTH_SLACK = 0.5
+
+SESSIONS = ["expert1", "expert2", "expert3", "expert4", "expert5", "expert6", "expert7", "expert8"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable, 0 where neither is)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+async def run_load(
+    concurrency: int,
+    requests_per_worker: int,
+    send: Callable[[int, int], Awaitable[Any]],
+) -> Dict[str, float]:
+    """Run `concurrency` workers that each send requests back to back; summarize latency and throughput."""
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        for i in range(requests_per_worker):
+            start = time.perf_counter()
+            response = await send(worker_id, i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "errors": errors,
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Dict[str, float]]:
+    import httpx
+    import backend
+
+    results: Dict[str, Dict[str, float]] = {}
+    # Build the lazily created clients and chains up front, as the server does on startup
+    await backend.warm_up()
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for concurrency in args.concurrency:
+            def session_for(worker_id: int) -> str:
+                return SESSIONS[worker_id % len(SESSIONS)]
+
+            async def send_chat(worker_id: int, i: int):
+                message = f"Requirement {i} from user {worker_id}: the system shall export reports nightly."
+                return await client.post(f"/chat/{session_for(worker_id)}", json={"user_message": message})
+
+            async def send_edit(worker_id: int, i: int):
+                return await client.put("/edit-ai-message/", json={
+                    "section_id": session_for(worker_id),
+                    "updated_message": f"Edited section {i} by user {worker_id}.",
+                })
+
+            async def send_synonyms(worker_id: int, i: int):
+                words = [f"word{concurrency}x{worker_id}x{i}x{n}" for n in range(args.synonym_words)]
+                return await client.post("/synonyms/", json={"words": words})
+
+            results[f"chat@{concurrency}"] = await run_load(concurrency, args.requests, send_chat)
+            results[f"edit@{concurrency}"] = await run_load(concurrency, args.requests, send_edit)
+            results[f"synonyms@{concurrency}"] = await run_load(concurrency, args.requests, send_synonyms)
+
+        # One long session: prompt size should stay bounded and memory should not leak
+        session_id = SESSIONS[0]
+        fake_llm = backend.get_llm().inner
+        prompt_tokens: List[int] = []
+        rss_start = rss_mb()
+        for turn in range(args.long_turns):
+            message = f"Turn {turn}: please refine the acceptance criteria for feature {turn % 17}."
+            await client.post(f"/chat/{session_id}", json={"user_message": message})
+            prompt_tokens.append(fake_llm.last_prompt_tokens)
+        rss_end = rss_mb()
+
+    # Growth per turn over the second half, once the history budget has been reached
+    half = prompt_tokens[len(prompt_tokens) // 2:]
+    growth = (half[-1] - half[0]) / max(1, len(half) - 1) if half else 0.0
+    results["long_session"] = {
+        "turns": args.long_turns,
+        "prompt_tokens_first_turn": prompt_tokens[0] if prompt_tokens else 0,
+        "prompt_tokens_last_turn": prompt_tokens[-1] if prompt_tokens else 0,
+        "prompt_growth_tokens_per_turn": round(growth, 2),
+        "rss_growth_mb": round(rss_end - rss_start, 2),
+    }
+    return results
+
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Compare results with a baseline; return a description of every regressed metric."""
+    regressions = []
+    for scenario, metrics in baseline.items():
+        for name, expected in metrics.items():
+            actual = results.get(scenario, {}).get(name)
+            if actual is None:
+                continue
+            if name.endswith("_rps"):
+                # Compared as time per request, so sub-millisecond scenarios are not flagged on noise
+                regressed = 1000 / max(actual, 1e-9) > 1000 / expected * (1 + tolerance) + THROUGHPUT_SLACK_MS
+            elif name.endswith("_ms"):
+                regressed = actual > expected * (1 + tolerance) + LATENCY_SLACK_MS
+            elif name == "rss_growth_mb":
+                regressed = actual > expected * (1 + tolerance) + RSS_SLACK_MB
+            elif name == "prompt_growth_tokens_per_turn":
+                regressed = actual > expected + PROMPT_GROWTH_SLACK
+            elif name == "errors":
+                regressed = actual > expected
+            else:
+                continue
+            if regressed:
+                regressions.append(f"{scenario}.{name}: {actual} (baseline {expected})")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]):
+    for scenario, metrics in results.items():
+        print(f"{scenario:16} " + "  ".join(f"{name}={value}" for name, value in metrics.items()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend against a fake LLM.")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=[1, 8, 32],
+                        help="comma-separated concurrency levels (default: 1,8,32)")
+    parser.add_argument("--requests", type=int, default=5, help="requests per worker in each scenario")
+    parser.add_argument("--synonym-words", type=int, default=4, help="words per synonyms request")
+    parser.add_argument("--long-turns", type=int, default=200, help="turns in the long-session scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="fake LLM token rate (0 = instant)")
+    parser.add_argument("--llm-straggler-probability", type=float, default=0.0,
+                        help="fraction of fake LLM calls that stall (0 = none)")
+    parser.add_argument("--llm-straggler-latency", type=float, default=2.0, help="fake LLM straggler latency in seconds")
+    parser.add_argument("--hedge-percentile", type=float, default=0.0,
+                        help="hedge LLM calls slower than this latency percentile (0 = no hedging)")
+    parser.add_argument("--hedge-max-rate", type=float, default=0.05, help="largest fraction of LLM calls hedged")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="LLM scheduler concurrency cap")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative regression tolerance")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "synonym_words": args.synonym_words,
+        "long_turns": args.long_turns,
+        "llm_latency": args.llm_latency,
+        "llm_tokens_per_second": args.llm_tokens_per_second,
+        "llm_straggler_probability": args.llm_straggler_probability,
+        "llm_straggler_latency": args.llm_straggler_latency,
+        "hedge_percentile": args.hedge_percentile,
+        "hedge_max_rate": args.hedge_max_rate,
+        "max_in_flight": args.max_in_flight,
+    }
+
+    # The backend reads its settings at import time
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "FAKE_LLM_STRAGGLER_PROBABILITY": str(args.llm_straggler_probability),
+        "FAKE_LLM_STRAGGLER_LATENCY": str(args.llm_straggler_latency),
+        "LLM_HEDGE_MAX_RATE": str(args.hedge_max_rate),
+        "LLM_MAX_IN_FLIGHT": str(args.max_in_flight),
+        "SESSION_STORE": "memory",
+    })
+    os.environ.pop("LLM_CACHE_PATH", None)
+    if args.hedge_percentile:
+        os.environ["LLM_HEDGE_PERCENTILE"] = str(args.hedge_percentile)
+    else:
+        os.environ.pop("LLM_HEDGE_PERCENTILE", None)
+
+    results = asyncio.run(run_benchmark(args))
+    print_results(results)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({"config": config, "results": results}, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    except OSError:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+    if baseline["config"] != config:
+        print(f"Baseline was recorded with different settings: {baseline['config']}")
+        return 2
+
+    regressions = find_regressions(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+import hashlib
+import importlib.util
+import io
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from inheritance import InheritanceGraph, SessionVersions, VersionedCache
+
+# Optional: DOCX export needs python-docx, which is only imported when a DOCX is built
+DOCX_SUPPORTED = importlib.util.find_spec("docx") is not None
+
+EXPORT_FORMATS = ("markdown", "docx")
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+# Bytes per chunk when streaming a built DOCX
+STREAM_CHUNK_SIZE = 64 * 1024
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+BULLET = re.compile(r"^[-*+]\s+(.*)$")
+NUMBERED = re.compile(r"^\d+[.)]\s+(.*)$")
+# Paragraph styles of the default python-docx template used for each block
+DOCX_STYLES = ("Title", "Heading 1", "Heading 2", "Heading 3", "Heading 4", "Heading 5", "List Bullet", "List Number")
+INLINE = re.compile(r"(\*\*[^*]+\*\*|\*[^*\s][^*]*\*|`[^`]+`)")
+
+# (kind, heading level, text); kind is "heading", "bullet", "number", "code" or "paragraph"
+Block = Tuple[str, int, str]
+
+
+class UnsupportedExportError(ValueError):
+    """Raised for export formats that cannot be produced."""
+
+
+def check_format(export_format: str):
+    """Raise UnsupportedExportError unless the format can be exported."""
+    if export_format not in EXPORT_FORMATS:
+        raise UnsupportedExportError(f"Unsupported export format '{export_format}': use markdown or docx.")
+    if export_format == "docx" and not DOCX_SUPPORTED:
+        raise UnsupportedExportError("DOCX export needs the python-docx package.")
+
+
+def content_digest(text: str) -> str:
+    """Short content hash, so a section can name the revision of each section it builds on."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+def demote_headings(text: str, levels: int) -> str:
+    """Push markdown headings (outside code fences) down so they nest under a section heading."""
+    lines = []
+    in_code = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            match = HEADING.match(line)
+            if match:
+                line = "#" * min(6, len(match.group(1)) + levels) + " " + match.group(2)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def markdown_blocks(markdown: str) -> List[Block]:
+    """Split markdown into the headings, list items, code blocks and paragraphs a DOCX is built from."""
+    blocks: List[Block] = []
+    paragraph: List[str] = []
+    code: Optional[List[str]] = None
+
+    def end_paragraph():
+        if paragraph:
+            blocks.append(("paragraph", 0, " ".join(paragraph)))
+            paragraph.clear()
+
+    for line in markdown.splitlines():
+        if line.lstrip().startswith("```"):
+            end_paragraph()
+            if code is None:
+                code = []
+            else:
+                blocks.append(("code", 0, "\n".join(code)))
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+
+        stripped = line.strip()
+        heading = HEADING.match(stripped)
+        bullet = BULLET.match(stripped)
+        numbered = NUMBERED.match(stripped)
+        if not stripped:
+            end_paragraph()
+        elif heading:
+            end_paragraph()
+            blocks.append(("heading", len(heading.group(1)), heading.group(2).strip()))
+        elif bullet:
+            end_paragraph()
+            blocks.append(("bullet", 0, bullet.group(1)))
+        elif numbered:
+            end_paragraph()
+            blocks.append(("number", 0, numbered.group(1)))
+        else:
+            paragraph.append(stripped)
+    if code is not None:
+        blocks.append(("code", 0, "\n".join(code)))
+    end_paragraph()
+    return blocks
+
+
+def add_inline_runs(paragraph, text: str):
+    """Add text to a DOCX paragraph, turning **bold**, *italic* and `code` spans into formatted runs."""
+    for part in INLINE.split(text):
+        if not part:
+            continue
+        if part.startswith("**") and part.endswith("**") and len(part) > 4:
+            paragraph.add_run(part[2:-2]).bold = True
+        elif part.startswith("`") and part.endswith("`") and len(part) > 2:
+            paragraph.add_run(part[1:-1]).font.name = "Courier New"
+        elif part.startswith("*") and part.endswith("*") and len(part) > 2:
+            paragraph.add_run(part[1:-1]).italic = True
+        else:
+            paragraph.add_run(part)
+
+
+def docx_fragment(blocks: Sequence[Block]) -> bytes:
+    """
+    Render markdown blocks as the body XML of a DOCX built from python-docx's default template.
+
+    "#" becomes the title and "##" a top-level heading. Fragments are joined
+    into one document by `assemble_docx`.
+    """
+    from docx import Document
+    from lxml import etree
+
+    document = Document()
+    # Styles are resolved once; python-docx would otherwise look each paragraph's style up by name
+    styles = {name: document.styles[name] for name in DOCX_STYLES}
+
+    def add_paragraph(style: Optional[str] = None):
+        paragraph = document.add_paragraph()
+        if style is not None:
+            paragraph.style = styles[style]
+        return paragraph
+
+    for kind, level, text in blocks:
+        if kind == "heading":
+            add_paragraph("Title" if level == 1 else f"Heading {level - 1}").add_run(text)
+        elif kind == "bullet":
+            add_inline_runs(add_paragraph("List Bullet"), text)
+        elif kind == "number":
+            add_inline_runs(add_paragraph("List Number"), text)
+        elif kind == "code":
+            add_paragraph().add_run(text).font.name = "Courier New"
+        else:
+            add_inline_runs(add_paragraph(), text)
+    body = document.element.body
+    body.remove(body.sectPr)
+    return etree.tostring(body)
+
+
+def assemble_docx(fragments: Sequence[bytes]) -> bytes:
+    """Join body fragments from `docx_fragment` into one DOCX file."""
+    from docx import Document
+    from docx.oxml import parse_xml
+
+    document = Document()
+    section_properties = document.element.body.sectPr
+    for fragment in fragments:
+        for element in list(parse_xml(fragment)):
+            section_properties.addprevious(element)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def iter_chunks(data: bytes, size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class RenderedSection:
+    """One rendered section: its Markdown, and its DOCX body XML once a DOCX export has needed it."""
+
+    def __init__(self, section_id: str, markdown: str):
+        self.section_id = section_id
+        self.markdown = markdown
+        self._docx: Optional[bytes] = None
+
+    def docx(self) -> bytes:
+        """The section's DOCX body XML, built on first use (blocking)."""
+        if self._docx is None:
+            self._docx = docx_fragment(markdown_blocks(self.markdown))
+        return self._docx
+
+
+class SRSExporter:
+    """
+    Assembles the SRS document from each expert's latest accepted output.
+
+    Each expert is one section, rendered from the last AI message of its
+    session (edits included) and naming the sections it builds on with a
+    digest of their current content. Rendered sections are cached against the
+    versions of the sessions they are rendered from, so a new turn or an edit
+    marks just that section and the sections inheriting from it dirty; every
+    other section is reused as is. DOCX body XML is cached with each rendered
+    part, and a whole DOCX is reused while no section changed, keeping up to
+    `max_documents` of them.
+    """
+
+    def __init__(
+        self,
+        graph: InheritanceGraph,
+        titles: Dict[str, str],
+        versions: SessionVersions,
+        latest_output: Callable[[str], Optional[str]],
+        session_key: Callable[[str, str], str],
+        title: str = "Software Requirements Specification",
+        max_entries: Optional[int] = None,
+        max_documents: int = 32,
+    ):
+        self.graph = graph
+        self.titles = titles
+        self.versions = versions
+        self.latest_output = latest_output
+        self.session_key = session_key
+        self.title = title
+        self.max_documents = max_documents
+        self.numbers = {section_id: number for number, section_id in enumerate(titles, start=1)}
+        self._sections = VersionedCache(versions, max_entries=max_entries)
+        self._documents: "OrderedDict[str, Tuple[Tuple[int, ...], bytes]]" = OrderedDict()
+        self._documents_lock = threading.Lock()  # DOCX files are built off the event loop
+
+    def heading(self, section_id: str) -> str:
+        return f"{self.numbers[section_id]}. {self.titles[section_id]}"
+
+    def header(self, namespace: str) -> RenderedSection:
+        markdown = f"# {self.title}\n\n" + (f"*Project: {namespace}*\n\n" if namespace else "")
+        return RenderedSection("", markdown)
+
+    def _render_heading(self, namespace: str, section_id: str) -> RenderedSection:
+        lines = [f"## {self.heading(section_id)}", ""]
+        parents = self.graph.parents.get(section_id, ())
+        if parents:
+            references = []
+            for parent in parents:
+                output = self.latest_output(self.session_key(namespace, parent))
+                revision = content_digest(output) if output is not None else "not written"
+                references.append(f"{self.heading(parent)} ({revision})")
+            lines += [f"*Builds on: {', '.join(references)}*", ""]
+        return RenderedSection(section_id, "\n".join(lines) + "\n")
+
+    def _render_body(self, namespace: str, section_id: str) -> RenderedSection:
+        output = self.latest_output(self.session_key(namespace, section_id))
+        body = demote_headings(output.strip(), 2) if output is not None else "*No accepted output yet.*"
+        return RenderedSection(section_id, body + "\n\n")
+
+    def sections(self, namespace: str, counts: Optional[Dict[str, int]] = None) -> List[RenderedSection]:
+        """
+        Every section in document order, as heading and body parts, re-rendering only the dirty ones.
+
+        A section's heading names the sections it builds on, so it depends on
+        them too; its body depends on its own session alone, so a change to a
+        parent section only redoes the heading line of the sections inheriting from it.
+        `counts` receives how many sections this call rendered and reused.
+        """
+        parts = []
+        rendered = reused = 0
+        for section_id in self.titles:
+            session_id = self.session_key(namespace, section_id)
+            parents = tuple(self.session_key(namespace, parent) for parent in self.graph.parents.get(section_id, ()))
+            dirty = []
+
+            def render(part, section_id=section_id):
+                dirty.append(part)
+                return part(namespace, section_id)
+
+            parts.append(self._sections.get(
+                (namespace, section_id, "heading"), (session_id,) + parents, lambda: render(self._render_heading)
+            ))
+            parts.append(self._sections.get(
+                (namespace, section_id, "body"), (session_id,), lambda: render(self._render_body)
+            ))
+            if dirty:
+                rendered += 1
+            else:
+                reused += 1
+        if counts is not None:
+            counts.update(rendered=rendered, reused=reused)
+        return parts
+
+    def signature(self, namespace: str) -> Tuple[int, ...]:
+        return self.versions.signature(self.session_key(namespace, section_id) for section_id in self.titles)
+
+    def snapshot(
+        self, namespace: str, counts: Optional[Dict[str, int]] = None
+    ) -> Tuple[Tuple[int, ...], List[RenderedSection]]:
+        """
+        The namespace's signature and its sections (blocking; run it off the event loop).
+
+        The signature is taken first, so a turn landing while the sections are
+        built can only make them newer than it: a DOCX cached under the
+        signature is then rebuilt on the next export, never served as current.
+        """
+        signature = self.signature(namespace)
+        return signature, self.sections(namespace, counts)
+
+    def docx(self, namespace: str, sections: Sequence[RenderedSection], signature: Tuple[int, ...]) -> bytes:
+        """
+        The DOCX of the given sections (blocking; run it off the event loop).
+
+        `signature` is the namespace's signature when the sections were taken;
+        the previous file is returned while it still matches.
+        """
+        with self._documents_lock:
+            cached = self._documents.get(namespace)
+            if cached is not None and cached[0] == signature:
+                self._documents.move_to_end(namespace)
+                return cached[1]
+
+        data = assemble_docx([section.docx() for section in (self.header(namespace), *sections)])
+        with self._documents_lock:
+            self._documents[namespace] = (signature, data)
+            self._documents.move_to_end(namespace)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return data
@@ -0,0 +1,127 @@
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from prompt_assembly import TokenCounter, default_token_counter
+
+
+class FakeRateLimitError(Exception):
+    """429 raised by FakeChatGroq, shaped like the Groq client's RateLimitError."""
+
+    status_code = 429
+
+
+class FakeChatGroq(BaseChatModel):
+    """
+    Deterministic local stand-in for ChatGroq.
+
+    Replies after `latency` seconds, then emits `response_words` words at
+    `tokens_per_second` (0 means all at once). With probability
+    `rate_limit_probability` a call fails with a 429 instead, and with
+    probability `straggler_probability` it stalls for `straggler_latency`
+    seconds instead of `latency`. Randomness is seeded, so runs are
+    reproducible. The size of the last prompt it received, as measured by
+    `token_counter`, is kept in `last_prompt_tokens`.
+    """
+
+    model_name: str = "fake-llama3-8b-8192"
+    latency: float = 0.05
+    tokens_per_second: float = 0.0
+    response_words: int = 40
+    rate_limit_probability: float = 0.0
+    straggler_probability: float = 0.0
+    straggler_latency: float = 2.0
+    seed: int = 0
+    token_counter: TokenCounter = default_token_counter
+
+    _rng: random.Random = PrivateAttr()
+    calls: int = 0
+    rate_limited: int = 0
+    stragglers: int = 0
+    last_prompt_tokens: int = 0
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def _words(self, messages: List[BaseMessage]) -> List[str]:
+        """Deterministic reply words derived from the last message."""
+        seed = str(messages[-1].content).split() if messages else []
+        seed = seed or ["response"]
+        return [seed[i % len(seed)] for i in range(self.response_words)]
+
+    def _start_call(self, messages: List[BaseMessage]) -> float:
+        """Count a call, possibly failing it with a 429; returns the latency to apply."""
+        self.calls += 1
+        self.last_prompt_tokens = sum(self.token_counter.count_message(message) for message in messages)
+        if self._rng.random() < self.rate_limit_probability:
+            self.rate_limited += 1
+            raise FakeRateLimitError("Rate limit reached (fake)")
+        # Only drawn when enabled, so runs without stragglers keep their random sequence
+        if self.straggler_probability and self._rng.random() < self.straggler_probability:
+            self.stragglers += 1
+            return self.straggler_latency
+        return self.latency
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        latency = self._start_call(messages)
+        words = self._words(messages)
+        time.sleep(latency + (len(words) / self.tokens_per_second if self.tokens_per_second else 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        latency = self._start_call(messages)
+        words = self._words(messages)
+        await asyncio.sleep(latency + (len(words) / self.tokens_per_second if self.tokens_per_second else 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._start_call(messages))
+        for i, word in enumerate(self._words(messages)):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._start_call(messages))
+        for i, word in enumerate(self._words(messages)):
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
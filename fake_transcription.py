@@ -0,0 +1,156 @@
+import array
+import asyncio
+import itertools
+import struct
+import time
+import zlib
+
+
+class FakeTranscriptionService:
+    """
+    Deterministic local stand-in for Deepgram's pre-recorded API.
+
+    Reads the uploaded WAV stream and emits one "word" per `word_seconds` of
+    audio, named after a checksum of its samples, so identical audio always
+    yields identical words at identical offsets. Each call permutes its speaker
+    labels, like real per-request diarization, which exercises speaker
+    stitching across chunks. Use it anywhere a TranscriptionService is accepted.
+    """
+
+    def __init__(self, word_seconds=0.5, turn_seconds=10.0, speakers=2, latency=0.0):
+        self.word_seconds = word_seconds
+        self.turn_seconds = turn_seconds
+        self.speakers = speakers
+        self.latency = latency
+        self._calls = itertools.count()
+        self.calls = 0
+
+    @property
+    def identity(self):
+        """Names this stand-in and its settings in transcript cache keys."""
+        return f"fake(word_seconds={self.word_seconds}, turn_seconds={self.turn_seconds}, speakers={self.speakers})"
+
+    def __call__(self, source, options):
+        call_index = next(self._calls)
+        self.calls = call_index + 1
+        audio = b"".join(iter(lambda: source.read(64 * 1024), b""))
+        if self.latency:
+            time.sleep(self.latency)
+
+        channels, frame_rate, _, block_align = struct.unpack("<HIIH", audio[22:34])
+        samples = audio[44:]
+        word_bytes = int(self.word_seconds * frame_rate) * block_align
+        turn_bytes = int(self.turn_seconds * frame_rate) * block_align
+
+        words = []
+        for offset in range(0, len(samples) - word_bytes + 1, word_bytes):
+            turn_offset = offset - offset % turn_bytes
+            true_speaker = zlib.crc32(samples[turn_offset:turn_offset + block_align * 16]) % self.speakers
+            text = f"w{zlib.crc32(samples[offset:offset + word_bytes]) % 100000}"
+            start = offset / block_align / frame_rate
+            words.append({
+                "word": text,
+                "punctuated_word": text + ("." if (len(words) + 1) % 8 == 0 else ""),
+                "start": start,
+                "end": start + self.word_seconds,
+                "confidence": 1.0,
+                "speaker": (true_speaker + call_index) % self.speakers,
+            })
+
+        transcript = " ".join(word["punctuated_word"] for word in words)
+        return {"results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]}}
+
+
+class FakeLiveTranscriber:
+    """
+    Deterministic local stand-in for a live transcription session.
+
+    Accepts 16-bit PCM frames (a leading WAV header is skipped and its format
+    used). Every `word_seconds` of audio louder than `silence_threshold` becomes
+    one word, named after a checksum of its samples, and is reported as an
+    interim result. After `endpoint_seconds` of silence, or when the session
+    finishes, the pending words are finalized as one utterance. Use it anywhere
+    a DeepgramLiveTranscriber is accepted.
+    """
+
+    def __init__(self, options=None, word_seconds=0.25, endpoint_seconds=0.3, silence_threshold=500, latency=0.0):
+        options = options or {}
+        self.sample_rate = int(options.get("sample_rate", 16000))
+        self.channels = int(options.get("channels", 1))
+        self.word_seconds = word_seconds
+        self.endpoint_seconds = endpoint_seconds
+        self.silence_threshold = silence_threshold
+        self.latency = latency
+        self._results = asyncio.Queue()
+        self._buffer = b""
+        self._started = False
+        self._finished = False
+        self._position = 0.0
+        self._silence = 0.0
+        self._pending = []
+
+    async def start(self):
+        pass
+
+    async def send(self, audio):
+        if not self._started:
+            self._started = True
+            if audio[:4] == b"RIFF":
+                self.channels, self.sample_rate = struct.unpack("<HI", audio[22:28])
+                audio = audio[44:]
+        self._buffer += audio
+        word_bytes = int(self.word_seconds * self.sample_rate) * 2 * self.channels
+        while len(self._buffer) >= word_bytes:
+            window, self._buffer = self._buffer[:word_bytes], self._buffer[word_bytes:]
+            self._add_window(window)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._pending:
+            self._finalize()
+        self._results.put_nowait(None)
+
+    async def results(self):
+        while True:
+            result = await self._results.get()
+            if result is None:
+                return
+            yield result
+
+    def _add_window(self, window):
+        start = self._position
+        self._position += self.word_seconds
+        if max(map(abs, array.array("h", window))) < self.silence_threshold:
+            self._silence += self.word_seconds
+            if self._pending and self._silence >= self.endpoint_seconds:
+                self._finalize()
+            return
+
+        self._silence = 0.0
+        text = f"w{zlib.crc32(window) % 100000}"
+        self._pending.append({
+            "word": text,
+            "punctuated_word": text,
+            "start": start,
+            "end": start + self.word_seconds,
+            "confidence": 1.0,
+            "speaker": 0,
+        })
+        self._results.put_nowait(self._result(self._pending, is_final=False))
+
+    def _finalize(self):
+        words, self._pending = self._pending, []
+        words[-1] = dict(words[-1], punctuated_word=words[-1]["word"] + ".")
+        self._results.put_nowait(self._result(words, is_final=True))
+
+    def _result(self, words, is_final):
+        return {
+            "transcript": " ".join(word["punctuated_word"] for word in words),
+            "words": list(words),
+            "is_final": is_final,
+            "speech_final": is_final,
+        }
@@ -1,9 +1,27 @@
+import json
 import streamlit as st
 import requests
-from typing import Dict, List, Union, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Union
+from urllib.parse import quote
+from urllib3.util.retry import Retry
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect
 
 # Configuration
 BASE_URL = "http://127.0.0.1:8000"
+# (connect, read) timeouts for streamed responses; the read timeout applies between tokens
+STREAM_TIMEOUT = (5, 60)
+# (connect, read) timeouts for other calls; a long generation can take minutes
+REQUEST_TIMEOUT = (5, 300)
+# Keep-alive connections held open to the backend
+POOL_SIZE = 8
+# Retries for idempotent calls (edits) on dropped connections and 502/503/504 responses
+EDIT_RETRIES = 3
+WS_URL = BASE_URL.replace("http", "ws", 1)
+# Audio is sent to the live transcription socket in frames of this many bytes
+LIVE_FRAME_BYTES = 3200
 SESSION_TYPES = [
     "Expert One", 
     "Expert Two", 
@@ -14,6 +32,46 @@ SESSION_TYPES = [
     "Expert Seven", 
     "Expert Eight"
 ]
+# Chat messages shown per page; older messages are paged in on demand
+CHAT_PAGE_SIZE = 20
+# Backend session ID of each expert shown in the UI
+SESSION_IDS = {name: f"expert{number}" for number, name in enumerate(SESSION_TYPES, start=1)}
+# SRS export formats: backend format, download file name and MIME type
+EXPORT_FORMATS = {
+    "Markdown": ("markdown", "srs.md", "text/markdown"),
+    "Word": ("docx", "srs.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+@st.cache_resource
+def get_backend_session() -> requests.Session:
+    """
+    Shared HTTP session for every backend call, across turns, reruns and browser sessions.
+    
+    Returns:
+        requests.Session: Session with a keep-alive connection pool; PUT requests are retried with backoff.
+    """
+    session = requests.Session()
+    retries = Retry(
+        total=EDIT_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"PUT"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_edit_executor() -> ThreadPoolExecutor:
+    """
+    Background thread for edits, so saving one never blocks the script thread.
+    
+    Returns:
+        ThreadPoolExecutor: A single worker, so edits reach the backend in the order they were made.
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="edit-message")
 
 def send_message(session_type: str, message: str) -> str:
     """
@@ -26,10 +84,10 @@ def send_message(session_type: str, message: str) -> str:
     Returns:
         str: The response from the server or an error message.
     """
-    endpoint = f"{BASE_URL}/chat/{session_type}"
+    endpoint = f"{BASE_URL}/chat/{SESSION_IDS[session_type]}"
     
     try:
-        response = requests.post(endpoint, json={"user_message": message}, timeout=10)
+        response = get_backend_session().post(endpoint, json={"user_message": message}, timeout=REQUEST_TIMEOUT)
         
         response.raise_for_status()  # Raises an HTTPError for bad responses
         response_data = response.json()
@@ -42,10 +100,94 @@ def send_message(session_type: str, message: str) -> str:
         st.error(f"Response parsing error: {str(e)}")
         return "Error: Unable to parse server response."
 
+def stream_message(session_type: str, message: str) -> Iterator[str]:
+    """
+    Send message to backend and yield response tokens as they arrive.
+    
+    Args:
+        session_type (str): The type of session for context.
+        message (str): The user's message to send.
+    
+    Yields:
+        str: Response tokens, or an error message if the request fails.
+    """
+    endpoint = f"{BASE_URL}/chat/{SESSION_IDS[session_type]}/stream"
+    
+    try:
+        with get_backend_session().post(
+            endpoint, json={"user_message": message}, stream=True, timeout=STREAM_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    event = "message"
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        st.error(data.get("detail", "Unknown streaming error."))
+                        yield f"Error: {data.get('detail', 'Unknown streaming error.')}"
+                        return
+                    if event == "done":
+                        return
+                    yield data.get("token", "")
+    
+    except requests.exceptions.RequestException as e:
+        st.error(f"Network error: {str(e)}")
+        yield f"Error: Unable to communicate with the server. {str(e)}"
+    except ValueError as e:
+        st.error(f"Response parsing error: {str(e)}")
+        yield "Error: Unable to parse server response."
+
+def transcribe_live(session_type: str, audio: bytes, status) -> List[Dict[str, str]]:
+    """
+    Stream recorded audio to the backend's live transcription socket.
+    
+    Interim transcripts are shown in `status` as they arrive.
+    
+    Args:
+        session_type (str): The type of session for context.
+        audio (bytes): The recording.
+        status: Streamlit placeholder for interim transcripts.
+    
+    Returns:
+        List[Dict[str, str]]: The spoken utterances and the expert's responses, as chat messages.
+    """
+    messages = []
+    
+    try:
+        with connect(f"{WS_URL}/ws/{quote(SESSION_IDS[session_type])}", open_timeout=5) as websocket:
+            for offset in range(0, len(audio), LIVE_FRAME_BYTES):
+                websocket.send(audio[offset:offset + LIVE_FRAME_BYTES])
+            websocket.send(json.dumps({"type": "stop"}))
+            
+            for raw in websocket:
+                event = json.loads(raw)
+                if event["type"] in ("interim", "final"):
+                    status.markdown(f"🎙️ _{event['text']}_")
+                elif event["type"] == "utterance":
+                    messages.append({"role": "user", "content": event["text"]})
+                elif event["type"] == "response":
+                    messages.append({"role": "assistant", "content": event["message"]})
+                elif event["type"] == "error":
+                    st.error(event["detail"])
+    
+    except (OSError, WebSocketException) as e:
+        st.error(f"Network error: {str(e)}")
+    except ValueError as e:
+        st.error(f"Response parsing error: {str(e)}")
+    
+    return messages
+
 def edit_message(section_id: str, updated_message: str) -> Union[Dict, str]:
     """
     Edit the most recent AI message.
     
+    Runs on the edit executor, so it reports errors by returning them rather than through Streamlit.
+    
     Args:
         section_id (str): The ID of the section to edit.
         updated_message (str): The updated message content.
@@ -56,21 +198,105 @@ def edit_message(section_id: str, updated_message: str) -> Union[Dict, str]:
     endpoint = f"{BASE_URL}/edit-ai-message/"
     
     try:
-        response = requests.put(endpoint, json={
-            "section_id": section_id,
+        response = get_backend_session().put(endpoint, json={
+            "section_id": SESSION_IDS[section_id],
             "updated_message": updated_message
-        }, timeout=10)
+        }, timeout=REQUEST_TIMEOUT)
         
         response.raise_for_status()
         return response.json()
     
     except requests.exceptions.RequestException as e:
-        st.error(f"Network error: {str(e)}")
         return f"Error: Unable to edit message. {str(e)}"
+    except ValueError as e:
+        return f"Error: Unable to parse server response. {str(e)}"
+
+def submit_edit(section_id: str, updated_message: str) -> Future:
+    """
+    Send an edit in the background.
+    
+    Args:
+        section_id (str): The ID of the section to edit.
+        updated_message (str): The updated message content.
+    
+    Returns:
+        Future: Resolves to the result of edit_message.
+    """
+    return get_edit_executor().submit(edit_message, section_id, updated_message)
+
+def upload_document(uploaded_file) -> Union[Dict, str]:
+    """
+    Send an uploaded document to the backend for retrieval indexing.
+    
+    Args:
+        uploaded_file: The file returned by st.file_uploader.
+    
+    Returns:
+        Union[Dict, str]: The ingestion summary or an error message.
+    """
+    endpoint = f"{BASE_URL}/documents/"
+    
+    try:
+        response = get_backend_session().post(
+            endpoint,
+            files={"file": (uploaded_file.name, uploaded_file, uploaded_file.type or "application/octet-stream")},
+            timeout=REQUEST_TIMEOUT,
+        )
+        
+        response.raise_for_status()
+        return response.json()
+    
+    except requests.exceptions.RequestException as e:
+        detail = e.response.text if getattr(e, "response", None) is not None else str(e)
+        st.error(f"Upload error: {detail}")
+        return f"Error: Unable to index document. {detail}"
     except ValueError as e:
         st.error(f"Response parsing error: {str(e)}")
         return "Error: Unable to parse server response."
 
+def export_srs(export_format: str) -> Union[bytes, str]:
+    """
+    Download the SRS document assembled from every expert's latest output.
+    
+    Args:
+        export_format (str): "markdown" or "docx".
+    
+    Returns:
+        Union[bytes, str]: The document or an error message.
+    """
+    endpoint = f"{BASE_URL}/export/srs"
+    
+    try:
+        with get_backend_session().get(
+            endpoint, params={"format": export_format}, stream=True, timeout=REQUEST_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            return b"".join(response.iter_content(chunk_size=64 * 1024))
+    
+    except requests.exceptions.RequestException as e:
+        detail = e.response.text if getattr(e, "response", None) is not None else str(e)
+        st.error(f"Export error: {detail}")
+        return f"Error: Unable to export the SRS. {detail}"
+
+def render_message(message: Dict[str, str]):
+    """
+    Render one chat message.
+    
+    Args:
+        message (Dict[str, str]): A message with "role" and "content".
+    """
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+def show_older_messages(session_type: str):
+    """
+    Page one more screenful of older messages into the chat history.
+    
+    Args:
+        session_type (str): The session whose history is paged.
+    """
+    st.session_state.history_pages[session_type] = st.session_state.history_pages.get(session_type, 1) + 1
+
 def initialize_conversations() -> Dict[str, List[Dict[str, str]]]:
     """
     Initialize conversation history for all session types.
@@ -87,6 +313,23 @@ def main():
     # Initialize edit mode in session state if not exists
     if 'edit_mode' not in st.session_state:
         st.session_state.edit_mode = False
+    if 'mic_mode' not in st.session_state:
+        st.session_state.mic_mode = False
+        st.session_state.last_recording = None
+    if 'last_document' not in st.session_state:
+        st.session_state.last_document = None
+    if 'pending_edits' not in st.session_state:
+        st.session_state.pending_edits = []
+    if 'history_pages' not in st.session_state:
+        st.session_state.history_pages = {}
+    if 'srs_export' not in st.session_state:
+        st.session_state.srs_export = None
+    
+    # Report edits that failed in the background since the last run
+    for future in [future for future in st.session_state.pending_edits if future.done()]:
+        st.session_state.pending_edits.remove(future)
+        if not isinstance(future.result(), dict):
+            st.error(future.result())
     
     # Sidebar for session type selection and context
     with st.sidebar:
@@ -94,7 +337,9 @@ def main():
         
         # File upload moved to top of sidebar
         st.subheader("File Upload")
-        uploaded_file = st.file_uploader("Browse files", label_visibility="collapsed")
+        uploaded_file = st.file_uploader(
+            "Browse files", type=["txt", "md", "pdf"], label_visibility="collapsed"
+        )
         
         st.divider()
         
@@ -105,6 +350,18 @@ def main():
         )
         st.divider()
         
+        # Assemble the SRS from every expert's latest output; unchanged sections are reused by the backend
+        st.subheader("Export SRS")
+        export_label = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, label_visibility="collapsed")
+        export_format, file_name, mime = EXPORT_FORMATS[export_label]
+        if st.button("Prepare export"):
+            with st.spinner("Assembling the SRS..."):
+                document = export_srs(export_format)
+            st.session_state.srs_export = (export_label, document) if isinstance(document, bytes) else None
+        if st.session_state.srs_export and st.session_state.srs_export[0] == export_label:
+            st.download_button("Download SRS", st.session_state.srs_export[1], file_name=file_name, mime=mime)
+        st.divider()
+        
         st.markdown("### 💡 Tips")
         st.markdown("""
         - Select the appropriate session type for your current task
@@ -125,16 +382,32 @@ def main():
     chat_container = st.container()
     
     with chat_container:
-        # Display chat messages from history for the selected session type
-        for message in messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-        
-        if uploaded_file is not None:
-            st.session_state.conversations[session_type].append(
-                {"role": "user", "content": f"Uploaded file: {uploaded_file.name}"}
+        # Display only the latest pages of history, so render time does not grow with the conversation
+        pages = st.session_state.history_pages.get(session_type, 1)
+        first_shown = max(0, len(messages) - CHAT_PAGE_SIZE * pages)
+        if first_shown:
+            st.button(
+                f"Show older messages ({first_shown} hidden)",
+                on_click=show_older_messages,
+                args=(session_type,),
+                key=f"older-{session_type}",
             )
-            st.success(f"File {uploaded_file.name} uploaded successfully!")
+        for message in messages[first_shown:]:
+            render_message(message)
+        
+        # Index each newly uploaded document once; the experts retrieve from it from then on
+        if uploaded_file is not None and uploaded_file.file_id != st.session_state.last_document:
+            st.session_state.last_document = uploaded_file.file_id
+            with st.spinner(f"Indexing {uploaded_file.name}..."):
+                result = upload_document(uploaded_file)
+            if isinstance(result, dict):
+                st.session_state.conversations[session_type].append(
+                    {"role": "user", "content": f"Uploaded file: {uploaded_file.name}"}
+                )
+                st.success(
+                    f"File {uploaded_file.name} indexed: {result['added']} new, "
+                    f"{result['unchanged']} unchanged and {result['removed']} removed passages."
+                )
     
     # Spacer to push chat input to bottom
     st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
@@ -151,9 +424,23 @@ def main():
     with col3:
         edit_clicked = st.button("✏️")
     
-    # Mic button functionality (simple recording placeholder)
+    # Mic button toggles voice input
     if mic_clicked:
-        st.info("Mic button clicked! (Recording functionality to be implemented)")
+        st.session_state.mic_mode = not st.session_state.mic_mode
+    
+    # Stream each new recording to the backend; its utterances go to the selected expert
+    if st.session_state.mic_mode:
+        recording = st.audio_input("Speak your requirements")
+        if recording is not None and recording.file_id != st.session_state.last_recording:
+            st.session_state.last_recording = recording.file_id
+            status = st.empty()
+            voice_messages = transcribe_live(session_type, recording.getvalue(), status)
+            status.empty()
+            st.session_state.conversations[session_type].extend(voice_messages)
+            # Render the new turns in place rather than rerunning the whole script
+            with chat_container:
+                for message in voice_messages:
+                    render_message(message)
     
     # Edit message functionality
     if edit_clicked:
@@ -184,17 +471,11 @@ def main():
                 with col1:
                     if st.button("Save Changes"):
                         if edit_message_text.strip():
-                            # Call edit message function
-                            result = edit_message(session_type, edit_message_text)
-                            
-                            if isinstance(result, dict):
-                                # Update the last message in session state
-                                st.session_state.conversations[session_type][-1]["content"] = edit_message_text
-                                st.success("Message updated successfully!")
-                                st.session_state.edit_mode = False
-                                st.rerun()
-                            else:
-                                st.error(result)
+                            # Update the message right away; the backend is updated in the background
+                            st.session_state.pending_edits.append(submit_edit(session_type, edit_message_text))
+                            st.session_state.conversations[session_type][-1]["content"] = edit_message_text
+                            st.session_state.edit_mode = False
+                            st.rerun()
                 
                 with col2:
                     if st.button("Cancel"):
@@ -210,23 +491,16 @@ def main():
         # Add user message to chat history
         st.session_state.conversations[session_type].append({"role": "user", "content": prompt})
         
-        # Display user message
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        
-        # Show a loading spinner while getting response
-        with st.spinner("Generating response..."):
-            response = send_message(session_type, prompt)
+        # Render the new turn below the history, without rerunning the whole script
+        with chat_container:
+            render_message({"role": "user", "content": prompt})
+            
+            # Render the AI response token by token as it streams in
+            with st.chat_message("assistant"):
+                response = st.write_stream(stream_message(session_type, prompt))
         
         # Add AI response to chat history
         st.session_state.conversations[session_type].append({"role": "assistant", "content": response})
-        
-        # Display AI response
-        with st.chat_message("assistant"):
-            st.markdown(response)
-        
-        # Rerun to refresh the page and scroll to bottom
-        st.rerun()
 
 if __name__ == "__main__":
     main()
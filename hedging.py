@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """The most recent `size` latencies of one kind of call."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile of the window (0 when empty)."""
+        if not self.samples:
+            return 0.0
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        return self._sorted[min(len(self._sorted) - 1, max(0, int(round(q / 100 * len(self._sorted))) - 1))]
+
+
+class HedgingPolicy:
+    """
+    Hedged requests: a second identical call for a first one that is running late.
+
+    Latencies are tracked per key (expert and model). Once a key has
+    `min_samples` of them, a call still running after the key's `percentile`
+    latency gets a duplicate, and whichever finishes first wins; the other
+    is cancelled. Each call earns `max_hedge_rate` of a hedge credit (up to
+    `burst`) and each hedge spends one, so at most that fraction of calls is
+    duplicated. With a scheduler, a hedge only runs if a slot is free right
+    away, so hedges never queue ahead of other work.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_hedge_rate: float = 0.05,
+        window: int = 200,
+        min_samples: int = 20,
+        burst: float = 5.0,
+    ):
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.burst = burst
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self._credit = 0.0
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging a call (None until enough latencies are known)."""
+        window = self.latencies.get(key)
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return window.percentile(self.percentile)
+
+    def record(self, key: str, seconds: float):
+        window = self.latencies.get(key)
+        if window is None:
+            window = self.latencies[key] = LatencyWindow(self.window)
+        window.add(seconds)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]], scheduler=None, tokens: int = 0) -> T:
+        """Run `call`, hedging it with a second call if it is slower than the key's latency percentile."""
+        self.calls += 1
+        self._credit = min(self.burst, self._credit + self.max_hedge_rate)
+        delay = self.hedge_delay(key)
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(call())
+        if delay is None:
+            result = await primary
+            self.record(key, time.monotonic() - start)
+            return result
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if not done:
+            if self._credit >= 1.0 and (scheduler is None or scheduler.try_acquire(tokens)):
+                self._credit -= 1.0
+                self.hedges += 1
+                return await self._race(key, primary, start, call, scheduler)
+            self.skipped += 1
+
+        result = await primary
+        self.record(key, time.monotonic() - start)
+        return result
+
+    async def _race(self, key: str, primary: asyncio.Future, start: float, call, scheduler) -> T:
+        hedge_start = time.monotonic()
+        hedge = asyncio.ensure_future(call())
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            self.record(key, time.monotonic() - hedge_start)
+                        else:
+                            self.record(key, time.monotonic() - start)
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+            if scheduler is not None:
+                scheduler.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "skipped": self.skipped,
+            "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+            "hedge_delay_seconds": {key: self.hedge_delay(key) for key in sorted(self.latencies)},
+        }
@@ -0,0 +1,154 @@
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+from prompt_assembly import TokenCounter, default_token_counter, message_text
+
+# Defaults for the per-session context budget (in tokens)
+DEFAULT_TOKEN_BUDGET = 2000
+DEFAULT_SUMMARY_BUDGET = 400
+DEFAULT_INHERITED_BUDGET = 300
+# Most recent messages that are never folded into the summary
+MIN_RECENT_MESSAGES = 2
+# Characters of each folded message that are kept in the rolling summary
+SUMMARY_EXCERPT_CHARS = 200
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count: Callable[[str], int] = default_token_counter.tokenizer.count) -> str:
+    """Truncate text to at most max_tokens as measured by `count`, keeping the beginning."""
+    if count(text) <= max_tokens:
+        return text
+    # Longest prefix that still fits once the ellipsis is added
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count(text[:middle].rstrip() + " ...") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + " ..."
+
+
+def summarize_messages(
+    summary: str,
+    messages: Sequence[BaseMessage],
+    max_tokens: int,
+    count: Callable[[str], int] = default_token_counter.tokenizer.count,
+) -> str:
+    """
+    Fold older messages into a running summary.
+
+    Each folded message contributes a short excerpt; when the summary outgrows
+    max_tokens the oldest excerpts are dropped first.
+
+    Args:
+        summary (str): The current summary, possibly empty.
+        messages (Sequence[BaseMessage]): Messages leaving the live window, oldest first.
+        max_tokens (int): Token budget for the resulting summary.
+        count (Callable[[str], int]): Token counter the budget is measured with.
+
+    Returns:
+        str: The updated summary.
+    """
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        excerpt = " ".join(message_text(message).split())
+        if len(excerpt) > SUMMARY_EXCERPT_CHARS:
+            excerpt = excerpt[:SUMMARY_EXCERPT_CHARS].rstrip() + " ..."
+        lines.append(f"{message.type}: {excerpt}")
+
+    while len(lines) > 1 and count("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_to_tokens("\n".join(lines), max_tokens, count)
+
+
+class ManagedChatHistory(BaseChatMessageHistory):
+    """
+    Chat history with a fixed token budget.
+
+    The prompt-facing `messages` are made of three parts: one system message per
+    inherited session (replaced in place, never appended), a rolling summary of
+    turns that fell out of the budget, and the live turns themselves. Budgets
+    are measured with `counter`, the same TokenCounter the prompt is built with.
+    `on_change` is called after turns or the summary change, so that a
+    session store can persist them.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        summary_budget: int = DEFAULT_SUMMARY_BUDGET,
+        inherited_budget: int = DEFAULT_INHERITED_BUDGET,
+        summarizer: Optional[Callable[[str, Sequence[BaseMessage], int], str]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+        counter: TokenCounter = default_token_counter,
+    ):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.inherited_budget = inherited_budget
+        self.counter = counter
+        # Summaries and inherited context change as they are rebuilt, so they skip the counter's cache
+        self.summarizer = summarizer or partial(summarize_messages, count=counter.tokenizer.count)
+        self.on_change = on_change
+        self.turns: List[BaseMessage] = []
+        # Creation time of each live turn, parallel to `turns`
+        self.timestamps: List[float] = []
+        self.summary = ""
+        self.inherited: Dict[str, str] = {}
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Messages sent to the model: inherited context, summary, then live turns."""
+        context = [
+            SystemMessage(content=f"Inherited from {session_id}: {content}")
+            for session_id, content in self.inherited.items()
+        ]
+        if self.summary:
+            context.append(SystemMessage(content=f"Summary of earlier conversation:\n{self.summary}"))
+        return context + self.turns
+
+    def set_inherited(self, session_id: str, content: Optional[str]):
+        """Set (or clear, when content is None) the context inherited from another session."""
+        if content is None:
+            self.inherited.pop(session_id, None)
+        else:
+            self.inherited[session_id] = truncate_to_tokens(content, self.inherited_budget, self.counter.tokenizer.count)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append new turns, then fold the oldest ones into the summary if over budget."""
+        now = time.time()
+        self.turns.extend(messages)
+        self.timestamps.extend(now for _ in messages)
+        self._compact()
+        self.changed()
+
+    def clear(self) -> None:
+        """Remove all turns, the summary and inherited context."""
+        self.turns = []
+        self.timestamps = []
+        self.summary = ""
+        self.inherited = {}
+        self.changed()
+
+    def changed(self):
+        """Notify the owner that turns or the summary changed (including in-place edits)."""
+        if self.on_change is not None:
+            self.on_change()
+
+    def turn_tokens(self) -> int:
+        """Token count of the live turns."""
+        return sum(self.counter.count(message_text(message)) for message in self.turns)
+
+    def _compact(self):
+        """Fold the oldest turns into the summary until the live turns fit the budget."""
+        total = self.turn_tokens()
+        dropped = 0
+        while total > self.token_budget and len(self.turns) - dropped > MIN_RECENT_MESSAGES:
+            total -= self.counter.count(message_text(self.turns[dropped]))
+            dropped += 1
+
+        if dropped:
+            folded, self.turns = self.turns[:dropped], self.turns[dropped:]
+            self.timestamps = self.timestamps[dropped:]
+            self.summary = self.summarizer(self.summary, folded, self.summary_budget)
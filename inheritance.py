@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class InheritanceCycleError(ValueError):
+    """Raised when an inheritance map contains a cycle."""
+
+
+class InheritanceGraph:
+    """
+    Validated, precomputed view of an inheritance map.
+
+    Self-references are dropped and duplicate parents are removed; unknown
+    parents and cycles raise at construction time. Parents, children,
+    topological order, levels and transitive ancestors/descendants are all
+    resolved once up front so that request handling never walks the map.
+    """
+
+    def __init__(self, inheritance: Dict[str, Sequence[str]]):
+        self.parents: Dict[str, Tuple[str, ...]] = {}
+        for session_id, parents in inheritance.items():
+            unique = []
+            for parent in parents:
+                if parent not in inheritance:
+                    raise ValueError(f"'{session_id}' inherits from unknown session '{parent}'.")
+                if parent != session_id and parent not in unique:
+                    unique.append(parent)
+            self.parents[session_id] = tuple(unique)
+
+        self.children: Dict[str, Tuple[str, ...]] = {
+            session_id: tuple(child for child, parents in self.parents.items() if session_id in parents)
+            for session_id in self.parents
+        }
+        self.levels: List[List[str]] = self._compute_levels()
+        self.order: List[str] = [session_id for level in self.levels for session_id in level]
+
+        self.ancestors: Dict[str, FrozenSet[str]] = {}
+        for session_id in self.order:
+            resolved = set(self.parents[session_id])
+            for parent in self.parents[session_id]:
+                resolved |= self.ancestors[parent]
+            self.ancestors[session_id] = frozenset(resolved)
+
+        self.descendants: Dict[str, FrozenSet[str]] = {
+            session_id: frozenset(other for other in self.parents if session_id in self.ancestors[other])
+            for session_id in self.parents
+        }
+
+    def _compute_levels(self) -> List[List[str]]:
+        """Group sessions into topological levels (Kahn's algorithm), keeping map order within a level."""
+        remaining = {session_id: len(parents) for session_id, parents in self.parents.items()}
+        levels = []
+        ready = [session_id for session_id, count in remaining.items() if count == 0]
+        while ready:
+            levels.append(ready)
+            for session_id in ready:
+                del remaining[session_id]
+            next_ready = []
+            for session_id in ready:
+                for child in self.children[session_id]:
+                    remaining[child] -= 1
+                    if remaining[child] == 0:
+                        next_ready.append(child)
+            ready = [session_id for session_id in self.parents if session_id in next_ready]
+
+        if remaining:
+            raise InheritanceCycleError(f"Inheritance cycle detected: {' -> '.join(self._find_cycle(remaining))}")
+        return levels
+
+    def _find_cycle(self, candidates: Iterable[str]) -> List[str]:
+        """Return one cycle among sessions that could not be ordered."""
+        candidates = set(candidates)
+        path: List[str] = []
+        node = next(session_id for session_id in self.parents if session_id in candidates)
+        while node not in path:
+            path.append(node)
+            node = next(parent for parent in self.parents[node] if parent in candidates)
+        return path[path.index(node):] + [node]
+
+
+class SessionVersions:
+    """Per-session change counters used to invalidate derived context."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+
+    def get(self, session_id: str) -> int:
+        return self._versions.get(session_id, 0)
+
+    def bump(self, session_id: str) -> int:
+        """Record that a session's history or memory changed."""
+        self._versions[session_id] = self.get(session_id) + 1
+        return self._versions[session_id]
+
+    def signature(self, session_ids: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self.get(session_id) for session_id in session_ids)
+
+
+class VersionedCache:
+    """
+    Cache of derived values that are rebuilt only when one of their source sessions changes.
+
+    With `max_entries`, the least recently used entries are dropped beyond that many.
+    Lookups run on executor threads, so the entries are locked (builds are not).
+    """
+
+    def __init__(self, versions: SessionVersions, max_entries: Optional[int] = None):
+        self.versions = versions
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, sources: Sequence[str], build: Callable[[], T]) -> T:
+        """Return the cached value for key, rebuilding it if any source session has a new version."""
+        signature = self.versions.signature(sources)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = build()
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+class ResponseCache(BaseCache):
+    """
+    LLM response cache with an in-memory LRU/TTL tier and an optional SQLite disk tier.
+
+    Entries are keyed on a hash of the model string (model name and parameters)
+    and the fully rendered prompt. Attach it to a chat model through its `cache`
+    field; LangChain consults it before every call. From async code the memory
+    tier is checked inline and disk reads and writes run on a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Hash the model string and rendered prompt into a cache key."""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key: str, created: float, return_val: RETURN_VAL_TYPE):
+        """Insert into the memory tier, evicting the least recently used entries."""
+        self._entries[key] = (created, return_val)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup_memory(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            if self._disk is None:
+                self.misses += 1
+            return None
+
+    def _lookup_disk(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        """Look a key up in the disk tier, promoting a hit to the memory tier (blocking)."""
+        with self._disk_lock:
+            row = self._disk.execute("SELECT created, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[0]):
+                self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._disk.commit()
+                row = None
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return_val = loads(row[1])
+        with self._lock:
+            self._remember(key, row[0], return_val)
+            self.hits += 1
+            self.disk_hits += 1
+            return return_val
+
+    def _write_disk(self, key: str, created: float, return_val: RETURN_VAL_TYPE):
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, created, value) VALUES (?, ?, ?)",
+                (key, created, dumps(return_val)),
+            )
+            self._disk.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self.make_key(prompt, llm_string)
+        return_val = self._lookup_memory(key)
+        if return_val is None and self._disk is not None:
+            return_val = self._lookup_disk(key)
+        return return_val
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.make_key(prompt, llm_string)
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, return_val)
+        if self._disk is not None:
+            self._write_disk(key, created, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+
+    # The memory tier is cheap enough to check inline; SQLite reads and commits run in an executor
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self.make_key(prompt, llm_string)
+        return_val = self._lookup_memory(key)
+        if return_val is None and self._disk is not None:
+            return_val = await asyncio.get_running_loop().run_in_executor(None, self._lookup_disk, key)
+        return return_val
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.make_key(prompt, llm_string)
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, return_val)
+        if self._disk is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, created, return_val)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
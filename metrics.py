@@ -0,0 +1,269 @@
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from prompt_assembly import TokenCounter, default_token_counter
+
+# Histogram buckets: seconds for durations, tokens for sizes
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+LabelValues = Tuple[str, ...]
+
+# Chain steps that render a prompt, timed as the "prompt_render" stage
+PROMPT_RUNNABLES = frozenset({"ChatPromptTemplate", "PromptAssembly"})
+
+logger = logging.getLogger("scriptbuilder.requests")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        # Per series: one count per bucket, then +Inf count, then sum
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = format_labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {int(cumulative)}")
+        return lines
+
+
+class Gauge:
+    """Prometheus gauge with a fixed set of label names."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str):
+        self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class RequestTrace:
+    """Stage timings and token counts for one sampled request."""
+
+    def __init__(self, endpoint: str, session_id: str):
+        self.endpoint = endpoint
+        self.session_id = session_id
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.history_tokens: Optional[int] = None
+        self.history_messages: Optional[int] = None
+
+
+# Trace of the request being handled by the current task (None when not sampled)
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+class RequestMetrics:
+    """
+    Per-stage request instrumentation, exported in Prometheus text format.
+
+    Every request's total duration is recorded. A `sample_rate` fraction of
+    requests is traced in detail: stage spans, prompt/completion token counts
+    and the session's history size, plus one JSON log line per request when
+    `log_requests` is on. Untraced requests skip all of that, so a low sample
+    rate keeps the overhead negligible in production. Token counts the
+    provider does not report are measured with `counter`.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, log_requests: bool = False, counter: TokenCounter = default_token_counter):
+        self.sample_rate = sample_rate
+        self.log_requests = log_requests
+        self.counter = counter
+        self.request_seconds = Histogram(
+            "chat_request_seconds", "Total time to handle a chat request.", ("endpoint", "session")
+        )
+        self.stage_seconds = Histogram(
+            "chat_stage_seconds", "Time spent in each stage of a sampled chat request.", ("stage",)
+        )
+        self.prompt_tokens = Histogram(
+            "chat_prompt_tokens", "Prompt tokens per LLM call in sampled requests.", ("session",), TOKEN_BUCKETS
+        )
+        self.completion_tokens = Histogram(
+            "chat_completion_tokens", "Completion tokens per LLM call in sampled requests.", ("session",), TOKEN_BUCKETS
+        )
+        self.history_tokens = Gauge(
+            "chat_history_tokens", "Tokens in the session's stored turns after its last sampled request.", ("session",)
+        )
+        self.history_messages = Gauge(
+            "chat_history_messages", "Messages in the session's stored turns after its last sampled request.", ("session",)
+        )
+        self.callback_handler = StageTimingHandler(self)
+
+    @contextmanager
+    def trace(self, endpoint: str, session_id: str) -> Iterator[Optional[RequestTrace]]:
+        """Time a request, tracing its stages if it is sampled."""
+        trace = RequestTrace(endpoint, session_id) if random.random() < self.sample_rate else None
+        token = current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            elapsed = time.perf_counter() - start
+            try:
+                current_trace.reset(token)
+            except ValueError:
+                # A streaming response closed from another context (client disconnect)
+                pass
+            self.request_seconds.observe(elapsed, endpoint, session_id)
+            if trace is not None:
+                self._finish(trace, elapsed)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time one stage of the current request (a no-op when it is not sampled)."""
+        trace = current_trace.get()
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(trace, name, time.perf_counter() - start)
+
+    def record_stage(self, trace: RequestTrace, name: str, seconds: float):
+        trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+        self.stage_seconds.observe(seconds, name)
+
+    def record_history(self, history):
+        """Record the stored size of the current request's session history."""
+        trace = current_trace.get()
+        if trace is not None and history is not None:
+            trace.history_tokens = history.turn_tokens()
+            trace.history_messages = len(history.turns)
+
+    def _finish(self, trace: RequestTrace, elapsed: float):
+        if trace.history_tokens is not None:
+            self.history_tokens.set(trace.history_tokens, trace.session_id)
+            self.history_messages.set(trace.history_messages, trace.session_id)
+        if self.log_requests:
+            logger.info(json.dumps({
+                "endpoint": trace.endpoint,
+                "session": trace.session_id,
+                "total_ms": round(elapsed * 1000, 2),
+                "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in trace.stages.items()},
+                "prompt_tokens": trace.prompt_tokens,
+                "completion_tokens": trace.completion_tokens,
+                "history_tokens": trace.history_tokens,
+                "history_messages": trace.history_messages,
+            }))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (
+            self.request_seconds, self.stage_seconds, self.prompt_tokens,
+            self.completion_tokens, self.history_tokens, self.history_messages,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that times prompt rendering and LLM calls of the current trace.
+
+    Runs inline on the event loop so it sees the request's trace; LLM time
+    includes waiting for a scheduler slot.
+    """
+
+    run_inline = True
+
+    def __init__(self, metrics: RequestMetrics):
+        self.metrics = metrics
+        self._runs: Dict[UUID, Tuple[RequestTrace, float, int]] = {}
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any):
+        trace = current_trace.get()
+        if trace is not None and kwargs.get("name") in PROMPT_RUNNABLES:
+            self._runs[run_id] = (trace, time.perf_counter(), 0)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.metrics.record_stage(run[0], "prompt_render", time.perf_counter() - run[1])
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any):
+        trace = current_trace.get()
+        if trace is not None:
+            prompt_tokens = sum(self.metrics.counter.count_message(message) for batch in messages for message in batch)
+            self._runs[run_id] = (trace, time.perf_counter(), prompt_tokens)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        trace, start, prompt_tokens = run
+        self.metrics.record_stage(trace, "llm", time.perf_counter() - start)
+
+        # Prefer the provider's usage report; fall back to the shared counter
+        completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens = usage.get("input_tokens", prompt_tokens)
+                    completion_tokens += usage.get("output_tokens", 0)
+                else:
+                    completion_tokens += self.metrics.counter.count(generation.text)
+        trace.prompt_tokens += prompt_tokens
+        trace.completion_tokens += completion_tokens
+        self.metrics.prompt_tokens.observe(prompt_tokens, trace.session_id)
+        self.metrics.completion_tokens.observe(completion_tokens, trace.session_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._runs.pop(run_id, None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._runs.pop(run_id, None)
@@ -0,0 +1,52 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Tuple
+from inheritance import InheritanceGraph
+
+# run_node(session_id, parent_outputs) -> output
+NodeRunner = Callable[[str, Dict[str, str]], Awaitable[str]]
+
+
+class UpstreamFailure(Exception):
+    """Raised for a node that was skipped because one of its ancestors failed."""
+
+
+async def run_dag(graph: InheritanceGraph, run_node: NodeRunner) -> AsyncIterator[Tuple[str, object]]:
+    """
+    Run every node of an inheritance DAG, each as soon as all of its parents are done.
+
+    Nodes whose parents are finished run concurrently, so wall time is bounded
+    by the critical path rather than the sum of all calls. Results are yielded
+    in completion order as (session_id, output) pairs; a failed node yields its
+    exception instead, and its descendants yield UpstreamFailure.
+
+    Args:
+        graph (InheritanceGraph): The validated DAG to run.
+        run_node (NodeRunner): Coroutine producing a node's output from its parents' outputs.
+    """
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(session_id: str) -> str:
+        parent_outputs = {}
+        for parent in graph.parents[session_id]:
+            try:
+                parent_outputs[parent] = await tasks[parent]
+            except Exception:
+                raise UpstreamFailure(f"Skipped because '{parent}' did not complete.")
+        return await run_node(session_id, parent_outputs)
+
+    async def settle(session_id: str) -> Tuple[str, object]:
+        try:
+            return session_id, await tasks[session_id]
+        except Exception as e:
+            return session_id, e
+
+    # Creating tasks in topological order guarantees parents exist before children await them
+    for session_id in graph.order:
+        tasks[session_id] = asyncio.ensure_future(run(session_id))
+
+    try:
+        for finished in asyncio.as_completed([settle(session_id) for session_id in graph.order]):
+            yield await finished
+    finally:
+        for task in tasks.values():
+            task.cancel()
@@ -0,0 +1,313 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.runnables import RunnableLambda
+
+logger = logging.getLogger("scriptbuilder.prompts")
+
+# llama3-8b-8192's context window, and the tokens kept free for the completion
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_COMPLETION_TOKENS = 1024
+# Chat-format tokens around each message (header start, role, header end, blank line, end of turn)
+MESSAGE_OVERHEAD = 5
+# Tokens per prompt outside any message (begin of text, then the assistant header the reply follows)
+PROMPT_OVERHEAD = 5
+# Shares of the trimmable budget when the parts compete for it; a part needing less gives the rest away
+DEFAULT_SHARES = {"history": 0.5, "documents": 0.25, "memory": 0.25}
+
+# Text split roughly the way Llama 3's pre-tokenizer splits it: contractions, words (with one leading
+# space or symbol), numbers of up to three digits, runs of punctuation, then whitespace
+PRETOKENIZE = re.compile(
+    r"'(?:s|t|re|ve|m|ll|d)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+|.",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def message_text(message: BaseMessage) -> str:
+    """Return the text content of a message, whatever its content type."""
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+class HeuristicTokenizer:
+    """
+    Dependency-free token counter for Llama 3 prompts.
+
+    Text is pre-tokenized as Llama 3 does it, then each piece is costed by its
+    length: a word of up to six letters is one token, longer ones one more per
+    six letters, non-ASCII text one token per character. Counts err high, so
+    prompts it accepts fit the real context window.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in PRETOKENIZE.findall(text):
+            word = piece.lstrip()
+            if not word or word[0].isdigit() or len(word) == 1:
+                tokens += 1
+            elif not word.isascii():
+                tokens += len(word)
+            elif word[-1].isalpha():
+                tokens += (len(word) + 5) // 6
+            else:
+                tokens += (len(word) + 2) // 3
+        return tokens
+
+
+class HuggingFaceTokenizer:
+    """Exact counts from a local tokenizer.json (e.g. Llama 3's), read with the tokenizers package."""
+
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(path)
+        self.name = f"tokenizers:{path}"
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def create_tokenizer(path: Optional[str] = None):
+    """Create a tokenizer from a local tokenizer.json if one is given and loadable, else the heuristic one."""
+    if path:
+        try:
+            return HuggingFaceTokenizer(path)
+        except Exception as e:
+            logger.warning("Could not load tokenizer %s (%s); estimating token counts instead", path, e)
+    return HeuristicTokenizer()
+
+
+class TokenCounter:
+    """
+    Token counts memoized by text, so a stored message is only tokenized the first time it is sent.
+
+    One counter is shared by prompt assembly, history budgets, scheduling and
+    metrics, some of which run on worker threads, so the cache is locked.
+    """
+
+    def __init__(self, tokenizer, max_entries: int = 100000):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            tokens = self._counts.get(text)
+            if tokens is not None:
+                self.hits += 1
+                self._counts.move_to_end(text)
+                return tokens
+            self.misses += 1
+        tokens = self.tokenizer.count(text)
+        with self._lock:
+            self._counts[text] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: BaseMessage) -> int:
+        return self.count(message_text(message)) + MESSAGE_OVERHEAD
+
+
+# Used where no counter is passed in (tests, scripts); the app passes its configured one everywhere
+default_token_counter = TokenCounter(HeuristicTokenizer())
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when the parts of a prompt that are never trimmed do not fit the context window."""
+
+    def __init__(self, message: str, report: Dict[str, Any]):
+        super().__init__(message)
+        self.report = report
+
+
+def allocate(available: int, demands: Dict[str, int], shares: Dict[str, float]) -> Dict[str, int]:
+    """
+    Split `available` tokens across parts by weighted max-min fairness.
+
+    Parts that need less than their share get what they need, and what they
+    leave is shared among the rest by weight, so the split is deterministic
+    and nothing is trimmed while the whole prompt fits.
+    """
+    budgets: Dict[str, int] = {}
+    pending = [part for part in demands if demands[part] > 0]
+    for part in demands:
+        if demands[part] <= 0:
+            budgets[part] = 0
+    while pending:
+        total_share = sum(shares[part] for part in pending)
+        satisfied = [part for part in pending if demands[part] <= available * shares[part] / total_share]
+        if not satisfied:
+            for part in pending:
+                budgets[part] = int(available * shares[part] / total_share)
+            break
+        for part in satisfied:
+            budgets[part] = demands[part]
+            available -= demands[part]
+            pending.remove(part)
+    return budgets
+
+
+class PromptAssembler:
+    """
+    Builds one expert's prompt within the model's context window.
+
+    The prompt is the expert's system prompt, retrieved long-term memory,
+    retrieved document passages, the session history and the new input. The
+    system message is built and tokenized once per expert, and history
+    messages are counted through the shared TokenCounter, so a request only
+    tokenizes what is new. Whatever the system prompt, input and completion
+    reserve leave is split across history, documents and memory. A part over
+    its share is trimmed deterministically: the oldest history exchanges go
+    first (then the summary, then inherited context), and memory items and
+    document passages are dropped least relevant first. What was dropped is
+    logged and reported; a prompt that cannot fit even with nothing retrieved or
+    remembered raises PromptTooLargeError before any LLM call is made.
+
+    Memory items and document passages are passed most relevant first and
+    rendered with `render_memory` and `render_documents`.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        counter: TokenCounter,
+        render_memory: Callable[[Sequence[Any]], str],
+        render_documents: Callable[[Sequence[Any]], str],
+        context_window: int = DEFAULT_CONTEXT_WINDOW,
+        completion_tokens: int = DEFAULT_COMPLETION_TOKENS,
+        shares: Optional[Dict[str, float]] = None,
+    ):
+        self.counter = counter
+        self.render_memory = render_memory
+        self.render_documents = render_documents
+        self.context_window = context_window
+        self.completion_tokens = completion_tokens
+        self.shares = shares or DEFAULT_SHARES
+        self.system_message = SystemMessage(content=system_prompt)
+        self.system_tokens = counter.count_message(self.system_message)
+
+    @property
+    def max_prompt_tokens(self) -> int:
+        return self.context_window - self.completion_tokens
+
+    def _context_message(self, heading: str, items: Sequence[Any], render) -> Tuple[SystemMessage, int]:
+        message = SystemMessage(content=heading + render(items))
+        # Retrieved context differs per request, so it is counted without filling the cache
+        return message, self.counter.tokenizer.count(message.content) + MESSAGE_OVERHEAD
+
+    def _trim_items(self, heading: str, items: Sequence[Any], render, budget: int) -> Tuple[SystemMessage, int, int]:
+        """Drop the least relevant items until the rendered message fits the budget."""
+        kept = list(items)
+        message, tokens = self._context_message(heading, kept, render)
+        while kept and tokens > budget:
+            kept.pop()
+            message, tokens = self._context_message(heading, kept, render)
+        return message, tokens, len(items) - len(kept)
+
+    def _trim_history(self, history: Sequence[BaseMessage], counts: List[int], budget: int) -> Tuple[List[BaseMessage], int]:
+        """
+        Drop the oldest turns, then the summary, then inherited context, until the history fits the budget.
+
+        Turns go a whole exchange at a time: a human message together with the
+        replies that follow it, so no reply is left without its question.
+        """
+        context = [[index] for index, message in enumerate(history) if isinstance(message, SystemMessage)]
+        exchanges: List[List[int]] = []
+        for index, message in enumerate(history):
+            if isinstance(message, SystemMessage):
+                continue
+            if isinstance(message, HumanMessage) or not exchanges:
+                exchanges.append([index])
+            else:
+                exchanges[-1].append(index)
+        # The summary follows the inherited context, so reversed it is dropped first
+        drop_order = exchanges + context[::-1]
+        kept = set(range(len(history)))
+        total = sum(counts)
+        for group in drop_order:
+            if total <= budget:
+                break
+            kept.difference_update(group)
+            total -= sum(counts[index] for index in group)
+        return [message for index, message in enumerate(history) if index in kept], total
+
+    def assemble(
+        self,
+        input_text: str,
+        history: Sequence[BaseMessage] = (),
+        memory: Sequence[Any] = (),
+        documents: Sequence[Any] = (),
+    ) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """Return the prompt's messages and a report of its size and of anything dropped to fit it."""
+        input_message = HumanMessage(content=input_text)
+        fixed = PROMPT_OVERHEAD + self.system_tokens + self.counter.count(input_text) + MESSAGE_OVERHEAD
+        memory_message, memory_tokens = self._context_message("Long-term memory: ", memory, self.render_memory)
+        documents_message, documents_tokens = self._context_message(
+            "Relevant project documents:\n", documents, self.render_documents
+        )
+        history_counts = [self.counter.count_message(message) for message in history]
+        demands = {"history": sum(history_counts), "documents": documents_tokens, "memory": memory_tokens}
+
+        report: Dict[str, Any] = {
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "dropped": {"history_messages": 0, "memory_items": 0, "document_passages": 0},
+        }
+        available = self.max_prompt_tokens - fixed
+        if fixed + sum(demands.values()) > self.max_prompt_tokens:
+            # Empty memory and documents still cost their headings
+            floors = {
+                "history": 0,
+                "memory": self._context_message("Long-term memory: ", (), self.render_memory)[1],
+                "documents": self._context_message("Relevant project documents:\n", (), self.render_documents)[1],
+            }
+            if available < sum(floors.values()):
+                report["prompt_tokens"] = fixed + sum(floors.values())
+                raise PromptTooLargeError(
+                    f"The input needs {report['prompt_tokens']} prompt tokens, over the limit of "
+                    f"{self.max_prompt_tokens}; shorten the message.",
+                    report,
+                )
+            budgets = allocate(available - sum(floors.values()), {
+                part: demand - floors[part] for part, demand in demands.items()
+            }, self.shares)
+            # Whole messages and items are dropped, so each part can come in under its budget;
+            # what history leaves goes to memory, and documents get whatever is left after both
+            history, demands["history"] = self._trim_history(history, history_counts, budgets["history"])
+            report["dropped"]["history_messages"] = len(history_counts) - len(history)
+            memory_message, demands["memory"], report["dropped"]["memory_items"] = self._trim_items(
+                "Long-term memory: ", memory, self.render_memory,
+                budgets["memory"] + floors["memory"] + budgets["history"] - demands["history"],
+            )
+            documents_message, demands["documents"], report["dropped"]["document_passages"] = self._trim_items(
+                "Relevant project documents:\n", documents, self.render_documents,
+                available - demands["history"] - demands["memory"],
+            )
+            logger.warning("Prompt trimmed to fit %d tokens: dropped %s", self.max_prompt_tokens, report["dropped"])
+
+        report["prompt_tokens"] = fixed + sum(demands.values())
+        messages = [self.system_message, memory_message, documents_message, *history, input_message]
+        return messages, report
+
+    def invoke(self, inputs: Dict[str, Any]) -> ChatPromptValue:
+        """Chain step: assemble the prompt from the chain inputs, filling in `prompt_report` if one is passed."""
+        messages, report = self.assemble(
+            inputs["input"], inputs.get("history", ()), inputs.get("long_term_memory", ()), inputs.get("documents", ())
+        )
+        if isinstance(inputs.get("prompt_report"), dict):
+            inputs["prompt_report"].update(report)
+        return ChatPromptValue(messages=messages)
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> ChatPromptValue:
+        # Assembly is quick and in memory, so it runs on the event loop instead of a worker thread
+        return self.invoke(inputs)
+
+    def as_runnable(self) -> RunnableLambda:
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name="PromptAssembly")
@@ -29,4 +29,13 @@ I'm here to share knowledge and help you find solutions. What questions do you h
 expert8 = """
 I'm here to share knowledge and help you find solutions. What questions do you have?
 """
- 
\ No newline at end of file
+ 
+pipeline_section = """
+Write your section of the Software Requirements Specification for the project described below.
+
+Project brief:
+{brief}
+
+Sections already written by the experts you build on:
+{parent_sections}
+"""
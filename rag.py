@@ -0,0 +1,323 @@
+import codecs
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+# Optional: PDFs are rejected without pypdf, which is only imported once a PDF is read
+PDF_SUPPORTED = importlib.util.find_spec("pypdf") is not None
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown"}
+# Bytes read from a text document at a time
+READ_BLOCK_SIZE = 16 * 1024
+# Chunks embedded per embedder call while ingesting
+EMBED_BATCH_SIZE = 32
+# Rows allocated for a new project index; the arrays double when full
+INITIAL_CAPACITY = 256
+
+
+class UnsupportedDocumentError(ValueError):
+    """Raised for documents that cannot be ingested."""
+
+
+def document_kind(filename: str) -> str:
+    """Return "text" or "pdf" for a supported file name, raising UnsupportedDocumentError otherwise."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        return "text"
+    if extension == ".pdf":
+        if not PDF_SUPPORTED:
+            raise UnsupportedDocumentError("PDF documents need the pypdf package.")
+        return "pdf"
+    raise UnsupportedDocumentError(f"Unsupported document type '{extension}': use .txt, .md or .pdf.")
+
+
+def iter_document_text(path: str, filename: str) -> Iterator[str]:
+    """Yield a document's text in pieces (blocks of a text file, pages of a PDF) without reading it all at once."""
+    if document_kind(filename) == "pdf":
+        from pypdf import PdfReader
+        for page in PdfReader(path).pages:
+            yield (page.extract_text() or "") + "\n\n"
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    with open(path, "rb") as document:
+        for block in iter(lambda: document.read(READ_BLOCK_SIZE), b""):
+            yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+def split_point(text: str, limit: int) -> int:
+    """Where to end a chunk of at most limit characters: the last paragraph, line, sentence or word break."""
+    for separator in ("\n\n", "\n", ". ", " "):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            return cut + len(separator)
+    return limit
+
+
+def chunk_text(pieces: Iterable[str], chunk_chars: int = 1000) -> Iterator[str]:
+    """
+    Split streamed text into chunks of at most chunk_chars characters.
+
+    Chunks end on natural breaks and do not overlap, so an unchanged stretch
+    of a re-uploaded document yields the same chunks (and content hashes).
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) > chunk_chars:
+            cut = split_point(buffer, chunk_chars)
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ProjectIndex:
+    """
+    Chunk embeddings of one project's documents, held in flat arrays.
+
+    Row i has its vector in `vectors[i]`, its text in `texts[i]` and its
+    (document, part) in `sources[i]`. New chunks are staged masked out in
+    `live` and only go live with the rest of their upload. Chunks dropped
+    from a re-uploaded document are masked out too, and dead rows are
+    compacted away once they make up half of the rows; chunks kept from it
+    are renumbered to their new parts.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.texts: List[str] = []
+        self.sources: List[Tuple[str, int]] = []
+        self.documents: Dict[str, Dict[str, int]] = {}  # document -> chunk hash -> row
+        self.lock = threading.Lock()  # Guards the arrays
+        self.ingest_lock = threading.Lock()  # One ingestion at a time per project
+
+    @property
+    def count(self) -> int:
+        return len(self.texts)
+
+    def stage(self, document: str, parts: List[Tuple[int, str, str]], vectors: np.ndarray) -> Dict[str, int]:
+        """
+        Add embedded chunks, given as (part, hash, text), as rows that are not
+        searched until replace_document makes them part of the document.
+
+        Returns chunk hash -> row. Rows staged by an upload that never
+        finishes stay masked out and are dropped by the next compaction.
+        """
+        with self.lock:
+            start = self.count
+            if start + len(parts) > self.vectors.shape[0]:
+                capacity = max(INITIAL_CAPACITY, self.vectors.shape[0] * 2, start + len(parts))
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:start] = self.vectors[:start]
+                live = np.zeros(capacity, dtype=bool)
+                live[:start] = self.live[:start]
+                self.vectors, self.live = grown, live
+            self.vectors[start:start + len(parts)] = vectors
+            self.live[start:start + len(parts)] = False
+            rows = {}
+            for offset, (part, digest, text) in enumerate(parts):
+                self.texts.append(text)
+                self.sources.append((document, part))
+                rows[digest] = start + offset
+            return rows
+
+    def replace_document(self, document: str, kept: Dict[str, int], parts: Dict[str, int]):
+        """Make kept (chunk hash -> row) the document's live rows, numbered by parts (chunk hash -> part), masking out the rest."""
+        with self.lock:
+            for digest, row in self.documents.get(document, {}).items():
+                if digest not in kept:
+                    self.live[row] = False
+            # Unchanged chunks can move within a re-uploaded document, so citations follow its current layout
+            for digest, row in kept.items():
+                self.live[row] = True
+                self.sources[row] = (document, parts[digest])
+            self.documents[document] = kept
+            if self.count and self.live[:self.count].sum() * 2 < self.count:
+                self._compact()
+
+    def _compact(self):
+        rows = np.flatnonzero(self.live[:self.count])
+        new_row = {int(old): new for new, old in enumerate(rows)}
+        self.vectors = self.vectors[rows].copy()
+        self.live = np.ones(len(rows), dtype=bool)
+        self.texts = [self.texts[row] for row in rows]
+        self.sources = [self.sources[row] for row in rows]
+        self.documents = {
+            document: {digest: new_row[row] for digest, row in hashes.items()}
+            for document, hashes in self.documents.items()
+        }
+
+    def search(self, query_vector: np.ndarray, k: int, min_score: float) -> List[Tuple[str, int, str]]:
+        with self.lock:
+            if not self.count:
+                return []
+            scores = self.vectors[:self.count] @ query_vector
+            scores[~self.live[:self.count]] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k] if self.count > k else np.arange(self.count)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (self.sources[row][0], self.sources[row][1], self.texts[row])
+                for row in top if scores[row] >= min_score
+            ]
+
+    def save(self, path: str):
+        # Snapshot under the lock, write outside it so searches are not held up by disk I/O
+        with self.lock:
+            vectors = self.vectors[:self.count].copy()
+            meta = {
+                "texts": list(self.texts),
+                "sources": list(self.sources),
+                "live": self.live[:self.count].tolist(),
+                "documents": {document: dict(hashes) for document, hashes in self.documents.items()},
+            }
+        tmp_path = f"{path}.tmp"
+        np.save(f"{tmp_path}.npy", vectors)
+        with open(f"{tmp_path}.json", "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(f"{tmp_path}.npy", f"{path}.npy")
+        os.replace(f"{tmp_path}.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> Optional["ProjectIndex"]:
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            vectors = np.load(f"{path}.npy")
+        except (OSError, ValueError):
+            return None
+        if vectors.ndim != 2 or vectors.shape != (len(meta["texts"]), dim):
+            return None
+        index = cls(dim)
+        index.vectors = vectors.astype(np.float32, copy=False)
+        index.live = np.array(meta["live"], dtype=bool)
+        index.texts = meta["texts"]
+        index.sources = [tuple(source) for source in meta["sources"]]
+        index.documents = meta["documents"]
+        return index
+
+
+class DocumentIndex:
+    """
+    Retrieval index of uploaded documents, one array-backed index per project.
+
+    Documents are streamed through chunking and embedding in batches, so a
+    large file is never held in memory whole. A document's new chunks are
+    only retrieved once all of it has been embedded (and saved), so a failed
+    upload leaves the previous version in place. Re-uploading a document only
+    embeds chunks whose content hash is new; chunks that disappeared from it
+    stop being retrieved. With `directory`, each project's index is saved
+    after every ingestion and at most `max_projects` are kept in memory.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        directory: Optional[str] = None,
+        chunk_chars: int = 1000,
+        max_projects: int = 256,
+        min_score: float = 0.05,
+    ):
+        self.embedder = embedder
+        self.directory = os.path.join(directory, embedder.name) if directory else None
+        self.chunk_chars = chunk_chars
+        self.max_projects = max_projects
+        self.min_score = min_score
+        self._projects: "OrderedDict[str, ProjectIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, project: str) -> Optional[str]:
+        return os.path.join(self.directory, chunk_hash(project)) if self.directory else None
+
+    def _project(self, project: str, create: bool = True) -> Optional[ProjectIndex]:
+        with self._lock:
+            index = self._projects.get(project)
+            if index is None:
+                path = self._path(project)
+                index = ProjectIndex.load(path, self.embedder.dim) if path else None
+                if index is None:
+                    if not create:
+                        return None
+                    index = ProjectIndex(self.embedder.dim)
+                self._projects[project] = index
+                # Only indexes saved to disk can be dropped from memory
+                if self.directory:
+                    while len(self._projects) > self.max_projects:
+                        self._projects.popitem(last=False)
+            self._projects.move_to_end(project)
+            return index
+
+    def ingest(self, project: str, path: str, filename: str) -> Dict[str, object]:
+        """
+        Index a document for a project (blocking; run it off the event loop).
+
+        Returns the number of chunks in the document and how many were
+        newly embedded, unchanged or removed since its previous upload.
+        """
+        document_kind(filename)
+        index = self._project(project)
+        with index.ingest_lock:
+            previous = dict(index.documents.get(filename, {}))
+            kept: Dict[str, int] = {}
+            parts: Dict[str, int] = {}  # Chunk hash -> part where it first appears in this upload
+            batch: List[Tuple[int, str, str]] = []
+            chunks = added = 0
+
+            def embed_batch():
+                kept.update(index.stage(filename, batch, self.embedder.embed([text for _, _, text in batch])))
+
+            for part, text in enumerate(chunk_text(iter_document_text(path, filename), self.chunk_chars)):
+                chunks += 1
+                digest = chunk_hash(text)
+                parts.setdefault(digest, part)
+                if digest in previous:
+                    kept[digest] = previous[digest]
+                elif digest not in kept and all(digest != pending for _, pending, _ in batch):
+                    batch.append((part, digest, text))
+                    added += 1
+                    if len(batch) >= EMBED_BATCH_SIZE:
+                        embed_batch()
+                        batch = []
+            if batch:
+                embed_batch()
+
+            index.replace_document(filename, kept, parts)
+            if self.directory:
+                try:
+                    index.save(self._path(project))
+                except Exception:
+                    # Fall back to the last saved index rather than serve an upload that was not persisted
+                    with self._lock:
+                        if self._projects.get(project) is index:
+                            del self._projects[project]
+                    raise
+        return {
+            "document": filename,
+            "chunks": chunks,
+            "added": added,
+            "unchanged": sum(1 for digest in kept if digest in previous),
+            "removed": sum(1 for digest in previous if digest not in kept),
+        }
+
+    def search(self, project: str, query: str, k: int = 4) -> List[Tuple[str, int, str]]:
+        """Return (document, part, text) for the project's k passages most similar to the query, best first."""
+        index = self._project(project, create=False)
+        if index is None or k <= 0:
+            return []
+        return index.search(self.embedder.embed([query])[0], k, self.min_score)
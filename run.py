@@ -1,40 +1,138 @@
-import multiprocessing
+import signal
 import subprocess
 import sys
 import os
 import time
+import urllib.error
+import urllib.request
 
-def run_backend():
-    """Run the FastAPI backend server."""
-    subprocess.run([sys.executable, "backend.py"])
+# Readiness probe served by the backend
+HEALTH_URL = os.getenv("BACKEND_HEALTH_URL", "http://127.0.0.1:8000/healthz")
+# Seconds to wait for the backend to become ready before giving up
+STARTUP_TIMEOUT = float(os.getenv("BACKEND_STARTUP_TIMEOUT", "60"))
+# Seconds between readiness polls while starting, and between health checks once running
+POLL_INTERVAL = 0.1
+CHECK_INTERVAL = 2.0
+# Consecutive failed health checks after which a running backend is restarted
+MAX_FAILED_CHECKS = 3
+# Restart delays grow from RESTART_BACKOFF up to MAX_RESTART_BACKOFF seconds while a process keeps failing
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 30.0
+# A process that stays up this long is considered healthy again, resetting its backoff
+STABLE_SECONDS = 60.0
 
-def run_frontend():
-    """Run the Streamlit frontend."""
-    time.sleep(2)  # Small delay to ensure backend is up
-    subprocess.run([sys.executable, "-m", "streamlit", "run", "frontend.py"])
+def start_backend() -> subprocess.Popen:
+    """Start the FastAPI backend server, telling it when it was launched so it can report its startup time."""
+    return subprocess.Popen([sys.executable, "backend.py"], env={**os.environ, "BACKEND_LAUNCHED_AT": str(time.time())})
+
+def start_frontend() -> subprocess.Popen:
+    """Start the Streamlit frontend."""
+    return subprocess.Popen([sys.executable, "-m", "streamlit", "run", "frontend.py"])
+
+def is_ready(timeout: float = 1.0) -> bool:
+    """Whether the backend answers its readiness probe."""
+    try:
+        with urllib.request.urlopen(HEALTH_URL, timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+def wait_until_ready(process: subprocess.Popen, timeout: float = STARTUP_TIMEOUT) -> bool:
+    """Poll the readiness probe until the backend is serving, it exits, or the timeout passes."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process.poll() is not None:
+            return False
+        if is_ready():
+            print(f"Backend ready in {time.monotonic() - start:.2f}s")
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+def stop(process: subprocess.Popen):
+    """Terminate a process, killing it if it does not exit promptly."""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+class Supervised:
+    """A child process that is restarted, with exponential backoff, whenever it dies."""
+
+    def __init__(self, name: str, start):
+        self.name = name
+        self._start = start
+        self.backoff = RESTART_BACKOFF
+        self.process = None
+        self.started_at = 0.0
+
+    def start(self) -> subprocess.Popen:
+        self.process = self._start()
+        self.started_at = time.monotonic()
+        return self.process
+
+    def restart(self, reason: str) -> subprocess.Popen:
+        stop(self.process)
+        if time.monotonic() - self.started_at >= STABLE_SECONDS:
+            self.backoff = RESTART_BACKOFF
+        print(f"{self.name} {reason}; restarting in {self.backoff:.0f}s")
+        time.sleep(self.backoff)
+        self.backoff = min(MAX_RESTART_BACKOFF, self.backoff * 2)
+        return self.start()
+
+def restart_backend(backend: Supervised, reason: str) -> bool:
+    """Restart the backend and wait until it is serving again; return whether it is."""
+    restart_started = time.monotonic()
+    if wait_until_ready(backend.restart(reason)):
+        print(f"Backend serving again {time.monotonic() - restart_started:.2f}s after it {reason}")
+        return True
+    print("Backend did not become ready after restarting; counting it as a failed health check")
+    return False
+
+def supervise(backend: Supervised, frontend: Supervised):
+    """Restart either process when it exits, and the backend when it stops answering health checks."""
+    failed_checks = 0
+    while True:
+        time.sleep(CHECK_INTERVAL)
+        if backend.process.poll() is not None:
+            ready = restart_backend(backend, f"exited with code {backend.process.returncode}")
+            failed_checks = 0 if ready else 1
+        elif is_ready(timeout=CHECK_INTERVAL):
+            failed_checks = 0
+        else:
+            failed_checks += 1
+            if failed_checks >= MAX_FAILED_CHECKS:
+                ready = restart_backend(backend, f"failed {failed_checks} health checks")
+                failed_checks = 0 if ready else 1
+        if frontend.process.poll() is not None:
+            frontend.restart(f"exited with code {frontend.process.returncode}")
 
 def main():
     # Ensure we're in the correct directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)
+    # Stopping the launcher (e.g. from a service manager) also stops both processes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
-    # Create multiprocessing processes
-    backend_process = multiprocessing.Process(target=run_backend)
-    frontend_process = multiprocessing.Process(target=run_frontend)
-
+    backend = Supervised("Backend", start_backend)
+    frontend = Supervised("Frontend", start_frontend)
     try:
-        # Start both processes
-        backend_process.start()
-        frontend_process.start()
-
-        # Wait for processes to complete
-        frontend_process.join()
+        # The frontend is only started once the backend is serving, so it never talks to a dead port
+        if not wait_until_ready(backend.start()):
+            print("Backend did not become ready; see its output above.")
+            return
+        frontend.start()
+        supervise(backend, frontend)
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
         # Terminate any remaining processes
-        backend_process.terminate()
-        frontend_process.terminate()
+        for supervised in (frontend, backend):
+            if supervised.process is not None:
+                stop(supervised.process)
 
 if __name__ == "__main__":
     main()
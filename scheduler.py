@@ -0,0 +1,334 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from hedging import HedgingPolicy
+from prompt_assembly import TokenCounter, default_token_counter
+
+T = TypeVar("T")
+
+# Priorities (lower runs first)
+INTERACTIVE = 0
+PIPELINE = 1
+BULK = 2
+
+# Priority of LLM calls made from the current task
+current_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+# Completion tokens assumed per call when charging the tokens-per-minute bucket
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Run the enclosed LLM calls at the given scheduler priority."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """HTTP status code carried by a client error, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return status_code_of(error) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = status_code_of(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APIConnectionError", "APITimeoutError"
+    )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from a Retry-After header."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls.
+
+    Calls wait in a priority queue until a concurrency slot is free and the
+    request and token buckets allow them, then run; retryable failures (429s,
+    5xx, timeouts) are retried with jittered exponential backoff, honouring
+    Retry-After when the server sends it.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.in_flight = 0
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _admit(self, tokens: int):
+        self.in_flight += 1
+        if self.request_bucket:
+            self.request_bucket.take(1)
+        if self.token_bucket:
+            self.token_bucket.take(tokens)
+
+    def _dispatch(self):
+        """Admit queued calls in priority order while slots and buckets allow."""
+        self._timer = None
+        while self._queue and self.in_flight < self.max_in_flight:
+            priority, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self._admit(tokens)
+            future.set_result(None)
+
+    async def acquire(self, priority: Optional[int] = None, tokens: int = 0):
+        """Wait for a concurrency slot; pair every successful acquire with release()."""
+        if priority is None:
+            priority = current_priority.get()
+        if not self._queue and self.in_flight < self.max_in_flight and self._wait_time(tokens) == 0:
+            self._admit(tokens)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._sequence), future, tokens])
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been granted just before cancellation
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Take a slot only if one is free right now, without queueing; pair a True result with release()."""
+        if self._queue or self.in_flight >= self.max_in_flight or self._wait_time(tokens) > 0:
+            return False
+        self._admit(tokens)
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None, tokens: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, but never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    async def record_failure(self, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt; sleep and return True if it should be retried."""
+        if is_rate_limited(error):
+            self.rate_limited += 1
+        if not is_retryable(error) or attempt >= self.max_retries:
+            self.failed += 1
+            return False
+        self.retries += 1
+        await asyncio.sleep(self.backoff(attempt, error))
+        return True
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: Optional[int] = None, tokens: int = 0) -> T:
+        """Run `call` under admission control, retrying retryable failures."""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(priority, tokens):
+                    result = await call()
+                self.completed += 1
+                return result
+            except Exception as e:
+                if not await self.record_failure(e, attempt):
+                    raise
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+
+def estimate_tokens(messages: List[BaseMessage], counter: TokenCounter = default_token_counter) -> int:
+    """Tokens to charge for a call: the prompt plus the expected completion."""
+    return sum(counter.count_message(message) for message in messages) + DEFAULT_COMPLETION_TOKENS
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Chat model that sends every call of an inner model through an LLMScheduler.
+
+    Response caching (the `cache` field) happens before `_agenerate`, so cache
+    hits never take a scheduler slot. Streams are retried only if they fail
+    before their first chunk. With a `hedging` policy, slow non-streaming
+    calls are hedged, keyed by the expert named in the run's metadata.
+    Calls are charged to the rate limit as counted by `token_counter`.
+    """
+
+    inner: BaseChatModel
+    scheduler: LLMScheduler
+    hedging: Optional[HedgingPolicy] = None
+    token_counter: TokenCounter = default_token_counter
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.inner._identifying_params
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # Synchronous calls bypass the (asyncio) scheduler
+        return self.inner._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = estimate_tokens(messages, self.token_counter)
+        if self.hedging is None:
+            return await self.scheduler.run(lambda: self.inner._agenerate(messages, stop=stop, **kwargs), tokens=tokens)
+
+        metadata = run_manager.metadata if run_manager is not None else {}
+        key = f"{metadata.get('expert', 'default')}/{self.inner._identifying_params.get('model_name', self.inner._llm_type)}"
+        return await self.scheduler.run(
+            lambda: self.hedging.run(
+                key, lambda: self.inner._agenerate(messages, stop=stop, **kwargs), scheduler=self.scheduler, tokens=tokens
+            ),
+            tokens=tokens,
+        )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = estimate_tokens(messages, self.token_counter)
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.scheduler.slot(tokens=tokens):
+                    async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                        started = True
+                        yield chunk
+                self.scheduler.completed += 1
+                return
+            except Exception as e:
+                if started:
+                    self.scheduler.failed += 1
+                    raise
+                if not await self.scheduler.record_failure(e, attempt):
+                    raise
+                attempt += 1
@@ -0,0 +1,868 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from langchain_core.messages import message_to_dict, messages_from_dict
+from history import ManagedChatHistory
+from prompt_assembly import message_text
+from inheritance import SessionVersions
+
+try:
+    import redis
+except ImportError:  # Only needed for the redis store
+    redis = None
+
+# Raised when a watched key changes before the transaction runs
+WATCH_ERRORS = (redis.exceptions.WatchError,) if redis is not None else ()
+
+HistoryFactory = Callable[[], ManagedChatHistory]
+
+logger = logging.getLogger("scriptbuilder.sessions")
+
+# Rough per-object overheads used to estimate a cached history's memory footprint
+HISTORY_OVERHEAD_BYTES = 2048
+MESSAGE_OVERHEAD_BYTES = 640
+
+
+def history_size(history: ManagedChatHistory) -> int:
+    """Estimate the memory held by a history, in bytes."""
+    return (
+        HISTORY_OVERHEAD_BYTES
+        + len(history.summary)
+        + sum(len(content) for content in history.inherited.values())
+        + sum(len(message_text(message)) + MESSAGE_OVERHEAD_BYTES for message in history.turns)
+    )
+
+
+class SessionLockTimeout(TimeoutError):
+    """Raised when a session's lock is held by another worker for too long."""
+
+
+class SessionStore(ABC):
+    """
+    Interface shared by the session stores.
+
+    A store holds one ManagedChatHistory and one long-term memory list per
+    session. Histories are looked up like a mapping (`session_id in store`,
+    `store[session_id]`, `store.get(session_id)`), so the store can be used
+    wherever a plain chat_store dict was used before.
+
+    `versions` are the session change counters used to invalidate derived
+    context, and `lock(session_id)` serializes turns on a session across every
+    task (and, for shared stores, every process) using the store. Stores
+    implement the lookup and memory methods marked abstract.
+
+    Histories held in memory are kept in `histories`, least recently used
+    first. With `max_cache_bytes`, once their estimated size passes the
+    ceiling, the least recently used idle sessions (no turn holding their
+    lock) are dropped from memory; each store says what happens to them.
+    """
+
+    def __init__(self, history_factory: HistoryFactory = ManagedChatHistory, max_cache_bytes: Optional[int] = None):
+        self.history_factory = history_factory
+        self.max_cache_bytes = max_cache_bytes
+        self.versions = SessionVersions()
+        self.histories: "OrderedDict[str, ManagedChatHistory]" = OrderedDict()
+        self.cached_bytes = 0
+        self.evictions = 0
+        self._sizes: Dict[str, int] = {}
+        # Locks live only while some task holds or waits for them
+        self._local_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @abstractmethod
+    def __contains__(self, session_id: str) -> bool:
+        """Whether the session has a history."""
+
+    @abstractmethod
+    def __getitem__(self, session_id: str) -> ManagedChatHistory:
+        """Return the session's history; raises KeyError if it has none."""
+
+    def get(self, session_id: str, default: Optional[ManagedChatHistory] = None) -> Optional[ManagedChatHistory]:
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    @abstractmethod
+    def get_or_create(self, session_id: str) -> ManagedChatHistory:
+        """Return the session's history, creating an empty one if needed."""
+
+    @abstractmethod
+    def get_memory(self, session_id: str) -> List[str]:
+        """Return the session's long-term memory items (empty if none)."""
+
+    @abstractmethod
+    def set_memory(self, session_id: str, items: List[str]):
+        """Replace the session's long-term memory items."""
+
+    def append_memory(self, session_id: str, item: str, max_items: Optional[int] = None) -> bool:
+        """
+        Add an item to the end of the session's long-term memory, unless it is already there.
+
+        With `max_items`, the oldest items beyond that many are dropped. Returns whether the item was added.
+        """
+        items = self.get_memory(session_id)
+        if item in items:
+            return False
+        items.append(item)
+        self.set_memory(session_id, items[-max_items:] if max_items else items)
+        return True
+
+    def save(self, session_id: str):
+        """Persist a session's history; called automatically when the history changes."""
+
+    def flush(self):
+        """Write any buffered changes to the backing store."""
+
+    def ping(self):
+        """Raise if the backing store cannot be reached."""
+
+    def resident(self, session_id: str) -> bool:
+        """Whether the session can be read and changed without waiting on the backing store."""
+        return False
+
+    def close(self):
+        """Flush and release resources."""
+        self.flush()
+
+    def _local_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._local_locks.get(session_id)
+        if lock is None:
+            lock = self._local_locks[session_id] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        """Hold the session's lock; waiters get it one at a time, in arrival order."""
+        async with self._local_lock(session_id):
+            yield
+
+    def _new_history(self, session_id: str) -> ManagedChatHistory:
+        history = self.history_factory()
+        history.on_change = lambda: self.save(session_id)
+        return history
+
+    def _remember(self, session_id: str, history: ManagedChatHistory):
+        """Cache a history as the most recently used one, then enforce the memory ceiling."""
+        self.histories[session_id] = history
+        self.histories.move_to_end(session_id)
+        self._resize(session_id, history)
+
+    def _resize(self, session_id: str, history: ManagedChatHistory):
+        size = history_size(history)
+        self.cached_bytes += size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = size
+        self._evict()
+
+    def _evict(self):
+        if self.max_cache_bytes is None or self.cached_bytes <= self.max_cache_bytes:
+            return
+        for session_id in list(self.histories)[:-1]:  # Never the session just used
+            if self.cached_bytes <= self.max_cache_bytes:
+                break
+            lock = self._local_locks.get(session_id)
+            if lock is not None and lock.locked():
+                continue
+            history = self.histories.pop(session_id)
+            self.cached_bytes -= self._sizes.pop(session_id, 0)
+            self.evictions += 1
+            self._forget(session_id, history)
+
+    def _forget(self, session_id: str, history: ManagedChatHistory):
+        """Drop (or set aside) whatever else the store keeps in memory for an evicted session."""
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Session store backed by process-local dicts; nothing survives a restart.
+
+    With `max_cache_bytes`, the least recently used idle sessions (history and
+    memory) are spilled to one JSON file each in `spill_dir`, a temporary
+    directory removed on close unless one is given, and read back into memory
+    on their next access.
+    """
+
+    def __init__(
+        self,
+        history_factory: HistoryFactory = ManagedChatHistory,
+        max_cache_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        super().__init__(history_factory, max_cache_bytes)
+        self.memories: Dict[str, List[str]] = {}
+        self._owns_spill_dir = spill_dir is None and max_cache_bytes is not None
+        if self._owns_spill_dir:
+            spill_dir = tempfile.mkdtemp(prefix="scriptbuilder-sessions-")
+        elif spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = spill_dir
+        self._spilled: set = set()
+        # Eviction can run inside a restore, on whichever thread touched the store
+        self._spill_lock = threading.RLock()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.histories or session_id in self._spilled
+
+    def resident(self, session_id: str) -> bool:
+        return session_id in self.histories
+
+    def __getitem__(self, session_id: str) -> ManagedChatHistory:
+        history = self.histories.get(session_id)
+        if history is None:
+            return self._restore(session_id)
+        self.histories.move_to_end(session_id)
+        return history
+
+    def get_or_create(self, session_id: str) -> ManagedChatHistory:
+        try:
+            return self[session_id]
+        except KeyError:
+            history = self._new_history(session_id)
+            self._remember(session_id, history)
+            return history
+
+    def save(self, session_id: str):
+        history = self.histories.get(session_id)
+        if history is not None:
+            self._resize(session_id, history)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def _forget(self, session_id: str, history: ManagedChatHistory):
+        record = {
+            "summary": history.summary,
+            "inherited": history.inherited,
+            "timestamps": history.timestamps,
+            "turns": [message_to_dict(message) for message in history.turns],
+            "memory": self.memories.pop(session_id, []),
+        }
+        with self._spill_lock:
+            with open(self._spill_path(session_id), "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            self._spilled.add(session_id)
+
+    def _restore(self, session_id: str) -> ManagedChatHistory:
+        """Read a spilled session back into memory; raises KeyError if the session does not exist."""
+        with self._spill_lock:
+            history = self.histories.get(session_id)
+            if history is not None:
+                return history  # Restored by another thread meanwhile
+            if session_id not in self._spilled:
+                raise KeyError(session_id)
+            path = self._spill_path(session_id)
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+            os.remove(path)
+            self._spilled.discard(session_id)
+            history = self._new_history(session_id)
+            history.summary = record["summary"]
+            history.inherited = record["inherited"]
+            history.timestamps = record["timestamps"]
+            history.turns = messages_from_dict(record["turns"])
+            self.memories[session_id] = record["memory"]
+            self._remember(session_id, history)
+            return history
+
+    def get_memory(self, session_id: str) -> List[str]:
+        if session_id in self._spilled:
+            self._restore(session_id)
+        return list(self.memories.get(session_id, []))
+
+    def set_memory(self, session_id: str, items: List[str]):
+        if session_id in self._spilled:
+            self._restore(session_id)
+        self.memories[session_id] = list(items)
+
+    def append_memory(self, session_id: str, item: str, max_items: Optional[int] = None) -> bool:
+        if session_id in self._spilled:
+            self._restore(session_id)
+        items = self.memories.setdefault(session_id, [])
+        if item in items:
+            return False
+        items.append(item)
+        if max_items and len(items) > max_items:
+            del items[:len(items) - max_items]
+        return True
+
+    def close(self):
+        super().close()
+        if self._owns_spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, position)
+);
+CREATE INDEX IF NOT EXISTS messages_session_time ON messages (session_id, created_at);
+CREATE TABLE IF NOT EXISTS memories (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session_id, position)
+);
+"""
+
+# (summary, [(created_at, type, serialized message), ...])
+HistorySnapshot = Tuple[str, List[Tuple[float, str, str]]]
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Durable session store backed by SQLite in WAL mode.
+
+    Sessions are loaded lazily on first access and then kept in memory, so
+    startup cost does not depend on how many sessions are stored. Changes are
+    snapshotted on the caller's thread and written behind by a background
+    thread, batched into one transaction every `flush_interval` seconds or
+    as soon as `batch_size` sessions are pending.
+
+    With `max_cache_bytes`, evicted sessions are reloaded from disk, or from
+    their pending snapshot, on next access.
+
+    Memory items are rows numbered by position: appending one writes one row,
+    and items dropped from the front are deleted by position, so a turn never
+    rewrites a session's whole memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        history_factory: HistoryFactory = ManagedChatHistory,
+        flush_interval: float = 0.5,
+        batch_size: int = 64,
+        max_cache_bytes: Optional[int] = None,
+    ):
+        super().__init__(history_factory, max_cache_bytes)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.memories: Dict[str, List[str]] = {}
+        # Position of each cached memory list's first item
+        self._memory_starts: Dict[str, int] = {}
+
+        self._reader = self._connect()
+        self._writer = self._connect()
+        self._writer.executescript(SQLITE_SCHEMA)
+        self._reader_lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+
+        self._pending_histories: Dict[str, HistorySnapshot] = {}
+        # Memory changes: whole lists replaced, (position, item) rows appended, and positions below a mark dropped
+        self._pending_memories: Dict[str, List[str]] = {}
+        self._pending_memory_rows: Dict[str, List[Tuple[int, str]]] = {}
+        self._pending_memory_trims: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __contains__(self, session_id: str) -> bool:
+        if session_id in self.histories:
+            return True
+        with self._reader_lock:
+            row = self._reader.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def ping(self):
+        with self._reader_lock:
+            self._reader.execute("SELECT 1").fetchone()
+
+    def resident(self, session_id: str) -> bool:
+        # Changes are written behind, so only a load has to wait on the database
+        return session_id in self.histories
+
+    def __getitem__(self, session_id: str) -> ManagedChatHistory:
+        history = self.histories.get(session_id)
+        if history is None:
+            history = self._load_history(session_id)
+            if history is None:
+                raise KeyError(session_id)
+            self._remember(session_id, history)
+        else:
+            self.histories.move_to_end(session_id)
+        return history
+
+    def get_or_create(self, session_id: str) -> ManagedChatHistory:
+        try:
+            return self[session_id]
+        except KeyError:
+            history = self._new_history(session_id)
+            self._remember(session_id, history)
+            return history
+
+    def _forget(self, session_id: str, history: ManagedChatHistory):
+        self.memories.pop(session_id, None)
+        self._memory_starts.pop(session_id, None)
+
+    def _load_history(self, session_id: str) -> Optional[ManagedChatHistory]:
+        # An evicted session may have changes that are not on disk yet
+        with self._pending_lock:
+            pending = self._pending_histories.get(session_id)
+        if pending is not None:
+            summary, rows = pending
+            history = self._new_history(session_id)
+            history.summary = summary
+            history.timestamps = [row[0] for row in rows]
+            history.turns = messages_from_dict([json.loads(row[2]) for row in rows])
+            return history
+
+        with self._reader_lock:
+            session = self._reader.execute(
+                "SELECT summary FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if session is None:
+                return None
+            rows = self._reader.execute(
+                "SELECT created_at, data FROM messages WHERE session_id = ? ORDER BY position", (session_id,)
+            ).fetchall()
+
+        history = self._new_history(session_id)
+        history.summary = session[0]
+        history.timestamps = [row[0] for row in rows]
+        history.turns = messages_from_dict([json.loads(row[1]) for row in rows])
+        return history
+
+    def _load_memory(self, session_id: str) -> List[str]:
+        # An evicted session may have changes that are not on disk yet
+        with self._pending_lock:
+            replaced = self._pending_memories.get(session_id)
+            appended = self._pending_memory_rows.get(session_id, [])
+            dropped_below = self._pending_memory_trims.get(session_id, 0)
+        if replaced is not None:
+            rows = list(enumerate(replaced))
+        else:
+            with self._reader_lock:
+                rows = self._reader.execute(
+                    "SELECT position, content FROM memories WHERE session_id = ? ORDER BY position", (session_id,)
+                ).fetchall()
+        # Appended rows may already be committed too; keyed by position, they are counted once
+        by_position = dict(rows)
+        by_position.update(appended)
+        positions = sorted(position for position in by_position if position >= dropped_below)
+        self.memories[session_id] = [by_position[position] for position in positions]
+        self._memory_starts[session_id] = positions[0] if positions else 0
+        return self.memories[session_id]
+
+    def get_memory(self, session_id: str) -> List[str]:
+        items = self.memories.get(session_id)
+        if items is None:
+            items = self._load_memory(session_id)
+        return list(items)
+
+    def set_memory(self, session_id: str, items: List[str]):
+        self.memories[session_id] = list(items)
+        self._memory_starts[session_id] = 0
+        with self._pending_lock:
+            self._pending_memories[session_id] = list(items)
+            self._pending_memory_rows.pop(session_id, None)
+            self._pending_memory_trims.pop(session_id, None)
+        self._maybe_wake()
+
+    def append_memory(self, session_id: str, item: str, max_items: Optional[int] = None) -> bool:
+        items = self.memories.get(session_id)
+        if items is None:
+            items = self._load_memory(session_id)
+        if item in items:
+            return False
+        row = (self._memory_starts[session_id] + len(items), item)
+        items.append(item)
+        dropped_below = None
+        if max_items and len(items) > max_items:
+            dropped = len(items) - max_items
+            del items[:dropped]
+            self._memory_starts[session_id] += dropped
+            dropped_below = self._memory_starts[session_id]
+        with self._pending_lock:
+            # A new list each time, so flush() can tell which rows it wrote
+            self._pending_memory_rows[session_id] = self._pending_memory_rows.get(session_id, []) + [row]
+            if dropped_below is not None:
+                self._pending_memory_trims[session_id] = dropped_below
+        self._maybe_wake()
+        return True
+
+    def save(self, session_id: str):
+        history = self.histories.get(session_id)
+        if history is None:
+            return
+        snapshot = (
+            history.summary,
+            [
+                (created_at, message.type, json.dumps(message_to_dict(message)))
+                for created_at, message in zip(history.timestamps, history.turns)
+            ],
+        )
+        with self._pending_lock:
+            self._pending_histories[session_id] = snapshot
+        self._maybe_wake()
+        self._resize(session_id, history)
+
+    def _maybe_wake(self):
+        pending = (
+            len(self._pending_histories) + len(self._pending_memories)
+            + len(self._pending_memory_rows) + len(self._pending_memory_trims)
+        )
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        # Snapshots stay pending until committed, so an evicted session never reloads stale rows
+        with self._pending_lock:
+            histories = dict(self._pending_histories)
+            memories = dict(self._pending_memories)
+            memory_rows = dict(self._pending_memory_rows)
+            memory_trims = dict(self._pending_memory_trims)
+        if not (histories or memories or memory_rows or memory_trims):
+            return
+
+        with self._writer_lock, self._writer:
+            updated_at = time.time()
+            for session_id, (summary, rows) in histories.items():
+                self._writer.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, summary, updated_at) VALUES (?, ?, ?)",
+                    (session_id, summary, updated_at),
+                )
+                self._writer.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._writer.executemany(
+                    "INSERT INTO messages (session_id, position, created_at, type, data) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, position) + row for position, row in enumerate(rows)],
+                )
+            for session_id, items in memories.items():
+                self._writer.execute("DELETE FROM memories WHERE session_id = ?", (session_id,))
+                self._writer.executemany(
+                    "INSERT INTO memories (session_id, position, content) VALUES (?, ?, ?)",
+                    [(session_id, position, content) for position, content in enumerate(items)],
+                )
+            for session_id, rows in memory_rows.items():
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO memories (session_id, position, content) VALUES (?, ?, ?)",
+                    [(session_id, position, content) for position, content in rows],
+                )
+            for session_id, dropped_below in memory_trims.items():
+                self._writer.execute(
+                    "DELETE FROM memories WHERE session_id = ? AND position < ?", (session_id, dropped_below)
+                )
+
+        with self._pending_lock:
+            for session_id, snapshot in histories.items():
+                if self._pending_histories.get(session_id) is snapshot:
+                    del self._pending_histories[session_id]
+            for session_id, items in memories.items():
+                if self._pending_memories.get(session_id) is items:
+                    del self._pending_memories[session_id]
+            for session_id, rows in memory_rows.items():
+                pending = self._pending_memory_rows.get(session_id)
+                if pending is rows:
+                    del self._pending_memory_rows[session_id]
+                elif pending is not None and len(pending) > len(rows) and pending[len(rows) - 1] is rows[-1]:
+                    # Rows appended while this batch was written stay pending
+                    self._pending_memory_rows[session_id] = pending[len(rows):]
+            for session_id, dropped_below in memory_trims.items():
+                if self._pending_memory_trims.get(session_id) == dropped_below:
+                    del self._pending_memory_trims[session_id]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        self._reader.close()
+        self._writer.close()
+
+
+def as_text(value) -> Optional[str]:
+    """Decode a Redis reply that may be bytes."""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisSessionVersions(SessionVersions):
+    """Session change counters kept in Redis, so every worker invalidates the same derived context."""
+
+    def __init__(self, client, prefix: str = "scriptbuilder:"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}version:{session_id}"
+
+    def get(self, session_id: str) -> int:
+        return int(self.client.get(self._key(session_id)) or 0)
+
+    def bump(self, session_id: str) -> int:
+        return int(self.client.incr(self._key(session_id)))
+
+    def signature(self, session_ids: Iterable[str]) -> Tuple[int, ...]:
+        keys = [self._key(session_id) for session_id in session_ids]
+        if not keys:
+            return ()
+        return tuple(int(value or 0) for value in self.client.mget(keys))
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store shared by several worker processes through Redis.
+
+    Writes go straight to Redis in one transaction per change, together with a
+    per-session revision number. Each worker keeps the histories it has used in
+    memory and reloads one only when its revision in Redis has moved on, so a
+    turn handled by another worker is always seen (with `max_cache_bytes`,
+    evicted histories are simply reloaded on next access); while this worker holds a
+    session's lock, nobody else can write it, so the revision is checked only
+    once per turn. `lock()` is a Redis lock (SET NX with a TTL) that
+    serializes turns on a session across workers; waiters in the same worker
+    queue on a local lock first, so at most one per worker polls Redis. Its
+    Redis calls run on the default executor, off the event loop, and the TTL
+    is extended while the lock is held, so a long turn does not lose it.
+
+    Pass `client` to use an existing Redis-protocol client (e.g. fakeredis);
+    otherwise one is created from `url`, giving up on connecting or on a reply
+    after `socket_timeout` seconds, so an unreachable Redis fails requests
+    instead of stalling them.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        history_factory: HistoryFactory = ManagedChatHistory,
+        client=None,
+        prefix: str = "scriptbuilder:",
+        lock_ttl: float = 120.0,
+        lock_timeout: float = 60.0,
+        lock_poll_interval: float = 0.01,
+        max_cache_bytes: Optional[int] = None,
+        socket_timeout: float = 5.0,
+    ):
+        super().__init__(history_factory, max_cache_bytes)
+        if client is None:
+            if redis is None:
+                raise ImportError("The redis session store requires the 'redis' package.")
+            client = redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        self.client = client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.lock_timeout = lock_timeout
+        self.lock_poll_interval = lock_poll_interval
+        self.versions = RedisSessionVersions(client, prefix)
+        self._revisions: Dict[str, int] = {}
+        # Sessions whose lock this worker holds, and those of them already checked against Redis this turn
+        self._held: set = set()
+        self._verified: set = set()
+
+    def _key(self, kind: str, session_id: str) -> str:
+        return f"{self.prefix}{kind}:{session_id}"
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.histories or bool(self.client.exists(self._key("session", session_id)))
+
+    def __getitem__(self, session_id: str) -> ManagedChatHistory:
+        if session_id in self._verified and session_id in self.histories:
+            self.histories.move_to_end(session_id)
+            return self.histories[session_id]
+        revision = self.client.hget(self._key("session", session_id), "revision")
+        if revision is None:
+            if session_id in self.histories and session_id not in self._revisions:
+                return self.histories[session_id]  # Created here, not saved yet
+            raise KeyError(session_id)
+        if self._revisions.get(session_id) != int(revision) or session_id not in self.histories:
+            self._load_history(session_id)
+        else:
+            self.histories.move_to_end(session_id)
+        if session_id in self._held:
+            self._verified.add(session_id)
+        return self.histories[session_id]
+
+    def get_or_create(self, session_id: str) -> ManagedChatHistory:
+        try:
+            return self[session_id]
+        except KeyError:
+            history = self._new_history(session_id)
+            self._revisions.pop(session_id, None)
+            self._remember(session_id, history)
+            return history
+
+    def _load_history(self, session_id: str):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hmget(self._key("session", session_id), ["revision", "summary"])
+        pipe.lrange(self._key("messages", session_id), 0, -1)
+        (revision, summary), rows = pipe.execute()
+        rows = [json.loads(as_text(row)) for row in rows]
+
+        # Refresh in place, so callers holding the history see the new turns
+        history = self.histories.get(session_id) or self._new_history(session_id)
+        history.summary = as_text(summary) or ""
+        history.timestamps = [row["created_at"] for row in rows]
+        history.turns = messages_from_dict([row["data"] for row in rows])
+        self._revisions[session_id] = int(revision or 0)
+        self._remember(session_id, history)
+
+    def get_memory(self, session_id: str) -> List[str]:
+        return [as_text(item) for item in self.client.lrange(self._key("memory", session_id), 0, -1)]
+
+    def set_memory(self, session_id: str, items: List[str]):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key("memory", session_id))
+        if items:
+            pipe.rpush(self._key("memory", session_id), *items)
+        pipe.execute()
+
+    def append_memory(self, session_id: str, item: str, max_items: Optional[int] = None) -> bool:
+        key = self._key("memory", session_id)
+        if self.client.lpos(key, item) is not None:
+            return False
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(key, item)
+        if max_items:
+            pipe.ltrim(key, -max_items, -1)
+        pipe.execute()
+        return True
+
+    def save(self, session_id: str):
+        history = self.histories.get(session_id)
+        if history is None:
+            return
+        rows = [
+            json.dumps({"created_at": created_at, "data": message_to_dict(message)})
+            for created_at, message in zip(history.timestamps, history.turns)
+        ]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key("messages", session_id))
+        if rows:
+            pipe.rpush(self._key("messages", session_id), *rows)
+        pipe.hset(self._key("session", session_id), "summary", history.summary)
+        pipe.hincrby(self._key("session", session_id), "revision", 1)
+        self._revisions[session_id] = int(pipe.execute()[-1])
+        self._resize(session_id, history)
+
+    def _forget(self, session_id: str, history: ManagedChatHistory):
+        self._revisions.pop(session_id, None)
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        """Hold the session's Redis lock; raises SessionLockTimeout if it cannot be taken within `lock_timeout`."""
+        async with self._local_lock(session_id):
+            loop = asyncio.get_running_loop()
+            key = self._key("lock", session_id)
+            deadline = time.monotonic() + self.lock_timeout
+            token = uuid.uuid4().hex
+            take = partial(self.client.set, key, token, nx=True, px=int(self.lock_ttl * 1000))
+            while not await loop.run_in_executor(None, take):
+                if time.monotonic() >= deadline:
+                    raise SessionLockTimeout(f"Timed out waiting for the lock on session '{session_id}'.")
+                await asyncio.sleep(self.lock_poll_interval)
+            self._held.add(session_id)
+            keeper = asyncio.ensure_future(self._keep_lock(key, token))
+            try:
+                yield
+            finally:
+                keeper.cancel()
+                self._held.discard(session_id)
+                self._verified.discard(session_id)
+                await loop.run_in_executor(None, self._release, key, token)
+
+    async def _keep_lock(self, key: str, token: str):
+        """Extend a held lock's TTL every third of it; log loudly if the lock was lost anyway."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                extended = await loop.run_in_executor(None, self._extend, key, token)
+            except Exception:
+                logger.exception("Could not extend the lock %s; retrying", key)
+                continue
+            if not extended:
+                logger.error("Lost the lock %s while holding it; another worker may be running a turn on the session", key)
+                return
+
+    def _extend(self, key: str, token: str) -> bool:
+        """Reset the lock's TTL if it is still ours."""
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if as_text(pipe.get(key)) != token:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.pexpire(key, int(self.lock_ttl * 1000))
+                pipe.execute()
+                return True
+            except WATCH_ERRORS:
+                return False
+
+    def _release(self, key: str, token: str):
+        """Delete the lock only if it is still ours (it may have expired and been taken by another worker)."""
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if as_text(pipe.get(key)) == token:
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+            except WATCH_ERRORS:
+                pass  # Changed under us, so it was no longer ours
+
+    def ping(self):
+        self.client.ping()
+
+    def close(self):
+        self.client.close()
+
+
+def create_session_store(kind: str, history_factory: HistoryFactory = ManagedChatHistory, **kwargs) -> SessionStore:
+    """Create a session store by name ("memory", "sqlite" or "redis")."""
+    if kind == "memory":
+        return InMemorySessionStore(history_factory, max_cache_bytes=kwargs.get("max_cache_bytes"))
+    if kind == "sqlite":
+        return SQLiteSessionStore(
+            kwargs.get("path", "sessions.db"), history_factory, max_cache_bytes=kwargs.get("max_cache_bytes")
+        )
+    if kind == "redis":
+        return RedisSessionStore(
+            kwargs.get("url", "redis://localhost:6379/0"),
+            history_factory,
+            client=kwargs.get("client"),
+            max_cache_bytes=kwargs.get("max_cache_bytes"),
+            socket_timeout=kwargs.get("socket_timeout", 5.0),
+        )
+    raise ValueError(f"Unknown session store: {kind}")
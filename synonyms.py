@@ -0,0 +1,139 @@
+import asyncio
+import json
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from langchain_core.caches import BaseCache
+from langchain_core.outputs import Generation
+
+# Words packed into a single LLM call
+DEFAULT_BATCH_SIZE = 25
+
+
+def normalize_word(word: str) -> str:
+    return word.strip().lower()
+
+
+def parse_synonym_batch(content: str, words: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Parse a batched synonym response back into per-word lists.
+
+    The model is asked for a JSON object mapping each word to its synonyms;
+    surrounding prose is ignored and comma-separated strings are accepted in
+    place of lists. Words missing from the response are left out.
+
+    Args:
+        content (str): Raw model output.
+        words (Iterable[str]): The normalized words that were requested.
+
+    Returns:
+        Dict[str, List[str]]: Synonyms for each word found in the response.
+    """
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    by_word = {normalize_word(str(key)): value for key, value in data.items()}
+    results = {}
+    for word in words:
+        value = by_word.get(word)
+        if isinstance(value, str):
+            value = value.split(",")
+        if isinstance(value, list):
+            results[word] = [str(item).strip() for item in value if str(item).strip()]
+    return results
+
+
+class SynonymBatcher:
+    """
+    Deduplicates synonym lookups, packs them into batched LLM calls and
+    coalesces concurrent requests for the same word onto one in-flight future.
+
+    With a `cache` (any LangChain cache, e.g. the app's ResponseCache), each
+    word's synonyms are cached on their own under `cache_namespace`: words
+    already cached are answered from it, only the misses are sent to the
+    LLM, and every word parsed from a response is stored separately.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[List[str]], Awaitable[Dict[str, List[str]]]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        cache: Optional[BaseCache] = None,
+        cache_namespace: str = "synonyms",
+    ):
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.cache = cache
+        self.cache_namespace = cache_namespace
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+
+    async def get_many(self, words: Iterable[str]) -> Dict[str, List[str]]:
+        """Get synonyms for every distinct (normalized) word."""
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, asyncio.Future] = {}
+        to_fetch = []
+        for word in map(normalize_word, words):
+            if not word or word in futures:
+                continue
+            future = self._inflight.get(word)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[word] = future
+                to_fetch.append(word)
+            futures[word] = future
+
+        # Registered as in flight first, so concurrent callers wait on the lookup instead of repeating it
+        if self.cache is not None and to_fetch:
+            to_fetch = await self._answer_from_cache(to_fetch)
+
+        for start in range(0, len(to_fetch), self.batch_size):
+            task = asyncio.ensure_future(self._run_batch(to_fetch[start:start + self.batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # Shield shared futures so one cancelled caller does not cancel the others
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures, results))
+
+    async def _answer_from_cache(self, words: List[str]) -> List[str]:
+        """Resolve the words found in the cache; return the rest."""
+        misses = []
+        for word in words:
+            cached = await self.cache.alookup(word, self.cache_namespace)
+            if cached:
+                self._inflight.pop(word).set_result(json.loads(cached[0].text))
+            else:
+                misses.append(word)
+        return misses
+
+    async def _run_batch(self, batch: List[str]):
+        """Fetch one batch, retrying words the model left out once, and resolve their futures."""
+        try:
+            results = await self.fetch(batch)
+            missing = [word for word in batch if word not in results]
+            if missing and len(missing) < len(batch):
+                results.update(await self.fetch(missing))
+            if self.cache is not None:
+                # Words the model left out are not cached, so they are asked for again next time
+                for word in batch:
+                    if word in results:
+                        await self.cache.aupdate(word, self.cache_namespace, [Generation(text=json.dumps(results[word]))])
+            for word in batch:
+                future = self._inflight.get(word)
+                if future is not None and not future.done():
+                    future.set_result(results.get(word, []))
+        except Exception as e:
+            for word in batch:
+                future = self._inflight.get(word)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        finally:
+            for word in batch:
+                self._inflight.pop(word, None)
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The backend reads its settings at import time: run it against the local stand-ins, in memory
+os.environ.update({
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY": "0",
+    "TRANSCRIPTION_BACKEND": "fake",
+    "SESSION_STORE": "memory",
+    "BACKEND_WARMUP": "0",
+    "TRANSCRIPT_CACHE_DIR": os.path.join(tempfile.mkdtemp(prefix="scriptbuilder-tests-"), "transcripts"),
+})
+for name in ("LLM_CACHE_PATH", "LLM_HEDGE_PERCENTILE", "VECTOR_MEMORY_PATH", "DOCUMENT_INDEX_PATH", "EMBEDDING_MODEL"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One test client for the whole run, so the app starts up (and shuts down) once."""
+    from fastapi.testclient import TestClient
+    import backend
+    with TestClient(backend.app) as test_client:
+        yield test_client
@@ -0,0 +1,86 @@
+import asyncio
+import io
+import random
+import time
+import wave
+import pytest
+from audio_jobs import AudioJobQueue, RedisJobRegistry
+
+# Seconds to wait for a background job to finish
+JOB_TIMEOUT = 10
+
+
+def wav_bytes(seconds: float = 3, frame_rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(frame_rate)
+        wav_file.writeframes(random.Random(3).randbytes(int(seconds * frame_rate) * 2))
+    return buffer.getvalue()
+
+
+def wait_for_job(client, job_id: str, **params) -> dict:
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while True:
+        response = client.get(f"/audio-jobs/{job_id}", params=params)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("completed", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_audio_job_transcribes_an_upload(client):
+    response = client.post("/audio-jobs/", files={"file": ("meeting.wav", wav_bytes(), "audio/wav")})
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "completed"
+    assert job["transcript"].startswith("Speaker ")
+    assert job["error"] is None
+
+
+def test_failed_transcription_fails_the_job(client):
+    response = client.post("/audio-jobs/", files={"file": ("broken.wav", b"not audio", "audio/wav")})
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"]
+    assert job["transcript"] is None
+
+
+def test_audio_jobs_are_scoped_to_their_namespace(client):
+    params = {"tenant": "acme", "user": "ana", "project": "jobs"}
+    response = client.post("/audio-jobs/", params=params, files={"file": ("meeting.wav", wav_bytes(1), "audio/wav")})
+    job_id = response.json()["job_id"]
+    assert wait_for_job(client, job_id, **params)["status"] == "completed"
+    assert client.get(f"/audio-jobs/{job_id}").status_code == 404
+
+
+def test_jobs_in_redis_are_visible_to_every_worker(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    path = tmp_path / "upload.wav"
+    path.write_bytes(b"audio")
+
+    def process(path: str, chunked: bool) -> str:
+        time.sleep(0.05)
+        return "Speaker 0: hello"
+
+    async def main():
+        # Two worker processes: one runs the job, the other is polled for it
+        runner = AudioJobQueue(process, workers=1, registry=RedisJobRegistry(fakeredis.FakeRedis(server=server)))
+        other = AudioJobQueue(process, workers=1, registry=RedisJobRegistry(fakeredis.FakeRedis(server=server)))
+        try:
+            job = await runner.submit(str(path), namespace="acme/ana/jobs")
+            assert (await other.get(job["job_id"]))["status"] in ("queued", "running")
+            await runner._queue.join()
+            return await other.get(job["job_id"]), await other.get("missing")
+        finally:
+            runner.close()
+            other.close()
+
+    job, missing = asyncio.run(main())
+    assert (job["status"], job["transcript"], job["namespace"]) == ("completed", "Speaker 0: hello", "acme/ana/jobs")
+    assert job["finished_at"] is not None
+    assert missing is None
+    assert not path.exists()
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+import backend
+from fake_llm import FakeChatGroq
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Slow the fake LLM down and record the most calls it had in flight at once."""
+    monkeypatch.setattr(backend.get_llm().inner, "latency", 0.05)
+    calls = {"in_flight": 0, "peak": 0, "inputs": []}
+    generate = FakeChatGroq._agenerate
+
+    async def tracked(self, messages, *args, **kwargs):
+        calls["in_flight"] += 1
+        calls["peak"] = max(calls["peak"], calls["in_flight"])
+        calls["inputs"].append(messages[-1].content)
+        try:
+            return await generate(self, messages, *args, **kwargs)
+        finally:
+            calls["in_flight"] -= 1
+
+    monkeypatch.setattr(FakeChatGroq, "_agenerate", tracked)
+    return calls
+
+
+def turns(namespace: str, session_type: str):
+    return [message.content for message in backend.chat_store[backend.session_key(namespace, session_type)].turns]
+
+
+def test_turns_on_one_session_apply_one_at_a_time_in_order(llm_calls):
+    async def main():
+        return await asyncio.gather(*(
+            backend.chat(f"message{n} about the invoice export", "expert1", "tests/concurrency/serial") for n in range(3)
+        ))
+
+    replies = asyncio.run(main())
+    assert llm_calls["peak"] == 1
+    assert llm_calls["inputs"] == [f"message{n} about the invoice export" for n in range(3)]
+    # Each turn is stored whole before the next one starts
+    assert turns("tests/concurrency/serial", "expert1") == [
+        part for n in range(3) for part in (f"message{n} about the invoice export", replies[n])
+    ]
+
+
+def test_turns_on_different_sessions_run_in_parallel(llm_calls):
+    async def main():
+        await asyncio.gather(*(
+            backend.chat(f"A question for {session_type}.", session_type, "tests/concurrency/parallel")
+            for session_type in ("expert1", "expert3", "expert5")
+        ))
+
+    asyncio.run(main())
+    assert llm_calls["peak"] == 3
+
+
+def test_batch_results_keep_their_positions(client, llm_calls):
+    items = [
+        {"session_type": "expert1", "user_message": "alpha for the first expert"},
+        {"session_type": "expert2", "user_message": "beta for the second expert"},
+        {"session_type": "expert1", "user_message": "gamma for the first expert"},
+        {"session_type": "expert2", "user_message": "delta for the second expert"},
+    ]
+    response = client.post("/chat-batch/?project=tests-batch-order", json={"items": items})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(result["session_type"], result["message"].split()[0]) for result in results] == [
+        ("expert1", "alpha"), ("expert2", "beta"), ("expert1", "gamma"), ("expert2", "delta"),
+    ]
+    # Sessions ran side by side, turns within each in the order given
+    assert llm_calls["peak"] == 2
+    namespace = backend.make_namespace(None, None, "tests-batch-order")
+    assert turns(namespace, "expert1")[::2] == ["alpha for the first expert", "gamma for the first expert"]
+
+
+def test_a_failed_batch_item_does_not_fail_the_others(client):
+    items = [
+        {"session_type": "expert1", "user_message": "A normal question."},
+        {"session_type": "expert2", "user_message": "word " * 8000},
+        {"session_type": "expert2", "user_message": "A question after the failed one."},
+    ]
+    results = client.post("/chat-batch/?project=tests-batch-errors", json={"items": items}).json()["results"]
+    assert "message" in results[0] and "message" in results[2]
+    assert results[1]["status_code"] == 413
+    assert results[1]["session_type"] == "expert2" and "shorten the message" in results[1]["error"]
+
+
+def test_oversized_and_invalid_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(backend, "CHAT_BATCH_MAX_ITEMS", 2)
+    items = [{"session_type": "expert1", "user_message": "Hello there."}] * 3
+    response = client.post("/chat-batch/", json={"items": items})
+    assert response.status_code == 400
+    assert "at most 2 items" in response.json()["detail"]
+
+    response = client.post("/chat-batch/", json={"items": [{"session_type": "expert9", "user_message": "Hello there."}]})
+    assert response.status_code == 400
@@ -0,0 +1,69 @@
+import io
+import pytest
+from export import SRSExporter, assemble_docx, docx_fragment, markdown_blocks
+from inheritance import InheritanceGraph, SessionVersions
+
+TITLES = {"expert1": "Scope", "expert2": "Requirements", "expert3": "Review"}
+
+
+def make_exporter():
+    versions = SessionVersions()
+    outputs = {"expert1": "We build an invoicing tool.", "expert2": "- Export invoices as PDF"}
+    graph = InheritanceGraph({"expert1": [], "expert2": ["expert1"], "expert3": ["expert2"]})
+    exporter = SRSExporter(graph, TITLES, versions, outputs.get, lambda namespace, section: section)
+    return exporter, versions, outputs
+
+
+def test_each_export_reports_its_own_section_counts():
+    exporter, versions, outputs = make_exporter()
+    counts = {}
+    exporter.sections("", counts)
+    assert counts == {"rendered": 3, "reused": 0}
+
+    exporter.sections("", counts)
+    assert counts == {"rendered": 0, "reused": 3}
+
+    # expert2 changes: its section and the heading of expert3, which builds on it, are redone
+    outputs["expert2"] = "- Export invoices as PDF and CSV"
+    versions.bump("expert2")
+    exporter.sections("", counts)
+    assert counts == {"rendered": 2, "reused": 1}
+
+
+def test_docx_paragraphs_use_the_template_styles():
+    docx = pytest.importorskip("docx")
+    markdown = "# Title\n\n## Scope\n\n- first\n- second\n\n1. step\n\nPlain **bold** text."
+    document = docx.Document(io.BytesIO(assemble_docx([docx_fragment(markdown_blocks(markdown))])))
+    assert [(paragraph.style.name, paragraph.text) for paragraph in document.paragraphs] == [
+        ("Title", "Title"),
+        ("Heading 1", "Scope"),
+        ("List Bullet", "first"),
+        ("List Bullet", "second"),
+        ("List Number", "step"),
+        ("Normal", "Plain bold text."),
+    ]
+
+
+def test_a_turn_landing_during_an_export_is_not_cached_as_current():
+    docx = pytest.importorskip("docx")
+    exporter, versions, outputs = make_exporter()
+    build_sections = exporter.sections
+
+    def sections_then_turn(namespace, counts=None):
+        parts = build_sections(namespace, counts)
+        # A turn lands right after the sections were built, before the DOCX is
+        outputs["expert1"] = "We build a billing tool."
+        versions.bump("expert1")
+        return parts
+
+    exporter.sections = sections_then_turn
+    signature, sections = exporter.snapshot("")
+    assert "invoicing" in docx_text(docx, exporter.docx("", sections, signature))
+
+    exporter.sections = build_sections
+    signature, sections = exporter.snapshot("")
+    assert "billing" in docx_text(docx, exporter.docx("", sections, signature))
+
+
+def docx_text(docx, data: bytes) -> str:
+    return "\n".join(paragraph.text for paragraph in docx.Document(io.BytesIO(data)).paragraphs)
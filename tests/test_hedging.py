@@ -0,0 +1,111 @@
+import asyncio
+from hedging import HedgingPolicy, LatencyWindow
+from scheduler import LLMScheduler
+
+KEY = "expert1/fake"
+
+
+def primed_policy(**kwargs) -> HedgingPolicy:
+    """A policy that already knows KEY's latency: a millisecond at the median."""
+    policy = HedgingPolicy(percentile=50.0, window=1000, min_samples=20, **kwargs)
+    for _ in range(100):
+        policy.record(KEY, 0.001)
+    return policy
+
+
+def attempts(*latencies: float):
+    """A call whose successive attempts take the given times and return their attempt number."""
+    started = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(latencies[attempt])
+        except asyncio.CancelledError:
+            started[attempt] = "cancelled"
+            raise
+        return attempt
+
+    return call, started
+
+
+def test_latency_window_percentiles():
+    window = LatencyWindow(size=4)
+    assert window.percentile(95) == 0.0
+    for seconds in (5.0, 1.0, 2.0, 3.0, 4.0):
+        window.add(seconds)
+    # The oldest sample fell out of the window
+    assert (window.percentile(50), window.percentile(95)) == (2.0, 4.0)
+
+
+def test_calls_are_not_hedged_before_enough_latencies_are_known():
+    policy = HedgingPolicy(min_samples=20, max_hedge_rate=1.0)
+    call, started = attempts(0.01)
+    assert asyncio.run(policy.run(KEY, call)) == 0
+    assert started == [0]
+    assert (policy.hedges, len(policy.latencies[KEY].samples)) == (0, 1)
+
+
+def test_the_hedge_wins_the_race_against_a_straggler():
+    policy = primed_policy(max_hedge_rate=1.0, burst=1.0)
+    call, started = attempts(5.0, 0.005)
+    llm_scheduler = LLMScheduler(max_in_flight=2)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await policy.run(KEY, call, scheduler=llm_scheduler)
+        return result, loop.time() - start
+
+    result, elapsed = asyncio.run(main())
+    assert result == 1
+    assert elapsed < 1.0
+    assert started == ["cancelled", 1]
+    assert (policy.hedges, policy.hedge_wins) == (1, 1)
+    # Only the winning attempt's latency is recorded, and the hedge's slot is given back
+    samples = policy.latencies[KEY].samples
+    assert len(samples) == 101 and samples[-1] < 1.0
+    assert llm_scheduler.in_flight == 0
+
+
+def test_the_primary_can_still_win_after_a_hedge_starts():
+    policy = primed_policy(max_hedge_rate=1.0, burst=1.0)
+    call, started = attempts(0.02, 5.0)
+    assert asyncio.run(policy.run(KEY, call)) == 0
+    assert started == [0, "cancelled"]
+    assert (policy.hedges, policy.hedge_wins) == (1, 0)
+    assert len(policy.latencies[KEY].samples) == 101
+
+
+def test_no_hedge_without_a_free_scheduler_slot():
+    policy = primed_policy(max_hedge_rate=1.0, burst=1.0)
+    call, started = attempts(0.02)
+    llm_scheduler = LLMScheduler(max_in_flight=1)
+
+    async def main():
+        await llm_scheduler.acquire()
+        try:
+            return await policy.run(KEY, call, scheduler=llm_scheduler)
+        finally:
+            llm_scheduler.release()
+
+    assert asyncio.run(main()) == 0
+    assert started == [0]
+    assert (policy.hedges, policy.skipped) == (0, 1)
+
+
+def test_hedges_are_capped_at_the_max_rate():
+    policy = primed_policy(max_hedge_rate=0.25, burst=1.0)
+
+    async def main():
+        for _ in range(40):
+            call, _ = attempts(0.01, 0.001)
+            await policy.run(KEY, call)
+
+    asyncio.run(main())
+    # Every call ran late, but only one in four earned a hedge
+    assert policy.calls == 40
+    assert policy.hedges == 10
+    assert policy.skipped == 30
+    assert policy.stats()["hedge_rate"] == 0.25
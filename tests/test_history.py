@@ -0,0 +1,48 @@
+import asyncio
+import backend
+import history
+from history import ManagedChatHistory
+
+TURNS = 80
+
+
+def run_session(namespace: str, turns: int):
+    """Chat with expert1 for `turns` turns; return the prompt size the LLM saw and whether history was compacted, per turn."""
+    fake_llm = backend.get_llm().inner
+    session_id = backend.session_key(namespace, "expert1")
+
+    async def drive():
+        sizes = []
+        for turn in range(turns):
+            message = f"Turn {turn}: please refine the acceptance criteria for feature {turn % 17}."
+            await backend.chat(message, "expert1", namespace)
+            sizes.append((fake_llm.last_prompt_tokens, bool(backend.get_chat_history(session_id).summary)))
+        return sizes
+
+    return asyncio.run(drive())
+
+
+def test_chat_history_is_managed():
+    history = backend.get_chat_history(backend.session_key("tests/history/managed", "expert2"))
+    assert isinstance(history, ManagedChatHistory)
+    assert history.token_budget == backend.HISTORY_TOKEN_BUDGET
+
+
+def test_prompt_size_is_bounded_after_compaction():
+    sizes = run_session("tests/history/bounded", TURNS)
+    first_compacted = next(turn for turn, (_, compacted) in enumerate(sizes) if compacted)
+    assert first_compacted < TURNS // 2
+
+    prompt_tokens = [tokens for tokens, _ in sizes]
+    turn_growth = max(tokens - previous for previous, tokens in zip(prompt_tokens, prompt_tokens[1:first_compacted + 1]))
+    # From then on the live turns stay within their budget and only the summary grows, up to its own budget
+    bound = prompt_tokens[first_compacted] + history.DEFAULT_SUMMARY_BUDGET + turn_growth
+    assert max(prompt_tokens[first_compacted:]) <= bound
+    # so the prompt stops growing: over the last half it varies by less than one turn
+    assert max(prompt_tokens[TURNS // 2:]) - min(prompt_tokens[TURNS // 2:]) < turn_growth
+
+
+def test_truncation_fits_the_counter_it_is_given():
+    truncated = history.truncate_to_tokens("word " * 100, 50, lambda text: len(text.split()))
+    assert truncated.endswith(" ...") and len(truncated.split()) == 50
+    assert history.truncate_to_tokens("short text", 50) == "short text"
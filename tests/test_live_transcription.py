@@ -0,0 +1,114 @@
+import json
+import random
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+import backend
+from fake_transcription import FakeLiveTranscriber
+from voice import wav_header
+
+SAMPLE_RATE = 16000
+# 0.1 s of 16-bit mono audio per frame
+FRAME_BYTES = SAMPLE_RATE // 10 * 2
+
+
+class RecordingTranscriber(FakeLiveTranscriber):
+    """FakeLiveTranscriber that remembers every session and counts how often it is finished."""
+
+    sessions = []
+
+    def __init__(self, options=None):
+        super().__init__(options)
+        self.finish_calls = 0
+        RecordingTranscriber.sessions.append(self)
+
+    async def finish(self):
+        self.finish_calls += 1
+        await super().finish()
+
+
+@pytest.fixture
+def transcriber(monkeypatch):
+    RecordingTranscriber.sessions = []
+    monkeypatch.setattr(backend, "live_transcriber_class", RecordingTranscriber)
+    return RecordingTranscriber
+
+
+def speech(seconds: float) -> bytes:
+    return random.Random(seconds).randbytes(int(seconds * SAMPLE_RATE) * 2)
+
+
+def silence(seconds: float) -> bytes:
+    return bytes(int(seconds * SAMPLE_RATE) * 2)
+
+
+def send_audio(websocket, audio: bytes):
+    for start in range(0, len(audio), FRAME_BYTES):
+        websocket.send_bytes(audio[start:start + FRAME_BYTES])
+
+
+def receive_all(websocket) -> list:
+    messages = []
+    try:
+        while True:
+            messages.append(websocket.receive_json())
+    except WebSocketDisconnect:
+        return messages
+
+
+def test_live_audio_streams_interim_and_final_transcripts(client: TestClient, transcriber):
+    with client.websocket_connect("/ws/expert1?tenant=acme&user=ana&project=live") as websocket:
+        websocket.send_bytes(wav_header(1, 2, SAMPLE_RATE, 0))
+        # One second of speech is four fake words, then enough silence to end the utterance
+        send_audio(websocket, speech(1.0) + silence(0.5))
+        websocket.send_text(json.dumps({"type": "stop"}))
+        messages = receive_all(websocket)
+
+    types = [message["type"] for message in messages]
+    interims = [message["text"] for message in messages if message["type"] == "interim"]
+    finals = [message["text"] for message in messages if message["type"] == "final"]
+    assert len(interims) == 4
+    # Each interim result extends the one before it
+    assert all(later.startswith(earlier) for earlier, later in zip(interims, interims[1:]))
+    assert len(finals) == 1
+    assert finals[0].startswith("Speaker 0: ") and finals[0].endswith(".")
+    assert types.index("final") > max(index for index, kind in enumerate(types) if kind == "interim")
+
+    utterances = [message["text"] for message in messages if message["type"] == "utterance"]
+    assert utterances == finals
+    assert types.count("response") == 1
+    assert types.index("response") > types.index("utterance")
+    assert "error" not in types
+    assert [session.finish_calls for session in transcriber.sessions] == [1]
+
+
+def test_speech_pending_at_stop_is_finalized(client: TestClient, transcriber):
+    with client.websocket_connect("/ws/expert2") as websocket:
+        send_audio(websocket, speech(0.5))
+        websocket.send_text(json.dumps({"type": "stop"}))
+        messages = receive_all(websocket)
+
+    types = [message["type"] for message in messages]
+    assert types.count("interim") == 2
+    assert types.count("final") == 1
+    assert types.count("response") == 1
+    assert [session.finish_calls for session in transcriber.sessions] == [1]
+
+
+def test_client_disconnect_finishes_the_session_once(client: TestClient, transcriber):
+    with client.websocket_connect("/ws/expert3") as websocket:
+        send_audio(websocket, speech(0.5))
+        assert websocket.receive_json()["type"] == "interim"
+    # The server notices the disconnect on its next receive
+    for _ in range(100):
+        if transcriber.sessions and transcriber.sessions[0].finish_calls:
+            break
+        client.get("/healthz")
+    assert [session.finish_calls for session in transcriber.sessions] == [1]
+
+
+def test_unknown_session_type_is_rejected(client: TestClient):
+    with client.websocket_connect("/ws/expert9") as websocket:
+        assert websocket.receive_json() == {"type": "error", "detail": "Invalid session type: expert9"}
+        with pytest.raises(WebSocketDisconnect):
+            websocket.receive_json()
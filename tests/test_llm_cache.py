@@ -0,0 +1,81 @@
+import asyncio
+from langchain_core.messages import HumanMessage
+from langchain_core.outputs import Generation
+from fake_llm import FakeChatGroq
+from llm_cache import ResponseCache
+from scheduler import LLMScheduler, ScheduledChatModel
+
+LLM_STRING = "fake-model"
+
+
+def answer(text: str):
+    return [Generation(text=text)]
+
+
+def cached_model(cache: ResponseCache, llm_scheduler: LLMScheduler) -> ScheduledChatModel:
+    return ScheduledChatModel(inner=FakeChatGroq(latency=0, response_words=3), scheduler=llm_scheduler, cache=cache)
+
+
+def test_a_stored_response_is_found_by_prompt_and_model():
+    cache = ResponseCache()
+    assert cache.lookup("prompt", LLM_STRING) is None
+    cache.update("prompt", LLM_STRING, answer("reply"))
+    assert cache.lookup("prompt", LLM_STRING) == answer("reply")
+    assert cache.lookup("prompt", "another-model") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResponseCache(ttl_seconds=0.05)
+    cache.update("prompt", LLM_STRING, answer("reply"))
+    assert cache.lookup("prompt", LLM_STRING) == answer("reply")
+    asyncio.run(asyncio.sleep(0.1))
+    assert cache.lookup("prompt", LLM_STRING) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_the_least_recently_used_entry_is_evicted_at_capacity():
+    cache = ResponseCache(max_entries=2)
+    cache.update("a", LLM_STRING, answer("A"))
+    cache.update("b", LLM_STRING, answer("B"))
+    cache.lookup("a", LLM_STRING)  # Now "b" is the least recently used
+    cache.update("c", LLM_STRING, answer("C"))
+    assert [cache.lookup(prompt, LLM_STRING) for prompt in ("a", "b", "c")] == [answer("A"), None, answer("C")]
+
+
+def test_the_disk_tier_survives_a_reopen(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    asyncio.run(ResponseCache(disk_path=path).aupdate("prompt", LLM_STRING, answer("reply")))
+
+    reopened = ResponseCache(disk_path=path)
+    assert asyncio.run(reopened.alookup("prompt", LLM_STRING)) == answer("reply")
+    assert (reopened.hits, reopened.disk_hits) == (1, 1)
+    # Promoted to the memory tier by the first read
+    assert reopened.lookup("prompt", LLM_STRING) == answer("reply")
+    assert reopened.disk_hits == 1
+
+    expired = ResponseCache(disk_path=path, ttl_seconds=1e-9)
+    assert expired.lookup("prompt", LLM_STRING) is None
+
+
+def test_cache_hits_do_not_take_a_scheduler_slot():
+    cache = ResponseCache()
+    llm_scheduler = LLMScheduler(max_in_flight=1)
+    model = cached_model(cache, llm_scheduler)
+    prompt = [HumanMessage(content="Name three export formats.")]
+
+    async def main():
+        first = await model.ainvoke(prompt)
+        # With the only slot taken, a miss would wait forever; the hit returns at once
+        await llm_scheduler.acquire()
+        try:
+            second = await asyncio.wait_for(model.ainvoke(prompt), timeout=1.0)
+        finally:
+            llm_scheduler.release()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.content == second.content
+    assert model.inner.calls == 1
+    assert cache.hits == 1
+    assert llm_scheduler.completed == 1
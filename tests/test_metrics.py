@@ -0,0 +1,52 @@
+import re
+import backend
+from metrics import Histogram, RequestMetrics
+
+
+def sample(text: str, name: str, **labels: str) -> float:
+    """The value of one sample in Prometheus text output (0 if absent)."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if match and match.group(1) == name and (match.group(2) or "") == wanted:
+            return float(match.group(3))
+    return 0.0
+
+
+def test_histograms_render_cumulative_buckets():
+    histogram = Histogram("request_seconds", "Test.", ("endpoint",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, "chat")
+    text = "\n".join(histogram.render())
+    assert [sample(text, "request_seconds_bucket", endpoint="chat", le=le) for le in ("0.1", "1.0", "+Inf")] == [1, 3, 4]
+    assert sample(text, "request_seconds_count", endpoint="chat") == 4
+    assert sample(text, "request_seconds_sum", endpoint="chat") == 4.25
+
+
+def test_unsampled_requests_record_only_their_duration():
+    metrics = RequestMetrics(sample_rate=0.0)
+    with metrics.trace("chat", "expert1"):
+        with metrics.stage("chat_history"):
+            pass
+    text = metrics.render()
+    assert sample(text, "chat_request_seconds_count", endpoint="chat", session="expert1") == 1
+    assert "chat_stage_seconds_count" not in text
+
+
+def test_each_chat_turn_records_every_stage_once(client):
+    before = client.get("/metrics").text
+    response = client.post("/chat/expert3?project=tests-metrics", json={"user_message": "List the export formats we support."})
+    assert response.status_code == 200
+    after = client.get("/metrics").text
+
+    def added(name: str, **labels: str) -> float:
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert added("chat_request_seconds_count", endpoint="chat", session="expert3") == 1
+    for stage in ("chat_history", "long_term_memory", "document_retrieval", "prompt_render", "llm", "update_long_term_memory"):
+        assert added("chat_stage_seconds_count", stage=stage) == 1, stage
+    # Prompt tokens are measured with the app's shared counter, as the model saw them
+    assert added("chat_prompt_tokens_count", session="expert3") == 1
+    assert added("chat_prompt_tokens_sum", session="expert3") == backend.get_llm().inner.last_prompt_tokens
+    assert added("chat_completion_tokens_sum", session="expert3") > 0
+    assert sample(after, "chat_history_messages", session="expert3") >= 2
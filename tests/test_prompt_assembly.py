@@ -0,0 +1,56 @@
+import json
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from prompt_assembly import HeuristicTokenizer, PromptAssembler, TokenCounter
+
+# Long enough that a second turn cannot keep the first in its prompt
+LONG_MESSAGE = "alpha " * 6000
+
+
+def make_assembler() -> PromptAssembler:
+    return PromptAssembler("You are a test expert.", TokenCounter(HeuristicTokenizer()), str, str)
+
+
+def test_history_is_trimmed_a_whole_exchange_at_a_time():
+    history = [
+        SystemMessage(content="Summary of earlier conversation:\nhuman: hello"),
+        HumanMessage(content="one"), AIMessage(content="re: one"),
+        HumanMessage(content="two"), AIMessage(content="re: two"),
+        HumanMessage(content="three"), AIMessage(content="re: three"),
+    ]
+    counts = [10] * len(history)
+    # Dropping one message would be enough, but not without leaving "re: one" unanswered
+    kept, tokens = make_assembler()._trim_history(history, counts, 60)
+    assert kept == [history[0]] + history[3:]
+    assert tokens == 50
+
+    # With every exchange gone, the summary goes last
+    kept, tokens = make_assembler()._trim_history(history, counts, 5)
+    assert (kept, tokens) == ([], 0)
+
+
+def test_a_reply_without_its_question_is_dropped_alone():
+    history = [AIMessage(content="welcome"), HumanMessage(content="one"), AIMessage(content="re: one")]
+    kept, _ = make_assembler()._trim_history(history, [10, 10, 10], 25)
+    assert kept == history[1:]
+
+
+def test_batch_turns_report_trimmed_prompts(client):
+    items = [{"session_type": "expert1", "user_message": LONG_MESSAGE}] * 2
+    results = client.post("/chat-batch/?project=tests-prompt-batch", json={"items": items}).json()["results"]
+    assert "prompt" not in results[0]
+    assert results[1]["prompt"]["dropped"]["history_messages"] == 2
+    assert results[1]["prompt"]["prompt_tokens"] <= results[1]["prompt"]["max_prompt_tokens"]
+
+
+def test_streams_report_trimmed_prompts(client):
+    def stream_events():
+        response = client.post("/chat/expert1/stream?project=tests-prompt-stream", json={"user_message": LONG_MESSAGE})
+        return [
+            (block.split("\n")[0][len("event: "):] if block.startswith("event:") else "message", block.split("data: ", 1)[1])
+            for block in response.text.split("\n\n") if block
+        ]
+
+    assert "prompt" not in [event for event, _ in stream_events()]
+    events = stream_events()
+    assert [event for event, _ in events[-2:]] == ["prompt", "done"]
+    assert json.loads(events[-2][1])["dropped"]["history_messages"] == 2
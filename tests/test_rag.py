@@ -0,0 +1,111 @@
+import pytest
+from rag import DocumentIndex, UnsupportedDocumentError, chunk_text
+from vector_memory import HashingEmbedder
+
+SECTIONS = {
+    "login": "Users sign in with a password and a one-time code sent by text message.",
+    "reports": "Finance exports monthly revenue reports as spreadsheets every night.",
+    "search": "Customers search the product catalogue by name, brand and price range.",
+    "backup": "The database is backed up to offsite storage every six hours.",
+}
+
+
+def write_document(tmp_path, name: str, sections) -> str:
+    path = tmp_path / name
+    path.write_text("\n\n".join(SECTIONS[section] for section in sections), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def index():
+    # Small chunks, so each section is one chunk
+    return DocumentIndex(HashingEmbedder(), chunk_chars=80)
+
+
+def test_chunks_end_on_natural_breaks():
+    text = "\n\n".join(SECTIONS.values())
+    chunks = list(chunk_text([text[:50], text[50:]], chunk_chars=80))
+    assert chunks == list(SECTIONS.values())
+
+
+def test_search_returns_the_most_relevant_passage(index, tmp_path):
+    path = write_document(tmp_path, "spec.md", ["login", "reports", "search"])
+    assert index.ingest("acme/ana/app", path, "spec.md") == {
+        "document": "spec.md", "chunks": 3, "added": 3, "unchanged": 0, "removed": 0,
+    }
+    document, part, text = index.search("acme/ana/app", "How do finance revenue reports get exported?", k=2)[0]
+    assert (document, part, text) == ("spec.md", 1, SECTIONS["reports"])
+
+
+def test_projects_are_isolated(index, tmp_path):
+    index.ingest("acme/ana/app", write_document(tmp_path, "spec.md", ["login"]), "spec.md")
+    assert index.search("acme/bob/app", "password sign in") == []
+
+
+def test_reupload_skips_unchanged_chunks_and_renumbers_parts(index, tmp_path):
+    index.ingest("acme/ana/app", write_document(tmp_path, "v1.md", ["login", "reports", "search"]), "spec.md")
+    # A new first section shifts every chunk down one part; "reports" is dropped
+    result = index.ingest("acme/ana/app", write_document(tmp_path, "v2.md", ["backup", "login", "search"]), "spec.md")
+    assert (result["added"], result["unchanged"], result["removed"]) == (1, 2, 1)
+
+    assert index.search("acme/ana/app", "product catalogue search by brand", k=1) == [("spec.md", 2, SECTIONS["search"])]
+    assert index.search("acme/ana/app", "password one-time code sign in", k=1) == [("spec.md", 1, SECTIONS["login"])]
+    assert index.search("acme/ana/app", "offsite database backup", k=1) == [("spec.md", 0, SECTIONS["backup"])]
+    assert all(text != SECTIONS["reports"] for _, _, text in index.search("acme/ana/app", "finance revenue reports"))
+
+
+def test_index_survives_a_reload(tmp_path):
+    directory = str(tmp_path / "index")
+    path = write_document(tmp_path, "spec.md", ["login", "reports"])
+    DocumentIndex(HashingEmbedder(), directory=directory, chunk_chars=80).ingest("acme/ana/app", path, "spec.md")
+
+    reloaded = DocumentIndex(HashingEmbedder(), directory=directory, chunk_chars=80)
+    assert reloaded.search("acme/ana/app", "monthly revenue spreadsheets", k=1) == [("spec.md", 1, SECTIONS["reports"])]
+    assert reloaded.ingest("acme/ana/app", path, "spec.md")["unchanged"] == 2
+
+
+def test_unsupported_documents_are_rejected(index, tmp_path):
+    with pytest.raises(UnsupportedDocumentError):
+        index.ingest("acme/ana/app", write_document(tmp_path, "spec.docx", ["login"]), "spec.docx")
+
+
+class FailingEmbedder(HashingEmbedder):
+    """Embeds the first `calls` batches, then fails."""
+
+    def __init__(self, calls: int):
+        super().__init__()
+        self.calls = calls
+
+    def embed(self, texts):
+        if not self.calls:
+            raise RuntimeError("embedding service unavailable")
+        self.calls -= 1
+        return super().embed(texts)
+
+
+def test_a_failed_upload_leaves_the_previous_version_searchable(tmp_path, monkeypatch):
+    monkeypatch.setattr("rag.EMBED_BATCH_SIZE", 1)
+    index = DocumentIndex(FailingEmbedder(calls=3), chunk_chars=80)
+    index.ingest("acme/ana/app", write_document(tmp_path, "v1.md", ["login"]), "spec.md")
+
+    # "backup" and "reports" are embedded before the upload fails on "search"
+    with pytest.raises(RuntimeError):
+        index.ingest("acme/ana/app", write_document(tmp_path, "v2.md", ["backup", "reports", "search"]), "spec.md")
+    index.embedder.calls = 10
+    assert {text for _, _, text in index.search("acme/ana/app", "finance revenue reports", k=4)} <= {SECTIONS["login"]}
+    assert index.search("acme/ana/app", "password one-time code sign in", k=1) == [("spec.md", 0, SECTIONS["login"])]
+
+
+def test_an_upload_that_cannot_be_saved_is_not_served(tmp_path, monkeypatch):
+    directory = str(tmp_path / "index")
+    index = DocumentIndex(HashingEmbedder(), directory=directory, chunk_chars=80)
+    index.ingest("acme/ana/app", write_document(tmp_path, "v1.md", ["login"]), "spec.md")
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("rag.ProjectIndex.save", fail)
+    with pytest.raises(OSError):
+        index.ingest("acme/ana/app", write_document(tmp_path, "v2.md", ["reports"]), "spec.md")
+    assert {text for _, _, text in index.search("acme/ana/app", "finance revenue reports")} <= {SECTIONS["login"]}
+    assert index.search("acme/ana/app", "password one-time code sign in", k=1) == [("spec.md", 0, SECTIONS["login"])]
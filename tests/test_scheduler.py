@@ -0,0 +1,165 @@
+import asyncio
+import pytest
+import scheduler
+from fake_llm import FakeChatGroq, FakeRateLimitError
+from langchain_core.messages import HumanMessage
+from scheduler import BULK, INTERACTIVE, PIPELINE, LLMScheduler, ScheduledChatModel, TokenBucket, llm_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RetryAfterError(Exception):
+    """429 carrying a Retry-After header, like an HTTP client error."""
+
+    status_code = 429
+
+    def __init__(self, seconds: str):
+        super().__init__("Too many requests")
+        self.response = type("Response", (), {"headers": {"retry-after": seconds}})()
+
+
+def test_queued_calls_run_in_priority_order():
+    llm_scheduler = LLMScheduler(max_in_flight=1)
+    order = []
+
+    async def call(name: str):
+        async with llm_scheduler.slot():
+            order.append(name)
+
+    async def main():
+        await llm_scheduler.acquire()
+        tasks = []
+        for name, priority in [("bulk", BULK), ("pipeline", PIPELINE), ("bulk-2", BULK), ("interactive", INTERACTIVE)]:
+            with llm_priority(priority):
+                tasks.append(asyncio.ensure_future(call(name)))
+            await asyncio.sleep(0)
+        assert llm_scheduler.queue_depth == 4
+        llm_scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    # Equal priorities keep their arrival order
+    assert order == ["interactive", "pipeline", "bulk", "bulk-2"]
+    assert llm_scheduler.in_flight == 0
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    assert bucket.wait_time(30) == pytest.approx(30.0)
+
+    clock.now += 10
+    assert bucket.wait_time(10) == 0.0
+    assert bucket.wait_time(15) == pytest.approx(5.0)
+
+    # Refills stop at capacity, and larger requests only wait for a full bucket
+    clock.now += 3600
+    bucket.take(1)
+    assert bucket.available == pytest.approx(59.0)
+    assert bucket.wait_time(1000) == pytest.approx(1.0)
+
+
+def test_rate_limited_calls_wait_for_the_request_bucket():
+    llm_scheduler = LLMScheduler(max_in_flight=4, requests_per_minute=600)
+    llm_scheduler.request_bucket.available = 0
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await llm_scheduler.run(lambda: asyncio.sleep(0))
+        return loop.time() - start
+
+    # One request every 0.1s at 600 per minute
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_retryable_failures_are_retried_with_backoff(monkeypatch):
+    llm_scheduler = LLMScheduler(max_retries=4, base_delay=0.5, max_delay=20.0)
+    delays = []
+    backoff = llm_scheduler.backoff
+
+    def record_backoff(attempt: int, error: Exception) -> float:
+        delays.append(backoff(attempt, error))
+        return 0.0
+
+    monkeypatch.setattr(llm_scheduler, "backoff", record_backoff)
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeRateLimitError("Rate limit reached (fake)")
+        return "ok"
+
+    assert asyncio.run(llm_scheduler.run(flaky)) == "ok"
+    assert attempts == 3
+    assert (llm_scheduler.retries, llm_scheduler.rate_limited, llm_scheduler.completed) == (2, 2, 1)
+    # Full jitter: each delay is at most base_delay * 2 ** attempt
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 1.0
+
+
+def test_backoff_honours_retry_after_and_max_delay():
+    llm_scheduler = LLMScheduler(base_delay=0.5, max_delay=2.0)
+    assert llm_scheduler.backoff(0, RetryAfterError("3")) >= 3.0
+    assert all(llm_scheduler.backoff(10, FakeRateLimitError("429")) <= 2.0 for _ in range(100))
+
+
+def test_non_retryable_failures_are_not_retried():
+    llm_scheduler = LLMScheduler(max_retries=4)
+    attempts = 0
+
+    async def broken():
+        nonlocal attempts
+        attempts += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(llm_scheduler.run(broken))
+    assert attempts == 1
+    assert (llm_scheduler.retries, llm_scheduler.failed) == (0, 1)
+
+
+def test_scheduled_fake_llm_gives_up_after_max_retries():
+    llm_scheduler = LLMScheduler(max_retries=2, base_delay=0.001)
+    inner = FakeChatGroq(latency=0, rate_limit_probability=1.0)
+    llm = ScheduledChatModel(inner=inner, scheduler=llm_scheduler)
+
+    with pytest.raises(FakeRateLimitError):
+        asyncio.run(llm.ainvoke([HumanMessage(content="hello")]))
+    assert inner.calls == 3
+    assert (llm_scheduler.retries, llm_scheduler.rate_limited, llm_scheduler.failed) == (2, 3, 1)
+    assert llm_scheduler.in_flight == 0
+
+
+def test_scheduled_fake_llm_caps_concurrency():
+    llm_scheduler = LLMScheduler(max_in_flight=2)
+    inner = FakeChatGroq(latency=0.02)
+    llm = ScheduledChatModel(inner=inner, scheduler=llm_scheduler)
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, llm_scheduler.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def main():
+        watcher = asyncio.ensure_future(watch())
+        await asyncio.gather(*(llm.ainvoke([HumanMessage(content=f"call {i}")]) for i in range(6)))
+        watcher.cancel()
+
+    asyncio.run(main())
+    assert peak == 2
+    assert llm_scheduler.completed == 6
+    assert llm_scheduler.max_queue_depth == 4
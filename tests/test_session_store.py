@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from session_store import InMemorySessionStore, RedisSessionStore, SessionLockTimeout, SQLiteSessionStore, history_size
+
+
+@pytest.fixture
+def server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+def redis_store(server, **kwargs) -> RedisSessionStore:
+    """A store as one worker process would open it."""
+    import fakeredis
+    return RedisSessionStore(client=fakeredis.FakeRedis(server=server), **kwargs)
+
+
+def add_turn(store, session_id: str, text: str = "x" * 1000):
+    store.get_or_create(session_id).add_messages([HumanMessage(content=text), AIMessage(content=text)])
+
+
+def session_bytes(store, session_id: str) -> int:
+    return history_size(store[session_id])
+
+
+def test_turns_are_seen_by_every_worker(server):
+    first, second = redis_store(server), redis_store(server)
+
+    async def turn(store, message: str):
+        async with store.lock("project/expert1"):
+            history = store.get_or_create("project/expert1")
+            history.add_messages([HumanMessage(content=message), AIMessage(content=f"re: {message}")])
+            return [turn.content for turn in store["project/expert1"].turns]
+
+    assert asyncio.run(turn(first, "one")) == ["one", "re: one"]
+    assert asyncio.run(turn(second, "two")) == ["one", "re: one", "two", "re: two"]
+    assert [turn.content for turn in first["project/expert1"].turns][-1] == "re: two"
+
+
+def test_a_held_lock_outlives_its_ttl(server):
+    first = redis_store(server, lock_ttl=0.3)
+    second = redis_store(server, lock_timeout=0.1)
+
+    async def main():
+        async with first.lock("project/expert1"):
+            # A turn three TTLs long keeps the lock, so the other worker still cannot take it
+            await asyncio.sleep(0.9)
+            with pytest.raises(SessionLockTimeout):
+                async with second.lock("project/expert1"):
+                    pass
+        async with second.lock("project/expert1"):
+            pass
+
+    asyncio.run(main())
+    assert not first.client.exists(first._key("lock", "project/expert1"))
+
+
+def test_a_lost_lock_is_logged(server, caplog):
+    store = redis_store(server, lock_ttl=0.3)
+
+    async def main():
+        async with store.lock("project/expert1"):
+            store.client.delete(store._key("lock", "project/expert1"))
+            await asyncio.sleep(0.2)
+
+    with caplog.at_level(logging.ERROR, logger="scriptbuilder.sessions"):
+        asyncio.run(main())
+    assert "Lost the lock" in caplog.text
+
+
+def test_memory_store_spills_the_least_recently_used_sessions_and_reads_them_back():
+    probe = InMemorySessionStore()
+    add_turn(probe, "probe")
+    store = InMemorySessionStore(max_cache_bytes=int(session_bytes(probe, "probe") * 2.5))
+    for session_id in ("a", "b"):
+        add_turn(store, session_id, f"{session_id} " * 500)
+        store.append_memory(session_id, f"memory of {session_id}")
+    store.get_or_create("b").set_inherited("project/expert0", "inherited context")
+    version = store.versions.get("b")
+    store["a"]  # Now "b" is the least recently used
+    add_turn(store, "c")
+
+    assert list(store.histories) == ["a", "c"]
+    assert store.evictions == 1
+    assert store.cached_bytes <= store.max_cache_bytes
+    assert "b" in store
+    assert store.resident("a") and not store.resident("b")
+
+    # Reading "b" back restores it as it was, and spills "a" in its place
+    history = store["b"]
+    assert [turn.content for turn in history.turns] == ["b " * 500, "b " * 500]
+    assert history.inherited == {"project/expert0": "inherited context"}
+    assert store.get_memory("b") == ["memory of b"]
+    assert store.versions.get("b") == version
+    assert list(store.histories) == ["c", "b"]
+    assert store.get_memory("a") == ["memory of a"]
+
+    # Changes to a reloaded history are kept when it is spilled again
+    add_turn(store, "b", "again")
+    store["c"], store["a"]
+    assert "b" not in store.histories
+    assert store["b"].turns[-1].content == "again"
+    spill_dir = store.spill_dir
+    store.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_locked_sessions_are_not_evicted():
+    probe = InMemorySessionStore()
+    add_turn(probe, "probe")
+    store = InMemorySessionStore(max_cache_bytes=int(session_bytes(probe, "probe") * 1.5))
+
+    async def main():
+        add_turn(store, "a")
+        async with store.lock("a"):
+            add_turn(store, "b")
+            assert "a" in store
+
+    asyncio.run(main())
+    assert store.evictions == 0
+
+
+def test_redis_worker_cache_is_bounded_and_reloads(server):
+    probe = InMemorySessionStore()
+    add_turn(probe, "probe")
+    store = redis_store(server, max_cache_bytes=int(session_bytes(probe, "probe") * 2.5))
+    for session_id in ("a", "b", "c", "d"):
+        add_turn(store, session_id, f"{session_id} " * 500)
+
+    assert list(store.histories) == ["c", "d"]
+    assert store.evictions == 2
+    assert store.cached_bytes <= store.max_cache_bytes
+    # Evicted sessions are still in Redis
+    assert "a" in store
+    assert store["a"].turns[0].content == "a " * 500
+    assert list(store.histories) == ["d", "a"]
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def any_store(request, tmp_path):
+    if request.param == "memory":
+        yield InMemorySessionStore()
+    elif request.param == "sqlite":
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        yield store
+        store.close()
+    else:
+        yield redis_store(request.getfixturevalue("server"))
+
+
+def test_memory_items_are_kept_once_and_capped(any_store):
+    for item in ["one", "two", "one", "three", "four"]:
+        any_store.append_memory("project/expert1", item, max_items=3)
+    assert any_store.get_memory("project/expert1") == ["two", "three", "four"]
+    assert any_store.append_memory("project/expert1", "three", max_items=3) is False
+    assert any_store.append_memory("project/expert1", "five", max_items=3) is True
+    assert any_store.get_memory("project/expert1") == ["three", "four", "five"]
+
+
+def test_only_sessions_held_in_memory_are_resident(any_store):
+    assert not any_store.resident("project/expert1")
+    add_turn(any_store, "project/expert1")
+    # Redis writes every change through, so its sessions never are
+    assert any_store.resident("project/expert1") is not isinstance(any_store, RedisSessionStore)
+
+
+def memory_rows(path: str):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT position, content FROM memories ORDER BY position").fetchall()
+
+
+def test_sqlite_memory_is_appended_row_by_row(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path)
+    for item in ["one", "two", "three"]:
+        store.append_memory("project/expert1", item, max_items=2)
+    store.flush()
+    # Dropped items are deleted by position; the rest keep their rows
+    assert memory_rows(path) == [(1, "two"), (2, "three")]
+
+    store.append_memory("project/expert1", "four", max_items=2)
+    store.close()
+    assert memory_rows(path) == [(2, "three"), (3, "four")]
+    reopened = SQLiteSessionStore(path)
+    assert reopened.get_memory("project/expert1") == ["three", "four"]
+    reopened.append_memory("project/expert1", "five", max_items=2)
+    reopened.close()
+    assert memory_rows(path) == [(3, "four"), (4, "five")]
+
+
+def test_sqlite_memory_replaced_then_appended(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path)
+    store.append_memory("project/expert1", "old")
+    store.flush()
+    store.set_memory("project/expert1", ["a", "b"])
+    store.append_memory("project/expert1", "c")
+    # An evicted session is rebuilt from its pending changes
+    store.memories.clear()
+    assert store.get_memory("project/expert1") == ["a", "b", "c"]
+    store.close()
+    assert memory_rows(path) == [(0, "a"), (1, "b"), (2, "c")]
+
+
+def test_a_chat_turn_touches_the_store_only_off_the_event_loop(monkeypatch):
+    import backend
+    on_loop = []
+
+    def watched(name):
+        method = getattr(backend.chat_store, name)
+
+        def call(*args, **kwargs):
+            if threading.current_thread() is threading.main_thread():
+                on_loop.append(name)
+            return method(*args, **kwargs)
+        return call
+
+    for name in ("get_or_create", "get", "__contains__", "get_memory", "append_memory", "save", "ping"):
+        monkeypatch.setattr(backend.chat_store, name, watched(name))
+
+    async def main():
+        await backend.chat("Describe the invoice export requirements in detail.", "expert2", "tests/store/loop")
+        await backend.healthz()
+
+    asyncio.run(main())
+    assert on_loop == []
@@ -0,0 +1,51 @@
+import asyncio
+from llm_cache import ResponseCache
+from synonyms import SynonymBatcher, parse_synonym_batch
+
+
+def recording_fetch(delay: float = 0.01):
+    """A batch fetch that answers every word but "unknown", recording the batches it was asked for."""
+    batches = []
+
+    async def fetch(words):
+        batches.append(list(words))
+        await asyncio.sleep(delay)
+        return {word: [f"{word}-like"] for word in words if word != "unknown"}
+
+    return fetch, batches
+
+
+def test_batched_responses_are_parsed_per_word():
+    content = 'Sure! {"Fast": ["quick", "rapid"], "slow": "sluggish, unhurried"} Hope that helps.'
+    assert parse_synonym_batch(content, ["fast", "slow", "big"]) == {
+        "fast": ["quick", "rapid"],
+        "slow": ["sluggish", "unhurried"],
+    }
+    assert parse_synonym_batch("no json here", ["fast"]) == {}
+
+
+def test_concurrent_lookups_share_one_llm_call():
+    fetch, batches = recording_fetch()
+    batcher = SynonymBatcher(fetch)
+
+    async def main():
+        return await asyncio.gather(batcher.get_many(["Fast", "slow"]), batcher.get_many(["slow", "fast ", "fast"]))
+
+    first, second = asyncio.run(main())
+    assert first == second == {"fast": ["fast-like"], "slow": ["slow-like"]}
+    assert batches == [["fast", "slow"]]
+
+
+def test_only_cache_misses_are_sent_to_the_llm():
+    fetch, batches = recording_fetch()
+    batcher = SynonymBatcher(fetch, batch_size=2, cache=ResponseCache())
+
+    async def main():
+        await batcher.get_many(["fast", "slow", "unknown"])
+        return await batcher.get_many(["slow", "big", "fast", "small", "unknown"])
+
+    results = asyncio.run(main())
+    assert results == {"slow": ["slow-like"], "big": ["big-like"], "fast": ["fast-like"], "small": ["small-like"], "unknown": []}
+    # The first call: one full batch, then the rest. The second: only the words never answered
+    assert batches == [["fast", "slow"], ["unknown"], ["big", "small"], ["unknown"]]
+    assert batcher.cache.stats()["entries"] == 4
@@ -0,0 +1,146 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from session_store import InMemorySessionStore
+from vector_memory import HashingEmbedder, VectorMemory
+
+NOTES = [
+    "The invoice export must support CSV and PDF formats.",
+    "Login sessions expire after thirty minutes of inactivity.",
+    "Invoice totals include tax and shipping lines.",
+    "Password reset emails are sent within one minute.",
+]
+
+
+def remember(store, session_id, items):
+    for item in items:
+        store.append_memory(session_id, item)
+        store.versions.bump(session_id)
+
+
+def test_search_returns_the_top_k_most_similar_items_first():
+    store = InMemorySessionStore()
+    memory = VectorMemory(store, HashingEmbedder(), store.versions)
+    remember(store, "project/expert1", NOTES)
+
+    results = memory.search(["project/expert1"], "invoice", k=2)
+    assert [(position, text) for _, position, text in results] == [(2, NOTES[2]), (0, NOTES[0])]
+    assert memory.search(["project/expert1"], "invoice export in PDF", k=1) == [("project/expert1", 0, NOTES[0])]
+    assert [text for _, _, text in memory.search(["project/expert1"], "password reset email", k=1)] == [NOTES[3]]
+    # Nothing below the score threshold, and nothing at all for k=0
+    assert memory.search(["project/expert1"], "quarterly roadmap", k=4) == []
+    assert memory.search(["project/expert1"], "invoice", k=0) == []
+
+
+def test_new_items_are_found_after_the_version_changes():
+    store = InMemorySessionStore()
+    memory = VectorMemory(store, HashingEmbedder(), store.versions)
+    remember(store, "project/expert1", NOTES[:2])
+    assert memory.search(["project/expert1"], "password reset email", k=1) == []
+
+    remember(store, "project/expert1", NOTES[2:])
+    assert memory.search(["project/expert1"], "password reset email", k=1) == [("project/expert1", 3, NOTES[3])]
+
+
+def test_sessions_are_searched_apart():
+    store = InMemorySessionStore()
+    memory = VectorMemory(store, HashingEmbedder(), store.versions)
+    remember(store, "alpha/expert1", NOTES[:2])
+    remember(store, "beta/expert1", NOTES[2:])
+
+    assert {text for _, _, text in memory.search(["alpha/expert1"], "invoice", k=5)} == {NOTES[0]}
+    assert {text for _, _, text in memory.search(["beta/expert1"], "invoice", k=5)} == {NOTES[2]}
+    # Searching several sessions ranks them together and reports each item's own session and position
+    assert memory.search(["alpha/expert1", "beta/expert1"], "invoice totals with tax", k=2) == [
+        ("beta/expert1", 0, NOTES[2]),
+        ("alpha/expert1", 0, NOTES[0]),
+    ]
+
+
+class BlockingEmbedder(HashingEmbedder):
+    """Holds up embedding `blocked_text` until `release` is set."""
+
+    def __init__(self, blocked_text):
+        super().__init__()
+        self.blocked_text = blocked_text
+        self.blocked = threading.Event()
+        self.release = threading.Event()
+
+    def embed(self, texts):
+        if self.blocked_text in texts:
+            self.blocked.set()
+            assert self.release.wait(5)
+        return super().embed(texts)
+
+
+def test_a_slow_session_does_not_hold_up_searches_of_other_sessions():
+    store = InMemorySessionStore()
+    memory = VectorMemory(store, BlockingEmbedder(NOTES[3]), store.versions)
+    remember(store, "alpha/expert1", NOTES[:2])
+    remember(store, "beta/expert1", NOTES[2:])
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        slow = pool.submit(memory.search, ["beta/expert1"], "password reset email", 1)
+        assert memory.embedder.blocked.wait(5)
+        # beta's index is mid-sync; alpha's search goes ahead without waiting for it
+        fast = pool.submit(memory.search, ["alpha/expert1"], "login sessions expire", 1)
+        assert fast.result(timeout=5) == [("alpha/expert1", 1, NOTES[1])]
+        assert not slow.done()
+        memory.embedder.release.set()
+        assert slow.result(timeout=5) == [("beta/expert1", 1, NOTES[3])]
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_saved_embeddings_are_reused_after_a_reopen(tmp_path):
+    store = InMemorySessionStore()
+    remember(store, "project/expert1", NOTES[:3])
+    first = VectorMemory(store, CountingEmbedder(), store.versions, directory=str(tmp_path))
+    expected = first.search(["project/expert1"], "invoice export", k=2)
+    assert first.embedder.embedded[:3] == NOTES[:3]
+    del first
+
+    # A new process: only the item added since, and the query, are embedded
+    remember(store, "project/expert1", NOTES[3:])
+    reopened = VectorMemory(store, CountingEmbedder(), store.versions, directory=str(tmp_path))
+    assert reopened.search(["project/expert1"], "invoice export", k=2) == expected
+    assert reopened.embedder.embedded == [NOTES[3], "invoice export"]
+
+
+def test_saved_embeddings_are_rebuilt_when_the_memory_was_replaced(tmp_path):
+    store = InMemorySessionStore()
+    remember(store, "project/expert1", NOTES[:2])
+    VectorMemory(store, HashingEmbedder(), store.versions, directory=str(tmp_path)).search(["project/expert1"], "invoice", k=1)
+
+    store.set_memory("project/expert1", NOTES[2:])
+    store.versions.bump("project/expert1")
+    reopened = VectorMemory(store, CountingEmbedder(), store.versions, directory=str(tmp_path))
+    assert reopened.search(["project/expert1"], "invoice totals", k=1) == [("project/expert1", 0, NOTES[2])]
+    assert reopened.embedder.embedded[:2] == NOTES[2:]
+
+
+def test_items_dropped_from_a_capped_memory_are_not_re_embedded(tmp_path):
+    store = InMemorySessionStore()
+    memory = VectorMemory(store, CountingEmbedder(), store.versions, directory=str(tmp_path))
+    for item in NOTES[:3]:
+        store.append_memory("project/expert1", item, max_items=3)
+    store.versions.bump("project/expert1")
+    memory.search(["project/expert1"], "invoice", k=1)
+
+    store.append_memory("project/expert1", NOTES[3], max_items=3)
+    store.versions.bump("project/expert1")
+    assert memory.search(["project/expert1"], "invoice", k=3) == [("project/expert1", 1, NOTES[2])]
+    assert memory.search(["project/expert1"], "login sessions expire", k=1) == [("project/expert1", 0, NOTES[1])]
+    assert memory.embedder.embedded == NOTES[:3] + ["invoice", NOTES[3], "invoice", "login sessions expire"]
+
+    # The saved index matches the capped list after a reopen too
+    reopened = VectorMemory(store, CountingEmbedder(), store.versions, directory=str(tmp_path))
+    assert reopened.search(["project/expert1"], "password reset email", k=1) == [("project/expert1", 2, NOTES[3])]
+    assert reopened.embedder.embedded == ["password reset email"]
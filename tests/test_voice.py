@@ -0,0 +1,119 @@
+import random
+import wave
+import pytest
+from fake_transcription import FakeTranscriptionService
+from transcript_cache import TranscriptCache
+from voice import (
+    match_speakers,
+    plan_chunks,
+    response_words,
+    transcribe_and_process_audio,
+    transcribe_audio_file,
+    transcribe_audio_file_chunked,
+)
+
+FRAME_RATE = 8000
+# Chunk starts (0, 16, 32, ...) fall on word and turn boundaries of the fake service, so chunks hear the same words
+CHUNK_SECONDS = 20
+OVERLAP_SECONDS = 4
+TURN_SECONDS = 8
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """A minute of seeded noise as 16-bit mono WAV."""
+    path = tmp_path / "meeting.wav"
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(FRAME_RATE)
+        wav_file.writeframes(random.Random(7).randbytes(60 * FRAME_RATE * 2))
+    return str(path)
+
+
+def speaker_mapping(words, reference):
+    """The one-to-one relabelling that turns `words`' speakers into `reference`'s, or None if there is none."""
+    mapping = {}
+    for word, expected in zip(words, reference):
+        if mapping.setdefault(word["speaker"], expected["speaker"]) != expected["speaker"]:
+            return None
+    return mapping if len(set(mapping.values())) == len(mapping) else None
+
+
+def test_plan_chunks_overlap():
+    assert plan_chunks(60, CHUNK_SECONDS, OVERLAP_SECONDS) == [(0.0, 20), (16.0, 20), (32.0, 20), (48.0, 12.0)]
+    with pytest.raises(ValueError):
+        plan_chunks(60, 5, 5)
+
+
+def test_chunks_stitch_into_the_single_pass_transcript(recording):
+    service = FakeTranscriptionService(turn_seconds=TURN_SECONDS)
+    single = response_words(transcribe_audio_file(recording, transcribe=service))
+    stitched_response = transcribe_audio_file_chunked(
+        recording, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS, max_workers=2, transcribe=service
+    )
+    stitched = response_words(stitched_response)
+
+    assert stitched_response["metadata"]["chunks"] == 4
+    assert service.calls == 5
+    # Every word once, at its absolute time, with no duplicates from the overlaps
+    assert [(word["word"], word["start"]) for word in stitched] == [(word["word"], word["start"]) for word in single]
+    # Chunks permute their speaker labels; stitching keeps one labelling for the whole recording
+    assert len({word["speaker"] for word in single}) == 2
+    assert speaker_mapping(stitched, single) is not None
+
+
+def test_chunked_and_single_pass_transcripts_read_the_same(recording):
+    service = FakeTranscriptionService(turn_seconds=TURN_SECONDS)
+
+    def sentences(transcription):
+        return [line.split(": ", 1)[1] for line in transcription.splitlines()]
+
+    single = transcribe_and_process_audio(recording, transcribe=service, cache=None)
+    chunked = transcribe_and_process_audio(recording, chunked=True, transcribe=service, cache=None)
+    assert sentences(chunked) == sentences(single)
+
+
+def test_match_speakers_maps_local_labels_onto_global_ones(recording):
+    service = FakeTranscriptionService(turn_seconds=TURN_SECONDS)
+    # The second call of the fake service swaps the two speaker labels
+    first = response_words(transcribe_audio_file(recording, transcribe=service))
+    second = response_words(transcribe_audio_file(recording, transcribe=service))
+    assert [word["speaker"] for word in second] == [1 - word["speaker"] for word in first]
+    assert match_speakers(first, second) == {0: 1, 1: 0}
+
+
+def test_match_speakers_only_counts_words_heard_by_both():
+    previous = [
+        {"word": "alpha", "start": 1.0, "speaker": 3},
+        {"word": "beta", "start": 1.5, "speaker": 4},
+        {"word": "gamma", "start": 2.0, "speaker": 4},
+    ]
+    current = [
+        {"word": "Alpha", "start": 1.2, "speaker": 0},
+        {"word": "beta", "start": 1.6, "speaker": 1},
+        {"word": "gamma", "start": 2.0, "speaker": 1},
+        # Too far from the previous chunk's "alpha", and a word the previous chunk never heard
+        {"word": "alpha", "start": 4.0, "speaker": 1},
+        {"word": "delta", "start": 2.2, "speaker": 2},
+    ]
+    assert match_speakers(previous, current) == {1: 4, 0: 3}
+    assert match_speakers(previous, []) == {}
+
+
+def test_cached_transcripts_are_kept_apart_per_backend(recording, tmp_path):
+    cache = TranscriptCache(str(tmp_path / "cache"))
+    fake = FakeTranscriptionService(turn_seconds=TURN_SECONDS)
+    transcript = transcribe_and_process_audio(recording, transcribe=fake, cache=cache)
+    assert transcribe_and_process_audio(recording, transcribe=fake, cache=cache) == transcript
+    assert (fake.calls, cache.hits) == (1, 1)
+
+    other_calls = []
+
+    def other_backend(source, options):
+        other_calls.append(options)
+        return None
+
+    # Same audio and options, another backend: a miss, not the fake's transcript
+    assert transcribe_and_process_audio(recording, transcribe=other_backend, cache=cache) == "No transcription available."
+    assert len(other_calls) == 1
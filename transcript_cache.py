@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+
+# Bytes hashed at a time when fingerprinting audio files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class TranscriptCache:
+    """
+    Size-bounded, content-addressed on-disk cache of transcription results.
+
+    Entries are keyed by a streaming SHA-256 of the audio file plus the
+    transcription options, so the same recording uploaded under any name is a
+    hit. Uploads arrive at fresh temporary paths, so the content is hashed on
+    every lookup rather than remembered by path. The least recently used
+    entries are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def file_hash(self, audio_file_path):
+        """
+        Gets the SHA-256 of a file, streaming it from disk.
+
+        Args:
+            audio_file_path (str): Path to the audio file.
+
+        Returns:
+            str: Hex digest of the file contents.
+        """
+        digest = hashlib.sha256()
+        with open(audio_file_path, "rb") as audio_file:
+            for block in iter(lambda: audio_file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key_for_file(self, audio_file_path, options):
+        """
+        Builds the cache key for an audio file transcribed with the given options.
+
+        Args:
+            audio_file_path (str): Path to the audio file.
+            options (dict): Everything that affects the transcription result.
+
+        Returns:
+            str: Cache key.
+        """
+        digest = hashlib.sha256(self.file_hash(audio_file_path).encode("utf-8"))
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a cached result.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            dict: The cached entry, or None on a miss.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Stores a result, evicting least recently used entries if over the size limit.
+
+        Args:
+            key (str): Cache key.
+            entry (dict): JSON-serializable result.
+        """
+        data = json.dumps(entry).encode("utf-8")
+        path = self._entry_path(key)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            total = self._current_size()
+            if os.path.exists(path):
+                total -= os.path.getsize(path)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as entry_file:
+                entry_file.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes = total + len(data)
+            self._evict()
+
+    def _current_size(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    def _entries(self):
+        """(path, size, last used) for every cached entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            self._total_bytes -= size
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Optional: fall back to the hashing embedder
+    SentenceTransformer = None
+
+logger = logging.getLogger("scriptbuilder.memory")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Function words carry no topic, so the hashing embedder ignores them
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or our should "
+    "so that the their them there these they this to was we were what when where which who will with you your".split()
+)
+# Rows allocated for a new session index; the matrix doubles when full
+INITIAL_CAPACITY = 64
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (all-zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder: signed feature hashing of words and word pairs.
+
+    Hashes are stable across processes, so indexes saved to disk stay valid.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+            features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features)
+            )
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        return normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model (e.g. all-MiniLM-L6-v2)."""
+
+    def __init__(self, model_name: str):
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = "st-" + re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+def create_embedder(model_name: Optional[str] = None):
+    """Create the sentence-transformers embedder for model_name if it is installed, else the hashing embedder."""
+    if model_name:
+        if SentenceTransformer is not None:
+            return SentenceTransformerEmbedder(model_name)
+        logger.warning("sentence-transformers is not installed; using the hashing embedder instead of %s", model_name)
+    return HashingEmbedder()
+
+
+class SessionIndex:
+    """Embeddings of one session's memory items, in a growable and optionally memory-mapped matrix."""
+
+    def __init__(self, dim: int, path: Optional[str] = None):
+        self.dim = dim
+        self.path = path
+        self.texts: List[str] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.version: Optional[int] = None
+        self.lock = threading.Lock()  # Guards the matrix and texts
+        self.users = 0  # Searches holding the index; guarded by VectorMemory's lock
+
+    @property
+    def count(self) -> int:
+        return len(self.texts)
+
+    def load(self, items: List[str]) -> bool:
+        """Reuse the rows saved on disk if they still match the start of items."""
+        try:
+            with open(f"{self.path}.json", "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            vectors = np.load(f"{self.path}.npy", mmap_mode="r+")
+        except (OSError, ValueError):
+            return False
+        count = meta["count"]
+        if (
+            vectors.shape[1] != self.dim or count > vectors.shape[0] or count > len(items)
+            or (count and text_digest(items[count - 1]) != meta["last"])
+        ):
+            return False
+        self.vectors = vectors
+        self.texts = list(items[:count])
+        return True
+
+    def sync(self, items: List[str], embedder):
+        """
+        Embed the items appended since the last sync.
+
+        Items dropped from the front of the list (memory is capped per session)
+        are dropped from the index without re-embedding the rest; a list that
+        was replaced is re-embedded.
+        """
+        dropped = self._dropped(items)
+        if dropped is None:
+            self.texts = []
+        elif dropped:
+            self.vectors[:self.count - dropped] = self.vectors[dropped:self.count]
+            self.texts = self.texts[dropped:]
+        new_items = items[self.count:]
+        if not new_items:
+            if dropped and self.path is not None:
+                self.vectors.flush()
+                self._write_meta()
+            return
+        self._reserve(self.count + len(new_items))
+        self.vectors[self.count:self.count + len(new_items)] = embedder.embed(new_items)
+        self.texts.extend(new_items)
+        if self.path is not None:
+            self.vectors.flush()
+            self._write_meta()
+
+    def _dropped(self, items: List[str]) -> Optional[int]:
+        """How many indexed items were dropped from the front of items (None if the list was replaced)."""
+        if not self.count:
+            return 0
+        # Memory items are unique, so the last indexed one is found at one position only
+        for position in range(min(self.count, len(items)) - 1, -1, -1):
+            if items[position] == self.texts[-1]:
+                dropped = self.count - 1 - position
+                return dropped if items[0] == self.texts[dropped] else None
+        return None
+
+    def _reserve(self, rows: int):
+        if rows <= self.vectors.shape[0]:
+            return
+        capacity = max(INITIAL_CAPACITY, self.vectors.shape[0] * 2, rows)
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[:self.count] = self.vectors[:self.count]
+            self.vectors = vectors
+            return
+        tmp_path = f"{self.path}.tmp.npy"
+        vectors = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        vectors[:self.count] = self.vectors[:self.count]
+        vectors.flush()
+        del vectors
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)  # Release the old mapping before replacing it
+        os.replace(tmp_path, f"{self.path}.npy")
+        self.vectors = np.load(f"{self.path}.npy", mmap_mode="r+")
+
+    def _write_meta(self):
+        tmp_path = f"{self.path}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as meta_file:
+            json.dump({"count": self.count, "last": text_digest(self.texts[-1])}, meta_file)
+        os.replace(tmp_path, f"{self.path}.json")
+
+
+class VectorMemory:
+    """
+    Long-term memory retrieved by similarity to the current input instead of by recency.
+
+    The session store's memory lists stay the source of truth (and are shared
+    by every worker); this is a per-process index over them. A session's
+    items are embedded once, when they are first seen, into a float32 matrix
+    that is memory-mapped from `directory` when one is given, so a restart
+    does not re-embed them. Indexes are resynced only when the session's
+    version changes, and at most `max_sessions` stay open (least recently
+    used first out, unless a search is using them; they are reloaded or
+    rebuilt on demand). Searches run on executor threads and only take turns
+    on the indexes of the sessions they share.
+    """
+
+    def __init__(self, store, embedder, versions, directory: Optional[str] = None, max_sessions: int = 1024):
+        self.store = store
+        self.embedder = embedder
+        self.versions = versions
+        self.directory = os.path.join(directory, embedder.name) if directory else None
+        self.max_sessions = max_sessions
+        self._indexes: "OrderedDict[str, SessionIndex]" = OrderedDict()
+        self._lock = threading.Lock()  # Guards _indexes and the indexes' users
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def _session_index(self, session_id: str) -> Iterator[SessionIndex]:
+        """The session's index, locked, and kept open until the caller is done with it."""
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is None:
+                path = os.path.join(self.directory, text_digest(session_id)) if self.directory else None
+                index = SessionIndex(self.embedder.dim, path)
+                self._indexes[session_id] = index
+            self._indexes.move_to_end(session_id)
+            index.users += 1
+            self._evict()
+        try:
+            with index.lock:
+                yield index
+        finally:
+            with self._lock:
+                index.users -= 1
+                self._evict()
+
+    def _evict(self):
+        # Indexes in use stay open, so one session's file is never mapped by two indexes at once
+        excess = len(self._indexes) - self.max_sessions
+        if excess > 0:
+            idle = [session_id for session_id, index in self._indexes.items() if not index.users]
+            for session_id in idle[:excess]:
+                del self._indexes[session_id]
+
+    def _sync(self, session_id: str, index: SessionIndex, version: int):
+        """Bring a locked index up to the session's version."""
+        if index.version == version:
+            return
+        items = self.store.get_memory(session_id)
+        if index.version is None and index.path is not None:
+            index.load(items)
+        index.sync(items, self.embedder)
+        index.version = version
+
+    def search(self, session_ids: Sequence[str], query: str, k: int = 5, min_score: float = 0.05) -> List[Tuple[str, int, str]]:
+        """
+        Find the k memory items across the given sessions most similar to the query.
+
+        Returns (session_id, position, text) tuples, most similar first.
+        """
+        found = []
+        for session_id, version in zip(session_ids, self.versions.signature(session_ids)):
+            with self._session_index(session_id) as index:
+                self._sync(session_id, index, version)
+                if index.count:
+                    found.append(session_id)
+        if not found or k <= 0:
+            return []
+
+        # Scored one session at a time, each from a consistent snapshot of its index
+        query_vector = self.embedder.embed([query])[0]
+        indexes = []
+        for session_id in found:
+            with self._session_index(session_id) as index:
+                indexes.append((session_id, index.texts[:index.count], index.vectors[:index.count] @ query_vector))
+        scores = np.concatenate([session_scores for _, _, session_scores in indexes])
+        owners = np.repeat(np.arange(len(indexes)), [len(texts) for _, texts, _ in indexes])
+        starts = np.cumsum([0] + [len(texts) for _, texts, _ in indexes])
+
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results = []
+        for row in top:
+            if scores[row] < min_score:
+                break
+            session_id, texts, _ = indexes[owners[row]]
+            position = int(row - starts[owners[row]])
+            results.append((session_id, position, texts[position]))
+        return results
@@ -1,40 +1,439 @@
-from deepgram import DeepgramClient
-
-# Initialize the Deepgram client
+import os
+import asyncio
+import shutil
+import struct
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterator, Optional
+from transcript_cache import TranscriptCache
+
+# Deepgram credentials; the client (and the deepgram SDK) is only loaded on first use
 DG_KEY = "api key"  # Replace with your API key
-deepgram = DeepgramClient(DG_KEY)
 
 
-def transcribe_audio_file(audio_file_path):
+@lru_cache(maxsize=None)
+def get_deepgram_client():
+    """
+    Returns the shared Deepgram client, creating it on first use.
+
+    Returns:
+        DeepgramClient: Client for the pre-recorded and streaming APIs.
+    """
+    from deepgram import DeepgramClient
+    return DeepgramClient(DG_KEY)
+
+# Options sent with every transcription request
+TRANSCRIPTION_OPTIONS = {
+    "model": "nova-2",
+    "smart_format": True,
+    "language": "en",
+    "diarize": True,
+    "profanity_filter": False,
+}
+
+# Chunked transcription defaults for long recordings
+CHUNK_SECONDS = 300
+CHUNK_OVERLAP_SECONDS = 10
+MAX_TRANSCRIPTION_WORKERS = 4
+# Bytes read from disk at a time when streaming audio
+STREAM_BLOCK_SIZE = 64 * 1024
+# Words in two overlapping chunks are the same word if their start times are this close
+WORD_MATCH_TOLERANCE = 0.5
+
+# Options for live (WebSocket) transcription. Interim results give immediate feedback;
+# endpointing finalizes an utterance after 300 ms of silence, and UtteranceEnd covers
+# noisy audio where silence is never detected.
+LIVE_TRANSCRIPTION_OPTIONS = {
+    "model": "nova-2",
+    "smart_format": True,
+    "language": "en",
+    "diarize": True,
+    "interim_results": True,
+    "endpointing": 300,
+    "utterance_end_ms": "1000",
+    "vad_events": True,
+}
+
+# A transcription service takes a readable audio stream and options and returns the response as a dict
+TranscriptionService = Callable[[BinaryIO, Dict], Dict]
+
+# Cache of raw and processed transcripts, keyed by audio content and options
+transcript_cache = TranscriptCache(
+    os.getenv("TRANSCRIPT_CACHE_DIR", ".transcript_cache"),
+    max_bytes=int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+)
+
+
+def deepgram_transcribe(source, options):
+    """
+    Sends an audio stream to Deepgram's pre-recorded API.
+
+    Args:
+        source: Readable binary stream; it is uploaded as it is read.
+        options (dict): Transcription options.
+
+    Returns:
+        dict: Response from Deepgram API.
+    """
+    response = get_deepgram_client().listen.rest.v("1").transcribe_file({"stream": source}, options)
+    return response.to_dict()
+
+
+def service_identity(transcribe):
+    """
+    Names a transcription backend, so cached transcripts from different backends never mix.
+
+    Args:
+        transcribe (TranscriptionService): Transcription backend.
+
+    Returns:
+        str: Its `identity` attribute if it has one, else its qualified name.
+    """
+    identity = getattr(transcribe, "identity", None)
+    if identity:
+        return identity
+    name = getattr(transcribe, "__qualname__", None) or type(transcribe).__qualname__
+    return f"{transcribe.__module__}.{name}"
+
+
+def transcribe_audio_file(audio_file_path, options=None, transcribe=deepgram_transcribe, raise_errors=False):
     """
     Transcribes the audio file using Deepgram API.
 
+    The file is streamed from disk rather than read into memory.
+
     Args:
         audio_file_path (str): Path to the audio file.
+        options (dict): Transcription options (defaults to TRANSCRIPTION_OPTIONS).
+        transcribe (TranscriptionService): Transcription backend.
+        raise_errors (bool): Raise failures instead of printing them and returning None.
 
     Returns:
         dict: Response from Deepgram API.
     """
     try:
         with open(audio_file_path, "rb") as audio_file:
-            buffer_data = audio_file.read()
-
-        options = {
-            "model": "nova-2",
-            "smart_format": True,
-            "language": "en",
-            "diarize": True,
-            "profanity_filter": False,
-        }
-        
-        payload = {
-            "buffer": buffer_data,
-        }
-
-        # Use the new rest method instead of prerecorded
-        response = deepgram.listen.rest.transcribe(buffer_data, **options)
-        return response
+            return transcribe(audio_file, options or TRANSCRIPTION_OPTIONS)
     except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error transcribing audio: {e}")
+        return None
+
+
+class AudioStream:
+    """
+    Readable, iterable view of audio produced lazily in blocks.
+
+    Used as the upload body for one chunk, so a chunk is never held in memory.
+    """
+
+    def __init__(self, blocks: Iterator[bytes], on_close: Optional[Callable[[], None]] = None):
+        self._blocks = blocks
+        self._buffer = b""
+        self._on_close = on_close
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            block = next(self._blocks, None)
+            if block is None:
+                break
+            self._buffer += block
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self):
+        while True:
+            block = self.read(STREAM_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+
+def wav_header(channels, sample_width, frame_rate, frame_count):
+    """
+    Builds a 44-byte PCM WAV header.
+
+    Args:
+        channels (int): Number of channels.
+        sample_width (int): Bytes per sample.
+        frame_rate (int): Frames per second.
+        frame_count (int): Number of frames that follow the header.
+
+    Returns:
+        bytes: The header.
+    """
+    data_size = frame_count * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, channels, frame_rate,
+        frame_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+def is_wav(audio_file_path):
+    with open(audio_file_path, "rb") as audio_file:
+        header = audio_file.read(12)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+def audio_duration(audio_file_path):
+    """
+    Gets the duration of an audio file in seconds.
+
+    WAV files are measured directly; other formats need ffprobe.
+
+    Args:
+        audio_file_path (str): Path to the audio file.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    if is_wav(audio_file_path):
+        with wave.open(audio_file_path, "rb") as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+
+    if not shutil.which("ffprobe"):
+        raise RuntimeError("ffprobe is required to measure non-WAV audio.")
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio_file_path],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip())
+
+
+def open_audio_chunk(audio_file_path, start, duration):
+    """
+    Opens a time range of an audio file as a WAV stream.
+
+    WAV files are sliced directly from disk; other formats are decoded with ffmpeg.
+
+    Args:
+        audio_file_path (str): Path to the audio file.
+        start (float): Start of the range in seconds.
+        duration (float): Length of the range in seconds.
+
+    Returns:
+        AudioStream: The chunk as a WAV stream.
+    """
+    if is_wav(audio_file_path):
+        wav_file = wave.open(audio_file_path, "rb")
+        rate = wav_file.getframerate()
+        start_frame = min(int(start * rate), wav_file.getnframes())
+        frame_count = min(int(duration * rate), wav_file.getnframes() - start_frame)
+        wav_file.setpos(start_frame)
+        frames_per_block = max(1, STREAM_BLOCK_SIZE // (wav_file.getnchannels() * wav_file.getsampwidth()))
+
+        def blocks():
+            yield wav_header(wav_file.getnchannels(), wav_file.getsampwidth(), rate, frame_count)
+            remaining = frame_count
+            while remaining > 0:
+                block = wav_file.readframes(min(frames_per_block, remaining))
+                if not block:
+                    return
+                remaining -= frames_per_block
+                yield block
+
+        return AudioStream(blocks(), on_close=wav_file.close)
+
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("ffmpeg is required to split non-WAV audio.")
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-ss", str(start), "-t", str(duration), "-i", audio_file_path, "-f", "wav", "-"],
+        stdout=subprocess.PIPE,
+    )
+
+    def close():
+        process.stdout.close()
+        process.wait()
+
+    return AudioStream(iter(lambda: process.stdout.read(STREAM_BLOCK_SIZE), b""), on_close=close)
+
+
+def plan_chunks(duration, chunk_seconds=CHUNK_SECONDS, overlap_seconds=CHUNK_OVERLAP_SECONDS):
+    """
+    Splits a recording into overlapping chunks.
+
+    Args:
+        duration (float): Recording length in seconds.
+        chunk_seconds (float): Length of each chunk.
+        overlap_seconds (float): Overlap between consecutive chunks.
+
+    Returns:
+        list: (start, length) tuples in seconds.
+    """
+    step = chunk_seconds - overlap_seconds
+    if step <= 0:
+        raise ValueError("Chunk length must be greater than the overlap.")
+    chunks = []
+    start = 0.0
+    while True:
+        length = min(chunk_seconds, duration - start)
+        chunks.append((start, length))
+        if start + length >= duration:
+            return chunks
+        start += step
+
+
+def response_words(res):
+    """
+    Gets the diarized words from a transcription response.
+
+    Args:
+        res (dict): Response from Deepgram API.
+
+    Returns:
+        list: Word dicts, or an empty list if the response has none.
+    """
+    if not res or 'results' not in res or 'channels' not in res['results']:
+        return []
+    return res['results']['channels'][0]['alternatives'][0].get('words', [])
+
+
+def match_speakers(previous_words, current_words):
+    """
+    Maps chunk-local speaker labels onto global ones using words both chunks heard.
+
+    Args:
+        previous_words (list): Words of the previous chunk in the overlap, with global speakers.
+        current_words (list): Words of the current chunk in the overlap, with local speakers.
+
+    Returns:
+        dict: Local speaker label to global speaker label.
+    """
+    votes = {}
+    for word in current_words:
+        for previous in previous_words:
+            if (
+                abs(previous['start'] - word['start']) <= WORD_MATCH_TOLERANCE
+                and previous['word'].lower() == word['word'].lower()
+            ):
+                key = (word.get('speaker', 0), previous['speaker'])
+                votes[key] = votes.get(key, 0) + 1
+                break
+
+    mapping = {}
+    used = set()
+    for (local, global_speaker), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if local not in mapping and global_speaker not in used:
+            mapping[local] = global_speaker
+            used.add(global_speaker)
+    return mapping
+
+
+def stitch_chunk_transcripts(chunk_results, overlap_seconds=CHUNK_OVERLAP_SECONDS):
+    """
+    Stitches per-chunk diarized transcripts into one response.
+
+    Word timestamps are shifted to absolute time, words duplicated by each overlap
+    are cut at its midpoint, and chunk-local speaker labels are mapped onto
+    consistent global labels by matching the words both chunks heard. Speakers
+    absent from the overlap reuse known speakers not already matched in that
+    chunk; new labels are created only when a chunk has more speakers than seen so far.
+
+    Args:
+        chunk_results (list): (start, length, response) tuples in chunk order.
+        overlap_seconds (float): Overlap between consecutive chunks.
+
+    Returns:
+        dict: A response shaped like Deepgram's, with all words in order.
+    """
+    words_out = []
+    previous_words = []
+    known_speakers = []
+
+    for index, (start, length, res) in enumerate(chunk_results):
+        words = []
+        for word in response_words(res):
+            word = dict(word)
+            word['start'] += start
+            word['end'] += start
+            words.append(word)
+
+        mapping = {}
+        if index:
+            mapping = match_speakers(
+                [word for word in previous_words if word['start'] >= start],
+                [word for word in words if word['start'] < start + overlap_seconds],
+            )
+        for word in words:
+            local = word.get('speaker', 0)
+            if local not in mapping:
+                unused = [speaker for speaker in known_speakers if speaker not in mapping.values()]
+                mapping[local] = unused[0] if unused else len(known_speakers)
+                if not unused:
+                    known_speakers.append(mapping[local])
+            word['speaker'] = mapping[local]
+
+        keep_from = start + overlap_seconds / 2 if index else float("-inf")
+        is_last = index == len(chunk_results) - 1
+        keep_until = float("inf") if is_last else start + length - overlap_seconds / 2
+        words_out.extend(word for word in words if keep_from <= word['start'] < keep_until)
+        previous_words = words
+
+    transcript = ' '.join(word.get('punctuated_word', word['word']) for word in words_out)
+    return {
+        'metadata': {'chunks': len(chunk_results)},
+        'results': {'channels': [{'alternatives': [{'transcript': transcript, 'words': words_out}]}]},
+    }
+
+
+def transcribe_audio_file_chunked(
+    audio_file_path,
+    chunk_seconds=CHUNK_SECONDS,
+    overlap_seconds=CHUNK_OVERLAP_SECONDS,
+    max_workers=MAX_TRANSCRIPTION_WORKERS,
+    options=None,
+    transcribe=deepgram_transcribe,
+    raise_errors=False,
+):
+    """
+    Transcribes a long recording as overlapping chunks in parallel.
+
+    Each chunk is streamed from disk to the transcription service by a bounded
+    pool of workers, then the results are stitched back together.
+
+    Args:
+        audio_file_path (str): Path to the audio file.
+        chunk_seconds (float): Length of each chunk.
+        overlap_seconds (float): Overlap between consecutive chunks.
+        max_workers (int): Maximum concurrent transcription requests.
+        options (dict): Transcription options (defaults to TRANSCRIPTION_OPTIONS).
+        transcribe (TranscriptionService): Transcription backend.
+        raise_errors (bool): Raise failures instead of printing them and returning None.
+
+    Returns:
+        dict: Stitched response, or None if transcription failed.
+    """
+    options = options or TRANSCRIPTION_OPTIONS
+
+    def transcribe_chunk(chunk):
+        start, length = chunk
+        stream = open_audio_chunk(audio_file_path, start, length)
+        try:
+            return start, length, transcribe(stream, options)
+        finally:
+            stream.close()
+
+    try:
+        chunks = plan_chunks(audio_duration(audio_file_path), chunk_seconds, overlap_seconds)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            chunk_results = list(executor.map(transcribe_chunk, chunks))
+        return stitch_chunk_transcripts(chunk_results, overlap_seconds)
+    except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error transcribing audio: {e}")
         return None
 
@@ -91,21 +490,48 @@ def format_speaker(speaker_num):
     return f"Speaker {speaker_num}"
 
 
-def transcribe_and_process_audio(audio_file_path):
+def transcribe_and_process_audio(
+    audio_file_path, chunked=False, transcribe=deepgram_transcribe, cache=transcript_cache, raise_errors=False
+):
     """
     Transcribes and processes the audio file.
 
     Args:
         audio_file_path (str): Path to the audio file.
+        chunked (bool): Transcribe as overlapping chunks in parallel (for long recordings).
+        transcribe (TranscriptionService): Transcription backend.
+        cache (TranscriptCache): Transcript cache, or None to always transcribe.
+        raise_errors (bool): Raise transcription failures instead of returning "No transcription available.".
 
     Returns:
         str: Formatted transcription string.
     """
-    res = transcribe_audio_file(audio_file_path)
-    if not res:
-        return "No transcription available."
-
-    diarized_result = process_diarized_transcript(res)
+    key = None
+    cached = None
+    if cache is not None:
+        # The backend is part of the key: a stand-in's transcripts must never be served as Deepgram's
+        key = cache.key_for_file(audio_file_path, {
+            "service": service_identity(transcribe),
+            "options": TRANSCRIPTION_OPTIONS,
+            "chunked": chunked,
+        })
+        cached = cache.get(key)
+
+    if cached:
+        diarized_result = [tuple(segment) for segment in cached['diarized']]
+    else:
+        if chunked:
+            res = transcribe_audio_file_chunked(audio_file_path, transcribe=transcribe, raise_errors=raise_errors)
+        else:
+            res = transcribe_audio_file(audio_file_path, transcribe=transcribe, raise_errors=raise_errors)
+        if not res:
+            if raise_errors:
+                raise RuntimeError("The transcription service returned no result.")
+            return "No transcription available."
+
+        diarized_result = process_diarized_transcript(res)
+        if cache is not None and diarized_result:
+            cache.put(key, {'response': res, 'diarized': diarized_result})
 
     if not diarized_result:
         return "No transcription available. The audio might be of low quality or silent."
@@ -118,6 +544,91 @@ def transcribe_and_process_audio(audio_file_path):
     return transcription
 
 
+def format_diarized_words(words):
+    """
+    Formats diarized words as speaker-segmented text.
+
+    Args:
+        words (list): Word dicts with speaker labels.
+
+    Returns:
+        str: One "Speaker N: sentence" line per segment.
+    """
+    segments = process_diarized_transcript({'results': {'channels': [{'alternatives': [{'words': words}]}]}})
+    return "\n".join(f"{format_speaker(speaker)}: {sentence}" for speaker, sentence in segments)
+
+
+class DeepgramLiveTranscriber:
+    """
+    Live transcription session over Deepgram's streaming API.
+
+    Audio frames are sent as they arrive, and results come back from `results()`
+    as dicts with `transcript`, `words`, `is_final` (the text will not change) and
+    `speech_final` (the speaker has stopped). Any object with the same `start`,
+    `send`, `finish` and `results` methods can stand in for it.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or LIVE_TRANSCRIPTION_OPTIONS
+        self._results = asyncio.Queue()
+        self._connection = None
+
+    async def start(self):
+        """Opens the streaming connection."""
+        from deepgram import LiveOptions, LiveTranscriptionEvents
+        self._connection = get_deepgram_client().listen.asyncwebsocket.v("1")
+        self._connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
+        self._connection.on(LiveTranscriptionEvents.UtteranceEnd, self._on_utterance_end)
+        self._connection.on(LiveTranscriptionEvents.Close, self._on_close)
+        if not await self._connection.start(LiveOptions(**self.options)):
+            raise RuntimeError("Could not start live transcription.")
+
+    async def send(self, audio):
+        """
+        Sends one frame of audio.
+
+        Args:
+            audio (bytes): Audio data in the format given by the options.
+        """
+        await self._connection.send(audio)
+
+    async def finish(self):
+        """Flushes pending audio and closes the connection; `results()` ends once it is closed."""
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.finish()
+            self._results.put_nowait(None)
+
+    async def results(self):
+        """
+        Yields transcription results until the session is finished.
+
+        Yields:
+            dict: A transcription result.
+        """
+        while True:
+            result = await self._results.get()
+            if result is None:
+                return
+            yield result
+
+    async def _on_transcript(self, connection, result, **kwargs):
+        result = result.to_dict()
+        alternative = result['channel']['alternatives'][0]
+        self._results.put_nowait({
+            'transcript': alternative.get('transcript', ''),
+            'words': alternative.get('words', []),
+            'is_final': result.get('is_final', False),
+            'speech_final': result.get('speech_final', False),
+        })
+
+    async def _on_utterance_end(self, connection, utterance_end, **kwargs):
+        self._results.put_nowait({'transcript': '', 'words': [], 'is_final': True, 'speech_final': True})
+
+    async def _on_close(self, connection, close, **kwargs):
+        self._results.put_nowait(None)
+
+
 def main():
     """
     Main function to transcribe and print the audio file transcription.